@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Group, Member, Category, Expense, ExpenseSplit, BudgetPeriod, Settlement
+from .models import Group, Member, Category, Expense, ExpenseSplit, BudgetPeriod, Settlement, MemberBalance, MonthlySpend
 
 admin.site.register(Group)
 admin.site.register(Member)
@@ -8,3 +8,5 @@ admin.site.register(Expense)
 admin.site.register(ExpenseSplit)
 admin.site.register(BudgetPeriod)
 admin.site.register(Settlement)
+admin.site.register(MemberBalance)
+admin.site.register(MonthlySpend)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ExpBudConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'exp_bud'
+
+    def ready(self):
+        from . import signals  # noqa: F401  connects the cache invalidation receivers
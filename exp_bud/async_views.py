@@ -0,0 +1,135 @@
+import asyncio
+from decimal import Decimal
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.db.models import Sum
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from .models import Group, Expense, Settlement
+from .cache import group_cache
+from .pagination import ExpenseCursorPagination
+from .serializers import SettlementSerializer
+from .views import (ExpenseListCreateView, SettlementListCreateView, GroupSummaryView,
+                    filter_expenses, summary_period, summary_querysets, summary_payload)
+from . import fastread, ledger, rollups, versions, periods
+
+# Async (ASGI) versions of the hot GET endpoints: summary, expense list, settlement list.
+# urls.py routes to these when settings.EXP_BUD_ASYNC_READS is on; other methods (POST) still go to the DRF views.
+# Under an ASGI server a request waiting on the database no longer holds a worker thread, and the independent
+# queries of the summary are awaited together with asyncio.gather.
+# The responses are byte-identical to the DRF views (same querysets, same JSONRenderer); DRF itself has no
+# async views, so authentication (JWT) and the membership check are done here with the same rules.
+
+
+async def alist(queryset):
+    return [row async for row in queryset]
+
+
+def json_response(data, status=200, headers=None):
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json', headers=headers)
+
+
+async def group_for_request(request, group_id):
+    # IsAuthenticated + GroupContextMixin rules: 401 without a valid token, 404 for a missing group or a non-member
+    result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    if result is None:
+        raise exceptions.NotAuthenticated()
+    user = result[0]
+    group = await Group.objects.filter(id=group_id).afirst()
+    if group is None or user.id not in await sync_to_async(group_cache.member_ids)(group.id):
+        raise exceptions.NotFound('No Group matches the given query.')
+    return group
+
+
+def read_async(sync_view_class):
+    # GET → the decorated coroutine; any other method → the DRF view, run in the thread-sensitive executor.
+    # csrf_exempt like DRF's own as_view() (JWT requests carry no CSRF token).
+    sync_view = sync_to_async(sync_view_class.as_view())
+    
+    def decorator(get):
+        @csrf_exempt
+        @wraps(get)
+        async def view(request, **kwargs):
+            if request.method != 'GET':
+                return await sync_view(request, **kwargs)
+            try:
+                return await get(request, **kwargs)
+            except exceptions.APIException as exc:
+                # same body / status / header as DRF's exception handler
+                data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+                headers = {'WWW-Authenticate': 'Bearer realm="api"'} if exc.status_code == 401 else None
+                return json_response(data, exc.status_code, headers)
+        return view
+    return decorator
+
+
+@read_async(GroupSummaryView)
+async def group_summary(request, group_id):
+    group = await group_for_request(request, group_id)
+    year, month, day, start, end = summary_period(request.GET)
+    
+    # same ETag / response cache as GroupSummaryView (versions.cached_response), with the async cache API
+    options = versions.config()
+    if not options['ENABLED']:
+        return json_response(await build_summary(group, year, month, day, start, end))
+    key, etag = versions.cache_key(group, 'summary', (year, month, day))
+    headers = versions.response_headers(etag)
+    if versions.not_modified(request, etag):
+        return HttpResponse(status=304, headers=headers)
+    cache = caches[options['ALIAS']]
+    data = await cache.aget(key)
+    if data is None:
+        data = await build_summary(group, year, month, day, start, end)
+        await cache.aset(key, data, options['TTL'])
+    return json_response(data, headers=headers)
+
+
+async def build_summary(group, year, month, day, start, end):
+    queries = summary_querysets(group, year, month, start, end)
+    
+    if day == 1:
+        total_spent = rollups.amonth_spend(group.id, year, month)
+        balances = alist(queries['ledger_rows'])
+    else:
+        total_spent = queries['expenses'].aaggregate(total=Sum('amount'))
+        balances = sync_to_async(ledger.raw_balances)(group.id, start, end)
+    
+    # the four reads don't depend on each other: issue them together
+    total_spent, budget, members, balances = await asyncio.gather(
+        total_spent, queries['budget'].afirst(), alist(queries['members']), balances)
+    
+    if day == 1 and budget and budget.snapshot is not None:
+        # closed month → the snapshot, like GroupSummaryView.build (the rollup/ledger reads agree with it anyway)
+        total_spent, net_by_user = periods.snapshot_totals(budget.snapshot)
+    elif day == 1:
+        net_by_user = {uid: paid - owed + sent - received for uid, paid, owed, sent, received in balances}
+    else:
+        total_spent = total_spent['total'] or Decimal('0.00')
+        if budget and budget.closed_at:
+            total_spent += await sync_to_async(periods.archived_total)(group.id, start, end)
+        net_by_user = balances
+    return summary_payload(group, year, month, total_spent, budget, members, net_by_user)
+
+
+@read_async(ExpenseListCreateView)
+async def expense_list(request, group_id):
+    group = await group_for_request(request, group_id)
+    drf_request = Request(request) # query_params / build_absolute_uri for the filters and the paginator
+    queryset = filter_expenses(Expense.objects.filter(group=group), drf_request.query_params)
+    
+    paginator = ExpenseCursorPagination()
+    rows = paginator.set_page(await alist(paginator.page_queryset(fastread.expense_values(queryset), drf_request)))
+    split_rows = await alist(fastread.split_values(rows)) if rows else []
+    return json_response({'next': paginator.get_next_link(), 'results': fastread.expense_dicts(rows, split_rows)})
+
+
+@read_async(SettlementListCreateView)
+async def settlement_list(request, group_id):
+    group = await group_for_request(request, group_id)
+    rows = await alist(Settlement.objects.filter(group=group).select_related('from_user', 'to_user').order_by('-settled_at'))
+    return json_response(SettlementSerializer(rows, many=True).data)
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from .models import Member, Category, BudgetPeriod
+from . import replicas
+
+# Cross-request cache for the sets every group endpoint needs: member user ids and category ids (and the closed
+# periods the write paths check). They change rarely, so GroupContext reads them from here instead of the database.
+# signals.py invalidates an entry whenever a Member, Category or BudgetPeriod row of the group is saved or deleted.
+#
+# settings.EXP_BUD_GROUP_CACHE (all keys optional):
+#   'MAX_SIZE': 2048  → max groups kept per set in the process-local LRU
+#   'TTL': 30         → seconds an entry lives; bounds staleness when other processes change the data
+#   'BACKEND': None   → name of a settings.CACHES alias (redis, memcached, ...). When set, entries are shared by
+#                       all processes and an invalidation is seen by every worker at once; the LRU is not used.
+# Misses are always loaded from the primary database: a lagging replica would put back the data just invalidated.
+
+MISSING = object()
+
+
+class LRUCache:
+    # small thread-safe LRU with a TTL per entry and hit/miss counters
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict() # key -> (expires_at, value); order = least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                self._data.pop(key, None)
+                self.misses += 1
+                return MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False) # evict the least recently used entry
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GroupCache:
+    def __init__(self):
+        config = getattr(settings, 'EXP_BUD_GROUP_CACHE', {})
+        self.ttl = config.get('TTL', 30)
+        self.backend = config.get('BACKEND')
+        self.local = LRUCache(config.get('MAX_SIZE', 2048), self.ttl)
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    def _get(self, key, load):
+        load = self._from_primary(load)
+        if self.backend:
+            value = caches[self.backend].get(key, MISSING)
+            if value is MISSING:
+                self.shared_misses += 1
+                value = load()
+                caches[self.backend].set(key, value, self.ttl)
+            else:
+                self.shared_hits += 1
+            return value
+
+        value = self.local.get(key)
+        if value is MISSING:
+            value = load()
+            self.local.set(key, value)
+        return value
+
+    @staticmethod
+    def _from_primary(load):
+        def wrapped():
+            with replicas.reading(False):
+                return load()
+        return wrapped
+
+    def _delete(self, key):
+        if self.backend:
+            caches[self.backend].delete(key)
+        self.local.delete(key)
+
+    def member_ids(self, group_id):
+        # tuple (immutable, safe to share between requests) of user ids in join order
+        return self._get(f'exp_bud:members:{group_id}', lambda: tuple(
+            Member.objects.filter(group_id=group_id).order_by('id').values_list('user_id', flat=True)))
+
+    def category_ids(self, group_id):
+        return self._get(f'exp_bud:categories:{group_id}', lambda: frozenset(
+            Category.objects.filter(group_id=group_id).values_list('id', flat=True)))
+
+    def closed_periods(self, group_id):
+        # (year, month) of the group's closed periods (periods.py); writes dated in them are rejected
+        return self._get(f'exp_bud:closed:{group_id}', lambda: frozenset(
+            BudgetPeriod.objects.filter(group_id=group_id, closed_at__isnull=False).values_list('year', 'month')))
+
+    def invalidate_members(self, group_id):
+        self._delete(f'exp_bud:members:{group_id}')
+
+    def invalidate_categories(self, group_id):
+        self._delete(f'exp_bud:categories:{group_id}')
+
+    def invalidate_closed(self, group_id):
+        self._delete(f'exp_bud:closed:{group_id}')
+
+    def clear(self):
+        self.local.clear()
+        self.shared_hits = self.shared_misses = 0
+
+    def stats(self):
+        if self.backend:
+            return {'backend': self.backend, 'hits': self.shared_hits, 'misses': self.shared_misses}
+        return {'backend': 'local', 'hits': self.local.hits, 'misses': self.local.misses,
+                'size': len(self.local), 'max_size': self.local.max_size}
+
+
+group_cache = GroupCache()
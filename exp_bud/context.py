@@ -0,0 +1,43 @@
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from .models import Group
+from .cache import group_cache
+
+# GroupContext is created once per request (see GroupContextMixin in views.py) and handed to the
+# permissions and serializers, so "who is in this group" and "which categories belong to it" are each
+# read at most once per request instead of once per check. The sets themselves come from the
+# cross-request group_cache (cache.py), so most requests don't query them at all.
+
+
+class GroupContext:
+    def __init__(self, group):
+        self.group = group
+        self._member_ids = None
+        self._category_ids = None
+
+    @classmethod
+    def for_user(cls, group_id, user):
+        # the group must exist and the user must be one of its members, otherwise 404 (same as the old
+        # get_object_or_404(Group, id=..., members=user), so non-members can't tell if a group exists)
+        ctx = cls(get_object_or_404(Group, id=group_id))
+        if not ctx.is_member(user.id):
+            raise Http404('No Group matches the given query.')
+        return ctx
+
+    @property
+    def member_ids(self):
+        # user ids of the members, in join order (the equal split gives the rounding remainder to the last one)
+        if self._member_ids is None:
+            self._member_ids = list(group_cache.member_ids(self.group.id))
+            self._member_set = set(self._member_ids)
+        return self._member_ids
+
+    @property
+    def category_ids(self):
+        if self._category_ids is None:
+            self._category_ids = group_cache.category_ids(self.group.id)
+        return self._category_ids
+
+    def is_member(self, user_id):
+        self.member_ids # make sure the member set is loaded
+        return user_id in self._member_set
@@ -0,0 +1,16 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class Conflict(APIException):
+    # 409: the row changed since the client read it (optimistic concurrency, see Expense.version)
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'This resource was changed by someone else. Reload it and try again.'
+    default_code = 'conflict'
+
+
+class PreconditionRequired(APIException):
+    # 428: an expense update must say which version it was made against (the body's "version" or If-Match)
+    status_code = status.HTTP_428_PRECONDITION_REQUIRED
+    default_detail = 'Send the version you read, as "version" in the body or in an If-Match header.'
+    default_code = 'precondition_required'
@@ -0,0 +1,125 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from rest_framework import serializers
+from .models import Expense, ExpenseSplit, Settlement, ArchivedExpense, ArchivedExpenseSplit
+
+# export.py: full history of a group as CSV or newline-delimited JSON, built as a generator for StreamingHttpResponse.
+# Rows are read with .values_list().iterator(chunk_size=...): on PostgreSQL that is a server-side cursor, so only one
+# chunk of rows is in memory at a time (no model instances, no list of the whole table), and the output is handed
+# to the client in ~64 KB pieces as it is produced. Memory stays the same for 1,000 or 10,000,000 rows.
+# Optional gzip compresses the same pieces on the fly (zlib stream with a gzip header).
+
+CHUNK_SIZE = 2000 # rows fetched from the cursor per round trip
+FLUSH_BYTES = 64 * 1024 # output is yielded in pieces of about this size
+
+EXPENSE_COLUMNS = ('id', 'spent_at', 'description', 'amount', 'category_id', 'category__name', 'paid_by_id',
+                   'paid_by__username', 'created_by_id', 'created_by__username', 'version')
+SPLIT_COLUMNS = ('id', 'expense_id', 'spent_at', 'user_id', 'user__username', 'share')
+
+
+def _expenses(group_id):
+    # live rows UNION ALL the rows moved to the archive tables (periods.archive_period), so the file still holds
+    # the full history; the ids never overlap (archived rows keep their original id)
+    archived = ArchivedExpense.objects.filter(group_id=group_id).values_list(*EXPENSE_COLUMNS)
+    return (Expense.objects.filter(group_id=group_id).values_list(*EXPENSE_COLUMNS)
+            .union(archived, all=True).order_by('spent_at', 'id'))
+
+
+def _splits(group_id):
+    archived = ArchivedExpenseSplit.objects.filter(expense__group_id=group_id).values_list(*SPLIT_COLUMNS)
+    return (ExpenseSplit.objects.filter(expense__group_id=group_id).values_list(*SPLIT_COLUMNS)
+            .union(archived, all=True).order_by('expense_id', 'id'))
+
+
+# table name -> (column names in the file, queryset builder). Ordered by (date, id) / (expense, id).
+TABLES = {
+    'expenses': (
+        ('id', 'spent_at', 'description', 'amount', 'category_id', 'category_name', 'paid_by_id',
+         'paid_by_username', 'created_by_id', 'created_by_username', 'version'),
+        _expenses,
+    ),
+    'splits': (
+        ('id', 'expense_id', 'spent_at', 'user_id', 'username', 'share'),
+        _splits,
+    ),
+    'settlements': (
+        ('id', 'settled_at', 'from_user_id', 'from_username', 'to_user_id', 'to_username', 'amount', 'note'),
+        lambda group_id: Settlement.objects.filter(group_id=group_id).order_by('settled_at', 'id').values_list(
+            'id', 'settled_at', 'from_user_id', 'from_user__username', 'to_user_id', 'to_user__username', 'amount', 'note'),
+    ),
+}
+TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+_datetime = serializers.DateTimeField() # same timestamp format as the API responses ('Z' suffix in UTC)
+
+
+def cell(value):
+    # Decimal → '12.50' (never a float), datetime → API format; everything else as is
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return _datetime.to_representation(value)
+    return value
+
+
+def csv_lines(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(['' if value is None else cell(value) for value in row])
+        if buffer.tell() >= FLUSH_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def jsonl_lines(columns, rows):
+    # one JSON object per line, keys in column order
+    piece = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, map(cell, row))), separators=(',', ':')) + '\n'
+        piece.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(piece)
+            piece, size = [], 0
+    yield ''.join(piece)
+
+
+def gzipped(chunks):
+    # wbits=31 → gzip container, so the download is a normal .gz file
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def counted(rows, every, callback):
+    # passes the rows through, calling callback(rows so far) every `every` rows (progress of export jobs)
+    count = 0
+    for count, row in enumerate(rows, 1):
+        yield row
+        if count % every == 0:
+            callback(count)
+    callback(count)
+
+
+def stream(group_id, table, file_type, gzip=False, chunk_size=CHUNK_SIZE, using=None, on_rows=None):
+    # using: database alias, picked while the request is handled (the body is read after the view has returned,
+    # outside the request's replica routing, see replicas.py)
+    columns, queryset = TABLES[table]
+    rows = queryset(group_id).using(using).iterator(chunk_size=chunk_size)
+    if on_rows is not None:
+        rows = counted(rows, chunk_size, on_rows)
+    lines = csv_lines(columns, rows) if file_type == 'csv' else jsonl_lines(columns, rows)
+    chunks = (text.encode() for text in lines if text)
+    return gzipped(chunks) if gzip else chunks
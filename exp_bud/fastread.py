@@ -0,0 +1,113 @@
+from collections import defaultdict
+from functools import lru_cache
+from .models import ExpenseSplit, Member, Category
+from .serializers import (ExpenseSerializer, ExpenseSplitOutputSerializer, GroupSerializer,
+                          MemberInfoSerializer, CategorySerializer)
+
+# fastread.py: read-only fast path for the big list endpoints.
+# The DRF serializers build a tree of Field objects and walk it for every row (and every nested split/member).
+# Here each row comes from .values_list() (no model instances) and is turned into a plain dict with the keys in
+# the same order as the serializer's Meta.fields, so the rendered JSON is byte-identical to the serializer output.
+# Decimal and datetime values go through the serializers' own field instances, so formatting (decimal places,
+# timezone, the 'Z' suffix) can't drift. Views opt in with `fast_read = True` (see views.py).
+# If a serializer gains or changes a field, update the matching builder here; the parity tests will catch a mismatch.
+
+EXPENSE_COLUMNS = ('id', 'group_id', 'description', 'amount', 'spent_at', 'category_id', 'category__name',
+                   'created_by_id', 'created_by__username', 'paid_by_id', 'paid_by__username', 'version')
+
+
+@lru_cache(maxsize=None)
+def _fields():
+    # field instances are stateless for to_representation, so one set is shared by every request
+    expense = ExpenseSerializer().fields
+    return {
+        'amount': expense['amount'],
+        'spent_at': expense['spent_at'],
+        'share': ExpenseSplitOutputSerializer().fields['share'],
+        'group_created_at': GroupSerializer().fields['created_at'],
+        'joined_at': MemberInfoSerializer().fields['joined_at'],
+        'category_created_at': CategorySerializer().fields['created_at'],
+    }
+
+
+def expense_values(queryset):
+    # rows as named tuples: the cursor paginator only needs row.spent_at and row.id
+    return queryset.values_list(*EXPENSE_COLUMNS, named=True)
+
+
+def split_values(rows):
+    # the one query for the splits of these expense rows; the spent_at range of the page lets PostgreSQL
+    # read only the split partitions of those months (partitions.py)
+    return (ExpenseSplit.objects.filter(expense_id__in=[row.id for row in rows],
+                                        spent_at__gte=min(row.spent_at for row in rows),
+                                        spent_at__lte=max(row.spent_at for row in rows)).order_by('id')
+            .values_list('id', 'user_id', 'user__username', 'expense_id', 'share'))
+
+
+def expense_dicts(rows, split_rows=None):
+    # rows from expense_values() → ExpenseSerializer(many=True).data, plus one query for all their splits
+    # (async callers evaluate split_values() themselves and pass the result in)
+    fields = _fields()
+    amount, spent_at, share = fields['amount'].to_representation, fields['spent_at'].to_representation, fields['share'].to_representation
+
+    splits = defaultdict(list)
+    if rows:
+        if split_rows is None:
+            split_rows = split_values(rows)
+        for split_id, user_id, username, expense_id, value in split_rows:
+            splits[expense_id].append({'id': split_id, 'user_id': user_id, 'username': username,
+                                       'expense': expense_id, 'share': share(value)})
+
+    return [{
+        'id': row.id,
+        'group': row.group_id,
+        'description': row.description,
+        'amount': amount(row.amount),
+        'spent_at': spent_at(row.spent_at),
+        'category_id': row.category_id,
+        'category_name': row.category__name,
+        'created_by': row.created_by_id,
+        'created_by_username': row.created_by__username,
+        'paid_by_id': row.paid_by_id,
+        'paid_by_username': row.paid_by__username,
+        'splits': splits.get(row.id, []),
+        'version': row.version,
+    } for row in rows]
+
+
+def group_dicts(queryset, only=None):
+    # groups → GroupSerializer(many=True).data in 3 queries: groups, their categories, their members.
+    # only: optional list of field names (?fields=); nested arrays that are not asked for are not queried.
+    fields = _fields()
+    created_at, joined_at = fields['group_created_at'].to_representation, fields['joined_at'].to_representation
+    category_created_at = fields['category_created_at'].to_representation
+
+    groups = list(queryset.values_list('id', 'name', 'currency', 'created_by_id', 'created_by__username', 'created_at'))
+    ids = [row[0] for row in groups]
+    names = {row[0]: row[1] for row in groups}
+    categories, members = defaultdict(list), defaultdict(list)
+    if ids and (only is None or 'categories' in only):
+        for cat_id, group_id, name, created in (Category.objects.filter(group_id__in=ids).order_by('id')
+                                                .values_list('id', 'group_id', 'name', 'created_at')):
+            categories[group_id].append({'id': cat_id, 'group_name': names[group_id], 'name': name,
+                                         'created_at': category_created_at(created)})
+    if ids and (only is None or 'members_info' in only):
+        for member_id, group_id, user_id, username, role, joined in (Member.objects.filter(group_id__in=ids).order_by('id')
+                                                                     .values_list('id', 'group_id', 'user_id', 'user__username', 'role', 'joined_at')):
+            members[group_id].append({'id': member_id, 'user_id': user_id, 'username': username, 'role': role,
+                                      'joined_at': joined_at(joined)})
+
+    rows = [{
+        'id': group_id,
+        'name': name,
+        'currency': currency,
+        'categories': categories.get(group_id, []),
+        'created_by': created_by_id,
+        'created_by_username': created_by_name,
+        'members_info': members.get(group_id, []),
+        'created_at': created_at(created),
+    } for group_id, name, currency, created_by_id, created_by_name, created in groups]
+    if only is not None:
+        keep = [name for name in GroupSerializer.Meta.fields if name in only] # serializer order, not ?fields= order
+        rows = [{name: row[name] for name in keep} for row in rows]
+    return rows
@@ -0,0 +1,198 @@
+import codecs
+import csv
+import json
+from decimal import Decimal
+from itertools import islice
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+from .models import Member, Category, Expense, ExpenseSplit
+from .serializers import ExpenseSplitInputSerializer, equal_shares
+from . import ledger, rollups, versions, periods
+
+# importer.py streams a CSV or JSONL file into a group's expenses.
+# Rows are read lazily and handled CHUNK_SIZE at a time: members and categories are looked up once per chunk,
+# expenses and splits are written with bulk_create, so memory stays flat no matter how big the file is.
+#
+# CSV header:  amount,paid_by_id,category_id,category,description,spent_at,splits
+#              splits is optional, written as "user_id:share;user_id:share" (empty → equal split)
+# JSONL line:  {"amount": "12.50", "paid_by_id": 3, "category": "food", "split_items": [{"user_id": 3, "share": "12.50"}]}
+
+CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000 # keep the response (and memory) bounded even when every row is bad
+FORMATS = ('csv', 'jsonl')
+
+
+class ImportRowSerializer(serializers.Serializer):
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    paid_by_id = serializers.IntegerField()
+    category_id = serializers.IntegerField(required=False, allow_null=True)
+    category = serializers.CharField(required=False, allow_blank=True) # category name, alternative to category_id
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    spent_at = serializers.DateTimeField(required=False, allow_null=True)
+    split_items = ExpenseSplitInputSerializer(many=True, required=False)
+
+    def validate(self, attrs):
+        # member ids and categories come from the chunk lookup in the context, no query per row
+        member_ids = self.context['member_ids']
+        categories = self.context['categories']
+
+        if attrs['paid_by_id'] not in member_ids:
+            raise serializers.ValidationError({'paid_by_id': 'paid_by user must be a member of the group'})
+
+        cat_id = attrs.get('category_id')
+        if cat_id is None:
+            cat_id = categories['by_name'].get(attrs.get('category') or '')
+        if cat_id is None or cat_id not in categories['ids']:
+            raise serializers.ValidationError({'category_id': 'category does not belong to the group'})
+        attrs['category_id'] = cat_id
+
+        split_items = attrs.get('split_items')
+        if split_items:
+            if any(item['user_id'] not in member_ids for item in split_items):
+                raise serializers.ValidationError({'split_items': 'split user must be the member of the group'})
+            if len({item['user_id'] for item in split_items}) != len(split_items):
+                raise serializers.ValidationError({'split_items': 'each user can appear only once'})
+            if sum(item['share'] for item in split_items) != attrs['amount']:
+                raise serializers.ValidationError({'split_items': 'split total must equal the expense amount'})
+        elif not member_ids:
+            raise serializers.ValidationError('Group has no member')
+        periods.check_open(self.context['group_id'], attrs.get('spent_at')) # cached set of closed months
+        return attrs
+
+
+def _parse_csv_splits(value):
+    # "3:10.00;4:5.00" → [{'user_id': '3', 'share': '10.00'}, ...]; the serializer converts the types
+    items = []
+    for part in filter(None, (p.strip() for p in value.split(';'))):
+        user_id, _, share = part.partition(':')
+        items.append({'user_id': user_id.strip(), 'share': share.strip()})
+    return items
+
+
+def read_rows(stream, kind):
+    # yields (line_number, row_dict, parse_error) one row at a time; stream is a binary file-like object
+    text = codecs.getreader('utf-8')(stream)
+    if kind == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            row = {k: v for k, v in row.items() if k and v not in (None, '')} # empty cells → field not sent
+            if 'splits' in row:
+                row['split_items'] = _parse_csv_splits(row.pop('splits'))
+            yield reader.line_num, row, None
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, None, 'invalid JSON'
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, 'each line must be a JSON object'
+                continue
+            yield line_number, row, None
+
+
+def _chunk_lookups(group, rows):
+    # one query for members and one for the categories named in this chunk.
+    # Members in join order, like GroupContext.member_ids: the last one gets the rounding cent of an equal split,
+    # so an imported expense is split exactly like the same expense created through the API.
+    members = list(Member.objects.filter(group=group).order_by('id').values_list('user_id', flat=True))
+
+    ids, names = set(), set()
+    for _, row, _ in rows:
+        if not row:
+            continue
+        if row.get('category_id') not in (None, ''):
+            try:
+                ids.add(int(row['category_id']))
+            except (TypeError, ValueError):
+                pass # reported by the row serializer
+        elif row.get('category'):
+            names.add(str(row['category']))
+
+    found = Category.objects.filter(group=group).filter(Q(id__in=ids) | Q(name__in=names)).values_list('id', 'name')
+    categories = {'ids': set(), 'by_name': {}}
+    for cat_id, name in found:
+        categories['ids'].add(cat_id)
+        categories['by_name'][name] = cat_id
+    return members, categories
+
+
+def _import_chunk(group, user, rows, report):
+    members, categories = _chunk_lookups(group, rows)
+    context = {'group_id': group.id, 'member_ids': set(members), 'categories': categories}
+
+    valid = []
+    for line_number, row, error in rows:
+        if error is None:
+            serializer = ImportRowSerializer(data=row, context=context)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+                continue
+            error = serializer.errors
+        report['error_count'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': line_number, 'errors': error})
+
+    if not valid:
+        return
+
+    with transaction.atomic(): # one short transaction per chunk
+        expenses = Expense.objects.bulk_create([
+            Expense(group=group, category_id=data['category_id'], paid_by_id=data['paid_by_id'], created_by=user,
+                    amount=data['amount'], description=data.get('description', ''),
+                    spent_at=data.get('spent_at') or timezone.now())
+            for data in valid
+        ])
+
+        splits, deltas = [], {}
+        for expense, data in zip(expenses, valid):
+            if data.get('split_items'):
+                pairs = [(item['user_id'], item['share']) for item in data['split_items']]
+            else:
+                pairs = zip(members, equal_shares(expense.amount, len(members)))
+            expense_splits = [ExpenseSplit(expense=expense, user_id=uid, share=share) for uid, share in pairs]
+            splits.extend(expense_splits)
+
+            # merge the ledger deltas of the whole chunk so the ledger is touched once per chunk
+            ledger.merge_deltas(deltas, ledger.expense_deltas(expense, expense_splits))
+
+        ExpenseSplit.objects.bulk_create(splits, batch_size=1000)
+        ledger.apply_deltas(group.id, deltas)
+        rollups.apply_deltas(group.id, rollups.expense_deltas(expenses)) # one row per (month, category) in the chunk
+        versions.bump(group.id) # bulk_create sends no signals
+
+    report['created'] += len(expenses)
+
+
+def import_expenses(group, user, stream, kind, chunk_size=CHUNK_SIZE):
+    # returns {'created': n, 'error_count': n, 'errors': [{'row': line, 'errors': {...}}, ...]}
+    # plus 'file': message when the file itself can't be read (the chunks before that point stay imported)
+    report = {'created': 0, 'error_count': 0, 'errors': []}
+    rows = read_rows(stream, kind)
+    while True:
+        try:
+            chunk = list(islice(rows, chunk_size)) # only chunk_size rows are in memory at any time
+        except UnicodeDecodeError: # the text is decoded while it is read, so this surfaces mid-file
+            report['file'] = 'The file must be UTF-8 encoded'
+            break
+        if not chunk:
+            break
+        _import_chunk(group, user, chunk, report)
+    return report
+
+
+def detect_format(name, requested=None):
+    # explicit ?type=csv|jsonl wins, otherwise guess from the file extension
+    if requested:
+        return requested if requested in FORMATS else None
+    name = (name or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return None
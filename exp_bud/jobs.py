@@ -0,0 +1,178 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+from . import ledger, rollups, export, versions
+
+logger = logging.getLogger('exp_bud.jobs')
+
+# Database-backed job queue for the work too slow for a request: ledger/rollup rebuilds and export files.
+# The API enqueues a Job row and answers 202 with it; `manage.py run_jobs` claims queued rows one at a time, runs the
+# handler registered for the kind, and records progress/result/error on the row (GET jobs/<id>/ reads it back).
+#
+#   dedup:    one queued/running job per (group, kind, key), enforced by the uniq_active_job constraint;
+#             enqueueing the same work again returns the job already waiting
+#   claiming: compare-and-set UPDATE ... WHERE status = 'queued', so several workers never run the same job
+#             (works the same on SQLite and PostgreSQL, no row locks held while the job runs)
+#   retries:  a failed attempt goes back to the queue after RETRY_DELAY * 2^(attempt-1) seconds, until max_attempts
+#   crashes:  while a handler runs, a second thread refreshes heartbeat_at (a rebuild is one long transaction that can't
+#             report); a job silent for STALE_SECONDS means its worker was killed, and it is requeued
+#
+# settings.EXP_BUD_JOBS (all keys optional):
+#   'MAX_ATTEMPTS': 3
+#   'RETRY_DELAY': 30        → seconds before the first retry
+#   'STALE_SECONDS': 600     → a running job without heartbeat for this long is given back to the queue
+#   'EXPORT_DIR': BASE_DIR / 'exports' → where export jobs write their files
+
+HANDLERS = {}
+ACTIVE = (Job.Status.QUEUED, Job.Status.RUNNING)
+
+
+def config():
+    return {'MAX_ATTEMPTS': 3, 'RETRY_DELAY': 30, 'STALE_SECONDS': 600,
+            'EXPORT_DIR': os.path.join(settings.BASE_DIR, 'exports'), **getattr(settings, 'EXP_BUD_JOBS', {})}
+
+
+def handler(kind):
+    # @handler(Job.Kind.X) def run(job) → result (JSON-serializable); raising marks the attempt failed
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+def enqueue(group_id, kind, params=None, key='', user=None):
+    # → (job, created)
+    try:
+        with transaction.atomic(): # savepoint: a duplicate must not break the caller's transaction
+            job = Job.objects.create(group_id=group_id, kind=kind, key=key, params=params or {}, created_by=user,
+                                     max_attempts=config()['MAX_ATTEMPTS'])
+        return job, True
+    except IntegrityError:
+        job = Job.objects.filter(group_id=group_id, kind=kind, key=key, status__in=ACTIVE).first()
+        if job is None: # it finished in between
+            return enqueue(group_id, kind, params, key, user)
+        return job, False
+
+
+def claim():
+    # the oldest due job, now running; None when there is nothing to do
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.Status.QUEUED, run_after__lte=now).order_by('run_after', 'id')
+    for job_id in due.values_list('id', flat=True)[:10]:
+        # another worker may win this row between the SELECT and here: then 0 rows match and we try the next one
+        if Job.objects.filter(id=job_id, status=Job.Status.QUEUED).update(
+                status=Job.Status.RUNNING, attempts=F('attempts') + 1, started_at=now, heartbeat_at=now, progress=0):
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def report(job, progress, message=''):
+    # progress (percent) + a short message, visible on GET jobs/<id>/; also the heartbeat of the job
+    job.progress, job.message = progress, message[:200]
+    Job.objects.filter(id=job.id).update(progress=progress, message=job.message, heartbeat_at=timezone.now())
+
+
+@contextmanager
+def heartbeat(job):
+    # refresh heartbeat_at every STALE_SECONDS / 3 from a separate thread (with its own database connection) while the
+    # block runs, so a long step that reports nothing is not taken for a stopped worker and run a second time
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(config()['STALE_SECONDS'] / 3):
+                Job.objects.filter(id=job.id, status=Job.Status.RUNNING).update(heartbeat_at=timezone.now())
+        finally:
+            connections.close_all() # only the connections of this thread
+    
+    thread = threading.Thread(target=beat, name=f'job-{job.id}-heartbeat', daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def run(job):
+    # run a claimed job; returns it with its final (or requeued) state
+    try:
+        with heartbeat(job):
+            result = HANDLERS[job.kind](job)
+    except Exception as exc:
+        logger.exception('job %s (%s, group %s) failed, attempt %s of %s', job.id, job.kind, job.group_id, job.attempts, job.max_attempts)
+        fields = {'error': f'{type(exc).__name__}: {exc}', 'heartbeat_at': timezone.now()}
+        if job.attempts < job.max_attempts:
+            delay = config()['RETRY_DELAY'] * 2 ** (job.attempts - 1)
+            fields.update(status=Job.Status.QUEUED, run_after=timezone.now() + timedelta(seconds=delay))
+        else:
+            fields.update(status=Job.Status.FAILED, finished_at=timezone.now())
+        Job.objects.filter(id=job.id).update(**fields)
+    else:
+        Job.objects.filter(id=job.id).update(status=Job.Status.DONE, progress=100, result=result, error='', finished_at=timezone.now())
+    job.refresh_from_db()
+    return job
+
+
+def requeue_stale():
+    # running jobs whose worker stopped (no heartbeat for STALE_SECONDS): back to the queue, or failed when out of attempts
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.Status.RUNNING, heartbeat_at__lt=now - timedelta(seconds=config()['STALE_SECONDS']))
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.Status.FAILED, error='the worker running it stopped responding', finished_at=now)
+    return stale.update(status=Job.Status.QUEUED, run_after=now) + failed
+
+
+def export_path(job):
+    # file of an export job; the name is made of ids only, so it can't point outside EXPORT_DIR
+    extension = job.params['type'] + ('.gz' if job.params.get('gzip') else '')
+    return os.path.join(config()['EXPORT_DIR'], f'group-{job.group_id}-{job.params["table"]}-job{job.id}.{extension}')
+
+
+@handler(Job.Kind.REBUILD_BALANCES)
+def rebuild_balances(job):
+    report(job, 10, 'rebuilding the ledger')
+    with transaction.atomic():
+        rows = ledger.rebuild_group(job.group_id)
+        versions.bump(job.group_id) # summaries cached from the old ledger rows
+    report(job, 70, 'verifying')
+    return {'rows': rows, 'mismatches': len(ledger.verify_group(job.group_id))}
+
+
+@handler(Job.Kind.REBUILD_ROLLUPS)
+def rebuild_rollups(job):
+    report(job, 10, 'rebuilding the rollup')
+    with transaction.atomic():
+        rows = rollups.rebuild_group(job.group_id)
+        versions.bump(job.group_id)
+    report(job, 70, 'verifying')
+    return {'rows': rows, 'mismatches': len(rollups.verify_group(job.group_id))}
+
+
+@handler(Job.Kind.EXPORT)
+def export_file(job):
+    # the same stream as GET groups/<id>/export/, written to a file (first to a temporary name, so a download
+    # never sees half a file); progress = rows written / rows counted at the start
+    table, file_type, gzip = job.params['table'], job.params['type'], job.params.get('gzip', False)
+    total = export.TABLES[table][1](job.group_id).count() or 1
+    path = export_path(job)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = {'rows': 0, 'bytes': 0}
+    
+    def on_rows(count):
+        written['rows'] = count
+        report(job, min(99, count * 100 // total), f'{count} of {total} rows')
+    
+    with open(path + '.part', 'wb') as fh:
+        for chunk in export.stream(job.group_id, table, file_type, gzip, on_rows=on_rows):
+            fh.write(chunk)
+            written['bytes'] += len(chunk)
+    os.replace(path + '.part', path)
+    return {'file': os.path.basename(path), **written}
@@ -0,0 +1,214 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db.models import CharField, F, Sum, Value
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+from .models import Group, Expense, ExpenseSplit, Settlement, MemberBalance, ArchivedExpense, ArchivedExpenseSplit
+
+# ledger.py keeps MemberBalance rows in sync with the raw Expense / ExpenseSplit / Settlement rows.
+# Every write path calls apply_expense() / apply_settlements() inside its own transaction.atomic block,
+# so the ledger and the raw rows are committed (or rolled back) together.
+
+ZERO = Decimal('0.00')
+FIELDS = ['paid', 'owed', 'sent', 'received']
+
+
+def period_of(dt):
+    # bucket a datetime into (year, month) using the same timezone GroupSummaryView uses for its range
+    local = timezone.localtime(dt)
+    return local.year, local.month
+
+
+def _new_delta():
+    return {name: ZERO for name in FIELDS}
+
+
+def expense_deltas(expense, splits, sign=1):
+    # splits are passed in by the caller (it already has them in memory) so no extra query is needed
+    year, month = period_of(expense.spent_at)
+    deltas = defaultdict(_new_delta) # key: (user_id, year, month) -> {'paid': .., 'owed': .., ...}
+    deltas[(expense.paid_by_id, year, month)]['paid'] += sign * expense.amount
+    for s in splits:
+        deltas[(s.user_id, year, month)]['owed'] += sign * s.share
+    return deltas
+
+
+def settlement_deltas(settlements, sign=1):
+    deltas = defaultdict(_new_delta)
+    for st in settlements:
+        year, month = period_of(st.settled_at)
+        deltas[(st.from_user_id, year, month)]['sent'] += sign * st.amount
+        deltas[(st.to_user_id, year, month)]['received'] += sign * st.amount
+    return deltas
+
+
+def merge_deltas(target, deltas):
+    # add deltas into target (a dict returned by expense_deltas/settlement_deltas) so many writes
+    # can be applied to the ledger with one apply_deltas() call
+    for key, delta in deltas.items():
+        merged = target.setdefault(key, _new_delta())
+        for name in FIELDS:
+            merged[name] += delta[name]
+    return target
+
+
+def lock_group(group_id):
+    # Row lock on the group, held until the transaction ends. Writers take it before touching the ledger (and rollup)
+    # rows, rebuild_group() before reading the raw rows. So a rebuild never runs between a writer's raw insert and its
+    # deltas: it either waits for the writer to commit and then reads its rows, or it commits first and the writer's
+    # deltas land on the rebuilt ledger. Without it a concurrent expense could be lost or counted twice.
+    list(Group.objects.select_for_update().filter(id=group_id).values_list('id', flat=True))
+
+
+def apply_deltas(group_id, deltas):
+    # Must be called inside transaction.atomic. Costs a small, fixed number of queries no matter how many members:
+    #   0. lock the group against a concurrent rebuild (lock_group above)
+    #   1. insert missing ledger rows (ignore_conflicts → existing rows are left alone)
+    #   2. lock the affected rows (ordered by id so concurrent writers lock in the same order → no deadlock)
+    #   3. one UPDATE ... SET col = col + delta per distinct delta. An equal split gives almost every member
+    #      the same delta, so a 1,000 member expense is ~3 UPDATEs instead of a 1,000 row CASE statement.
+    if not deltas:
+        return
+    lock_group(group_id)
+    MemberBalance.objects.bulk_create(
+        [MemberBalance(group_id=group_id, user_id=uid, year=y, month=m) for (uid, y, m) in deltas],
+        ignore_conflicts=True,
+    )
+    locked = (MemberBalance.objects.select_for_update()
+              .filter(group_id=group_id,
+                      user_id__in={k[0] for k in deltas},
+                      year__in={k[1] for k in deltas},
+                      month__in={k[2] for k in deltas})
+              .order_by('id')
+              .values_list('id', 'user_id', 'year', 'month'))
+
+    ids_by_delta = defaultdict(list)
+    for row_id, user_id, year, month in locked:
+        delta = deltas.get((user_id, year, month))
+        if delta is None: # the __in filters can match other (user, period) pairs; skip those
+            continue
+        ids_by_delta[tuple(delta[name] for name in FIELDS)].append(row_id)
+
+    for values, ids in ids_by_delta.items():
+        changes = {name: F(name) + value for name, value in zip(FIELDS, values) if value}
+        if changes:
+            MemberBalance.objects.filter(id__in=ids).update(**changes)
+
+
+def apply_expense(expense, splits, sign=1):
+    # sign=1 adds the expense to the ledger, sign=-1 removes it (used before update/delete)
+    apply_deltas(expense.group_id, expense_deltas(expense, splits, sign))
+
+
+def apply_settlements(group_id, settlements, sign=1):
+    apply_deltas(group_id, settlement_deltas(settlements, sign))
+
+
+def _totals(qs, user_field, kind, amount_field, period=False):
+    # one GROUP BY query shape shared by every source: (user_id, kind, [year, month,] total)
+    # kind tells which ledger column the total belongs to after the UNION below
+    columns = [user_field, 'kind'] + (['year', 'month'] if period else [])
+    return (qs.annotate(kind=Value(kind, output_field=CharField()))
+            .values_list(*columns)
+            .annotate(total=Sum(amount_field))
+            .order_by()) # clear default ordering, it would be added to the GROUP BY
+
+
+def _money(value):
+    # SQLite sums decimals as floats; round back to cents so both backends give the same Decimal
+    return Decimal(value).quantize(ZERO)
+
+
+def _merged_totals(parts):
+    # UNION ALL the grouped queries so the database does all the summing in a single round trip;
+    # Python only sees one row per (user, source[, period]) → work scales with members, not with splits
+    first, *rest = parts
+    return first.union(*rest, all=True)
+
+
+def raw_balances(group_id, start, end):
+    # Net balance per user straight from the raw rows for [start, end), computed with aggregate queries.
+    # Used when the requested range is not a whole month, and to verify the ledger.
+    expenses = Expense.objects.filter(group_id=group_id, spent_at__gte=start, spent_at__lt=end)
+    # the range on both tables' spent_at, so on PostgreSQL both are pruned to the partitions of [start, end)
+    splits = ExpenseSplit.objects.filter(expense__group_id=group_id, expense__spent_at__gte=start, expense__spent_at__lt=end,
+                                         spent_at__gte=start, spent_at__lt=end)
+    settlements = Settlement.objects.filter(group_id=group_id, settled_at__gte=start, settled_at__lt=end)
+    # rows of archived periods (periods.py) still count, in the same round trip
+    archived = ArchivedExpense.objects.filter(group_id=group_id, spent_at__gte=start, spent_at__lt=end)
+    archived_splits = ArchivedExpenseSplit.objects.filter(expense__group_id=group_id, spent_at__gte=start, spent_at__lt=end)
+
+    rows = _merged_totals([
+        _totals(expenses, 'paid_by_id', 'paid', 'amount'),
+        _totals(splits, 'user_id', 'owed', 'share'),
+        _totals(archived, 'paid_by_id', 'paid', 'amount'),
+        _totals(archived_splits, 'user_id', 'owed', 'share'),
+        _totals(settlements, 'from_user_id', 'sent', 'amount'),
+        _totals(settlements, 'to_user_id', 'received', 'amount'),
+    ])
+
+    balances = defaultdict(lambda: ZERO)
+    for user_id, kind, total in rows:
+        # + means user should receive, - means user owes
+        total = _money(total)
+        balances[user_id] += total if kind in ('paid', 'sent') else -total
+    return balances
+
+
+def compute_group_ledger(group_id):
+    # Recompute every (user, year, month) ledger row of a group from the raw rows, grouped by the database.
+    # ExtractYear/ExtractMonth use the current timezone, same as period_of().
+    expenses = Expense.objects.filter(group_id=group_id).annotate(
+        year=ExtractYear('spent_at'), month=ExtractMonth('spent_at'))
+    splits = ExpenseSplit.objects.filter(expense__group_id=group_id).annotate(
+        year=ExtractYear('expense__spent_at'), month=ExtractMonth('expense__spent_at'))
+    settlements = Settlement.objects.filter(group_id=group_id).annotate(
+        year=ExtractYear('settled_at'), month=ExtractMonth('settled_at'))
+    archived = ArchivedExpense.objects.filter(group_id=group_id).annotate(
+        year=ExtractYear('spent_at'), month=ExtractMonth('spent_at'))
+    archived_splits = ArchivedExpenseSplit.objects.filter(expense__group_id=group_id).annotate(
+        year=ExtractYear('spent_at'), month=ExtractMonth('spent_at'))
+
+    rows = _merged_totals([
+        _totals(expenses, 'paid_by_id', 'paid', 'amount', period=True),
+        _totals(splits, 'user_id', 'owed', 'share', period=True),
+        _totals(archived, 'paid_by_id', 'paid', 'amount', period=True),
+        _totals(archived_splits, 'user_id', 'owed', 'share', period=True),
+        _totals(settlements, 'from_user_id', 'sent', 'amount', period=True),
+        _totals(settlements, 'to_user_id', 'received', 'amount', period=True),
+    ])
+
+    deltas = defaultdict(_new_delta)
+    for user_id, kind, year, month, total in rows:
+        deltas[(user_id, year, month)][kind] += _money(total)
+    return deltas
+
+
+def rebuild_group(group_id):
+    # Must be called inside transaction.atomic: drop the group's ledger and write it again from raw rows
+    lock_group(group_id) # waits for writers in flight, blocks new ones until the commit
+    deltas = compute_group_ledger(group_id)
+    MemberBalance.objects.filter(group_id=group_id).delete()
+    MemberBalance.objects.bulk_create(
+        [MemberBalance(group_id=group_id, user_id=uid, year=y, month=m, **values) for (uid, y, m), values in deltas.items()],
+        batch_size=1000,
+    )
+    return len(deltas)
+
+
+def verify_group(group_id):
+    # Compare the stored ledger with a fresh computation. Returns a list of mismatches (empty list → ledger is correct)
+    expected = compute_group_ledger(group_id)
+    stored = {
+        (row.user_id, row.year, row.month): {name: getattr(row, name) for name in FIELDS}
+        for row in MemberBalance.objects.filter(group_id=group_id)
+    }
+
+    mismatches = []
+    for key in expected.keys() | stored.keys():
+        want = expected.get(key, _new_delta())
+        have = stored.get(key, _new_delta())
+        if want != have:
+            user_id, year, month = key
+            mismatches.append({'user_id': user_id, 'year': year, 'month': month, 'expected': want, 'stored': have})
+    return mismatches
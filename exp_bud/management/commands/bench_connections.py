@@ -0,0 +1,129 @@
+import json
+import statistics
+import threading
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from exp_bud.management.commands.bench_views import percentile
+
+MODES = ('per_request', 'persistent', 'pooled')
+
+
+class Command(BaseCommand):
+    help = ('Compare connect-per-request, persistent connections and a psycopg pool on the configured PostgreSQL: '
+            'throughput, latency percentiles and database sessions used, as JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='requests per thread and mode')
+        parser.add_argument('--threads', type=int, default=4, help='concurrent worker threads (like a threaded WSGI server)')
+        parser.add_argument('--warmup', type=int, default=10, help='untimed requests per thread')
+        parser.add_argument('--pool-size', type=int, default=None, help='max connections of the pool (default: --threads)')
+        parser.add_argument('--modes', default=','.join(MODES), help=f'comma separated, from {", ".join(MODES)}')
+        parser.add_argument('--label', default='', help='free text stored in the output (e.g. the commit)')
+        parser.add_argument('--output', help='write the JSON here instead of stdout')
+
+    def handle(self, *args, **options):
+        base = connections['default']
+        if base.vendor != 'postgresql':
+            self.stdout.write(f'connection benchmark needs PostgreSQL (database is {base.vendor}), nothing to do')
+            return
+        modes = options['modes'].split(',')
+        if set(modes) - set(MODES):
+            raise CommandError(f'unknown mode(s): {", ".join(sorted(set(modes) - set(MODES)))}')
+        if options['requests'] < 1 or options['threads'] < 1:
+            raise CommandError('--requests and --threads must be 1 or more')
+
+        results = {}
+        for mode in modes:
+            results[mode] = self.run(mode, base, options)
+            self.stderr.write(f"{mode:>12}: {results[mode]['throughput_rps']:>8.1f} req/s  "
+                              f"p95 {results[mode]['p95_ms']:.2f} ms  {results[mode]['backend_sessions']} session(s)")
+
+        report = {
+            'label': options['label'],
+            'database': f"{base.settings_dict['HOST']}:{base.settings_dict['PORT']}/{base.settings_dict['NAME']}",
+            'threads': options['threads'],
+            'requests_per_thread': options['requests'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def settings_for(self, mode, base, options):
+        # copy of the default database settings with only the connection handling changed
+        settings_dict = {**base.settings_dict, 'CONN_HEALTH_CHECKS': True}
+        db_options = {key: value for key, value in base.settings_dict.get('OPTIONS', {}).items() if key != 'pool'}
+        if mode == 'per_request':
+            settings_dict['CONN_MAX_AGE'] = 0
+        elif mode == 'persistent':
+            settings_dict['CONN_MAX_AGE'] = 600
+        else:
+            try:
+                from psycopg_pool import ConnectionPool
+            except ImportError:
+                raise CommandError('the pooled mode needs psycopg 3 with its pool: pip install "psycopg[pool]"')
+            size = options['pool_size'] or options['threads']
+            settings_dict['CONN_MAX_AGE'] = 0 # closing a pooled connection puts it back in the pool
+            db_options['pool'] = {'min_size': size, 'max_size': size, 'timeout': 30, 'check': ConnectionPool.check_connection}
+        settings_dict['OPTIONS'] = db_options
+        return settings_dict
+
+    def run(self, mode, base, options):
+        settings_dict = self.settings_for(mode, base, options)
+        alias = f'bench_{mode}' # the pool is shared by every connection object with this alias
+        timings, windows, pids, errors = [], [], set(), []
+        lock = threading.Lock()
+
+        def worker():
+            # one connection object per thread, used exactly like Django does around a request:
+            # close_if_unusable_or_obsolete() on request_started and on request_finished
+            db = base.__class__(settings_dict, alias=alias)
+            mine, seen, first = [], set(), None
+            try:
+                for i in range(options['warmup'] + options['requests']):
+                    started = time.perf_counter()
+                    db.close_if_unusable_or_obsolete()
+                    with db.cursor() as cursor:
+                        cursor.execute('SELECT pg_backend_pid()')
+                        seen.add(cursor.fetchone()[0])
+                    db.close_if_unusable_or_obsolete()
+                    if i == options['warmup']:
+                        first = started
+                    if i >= options['warmup']:
+                        mine.append((time.perf_counter() - started) * 1000)
+                windows.append((first, time.perf_counter()))
+            except Exception as exc:
+                errors.append(repr(exc))
+            finally:
+                db.close()
+            with lock:
+                timings.extend(mine)
+                pids.update(seen)
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if mode == 'pooled':
+            base.__class__(settings_dict, alias=alias).close_pool()
+        if errors:
+            raise CommandError(f'{mode}: {errors[0]}')
+
+        # timed part only: from the first timed request of any thread to the last one finishing
+        wall = max(end for _, end in windows) - min(start for start, _ in windows)
+        timings.sort()
+        return {
+            'requests': len(timings),
+            'throughput_rps': round(len(timings) / wall, 1),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'max_ms': round(timings[-1], 3),
+            'backend_sessions': len(pids), # distinct server processes = connections opened
+        }
@@ -0,0 +1,74 @@
+import statistics
+import time
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from exp_bud.models import Group, Member, Category, Expense, ExpenseSplit
+from exp_bud.serializers import equal_shares
+from exp_bud import ledger
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    # raised at the end of the benchmark so every row it created is rolled back
+    pass
+
+
+def create_per_row(group, category, user, member_ids, amount):
+    # the old path: one INSERT per split
+    expense = Expense.objects.create(group=group, category=category, paid_by=user, created_by=user, amount=amount)
+    splits = [ExpenseSplit.objects.create(expense=expense, user_id=uid, share=share)
+              for uid, share in zip(member_ids, equal_shares(amount, len(member_ids)))]
+    ledger.apply_expense(expense, splits)
+
+
+def create_bulk(group, category, user, member_ids, amount):
+    # the current ExpenseSerializer.create path: all splits in one bulk INSERT
+    expense = Expense.objects.create(group=group, category=category, paid_by=user, created_by=user, amount=amount)
+    splits = ExpenseSplit.objects.bulk_create(
+        [ExpenseSplit(expense=expense, user_id=uid, share=share)
+         for uid, share in zip(member_ids, equal_shares(amount, len(member_ids)))]
+    )
+    ledger.apply_expense(expense, splits)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark expense creation latency against group size (per-row split inserts vs bulk insert)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,50,200,1000', help='comma separated group sizes')
+        parser.add_argument('--repeat', type=int, default=20, help='expenses created per size and path')
+
+    def handle(self, *args, **options):
+        sizes = [int(x) for x in options['sizes'].split(',')]
+        self.stdout.write(f"{'members':>8} {'per-row ms':>12} {'bulk ms':>10} {'speedup':>8}")
+        try:
+            with transaction.atomic():
+                for size in sizes:
+                    group, category, user, member_ids = self.make_group(size)
+                    per_row = self.measure(create_per_row, group, category, user, member_ids, options['repeat'])
+                    bulk = self.measure(create_bulk, group, category, user, member_ids, options['repeat'])
+                    self.stdout.write(f'{size:>8} {per_row:>12.2f} {bulk:>10.2f} {per_row / bulk:>7.1f}x')
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def make_group(self, size):
+        prefix = f'bench-{size}-{time.time_ns()}'
+        users = User.objects.bulk_create([User(username=f'{prefix}-{i}') for i in range(size)])
+        group = Group.objects.create(name=prefix, created_by=users[0])
+        Member.objects.bulk_create([Member(group=group, user=u) for u in users])
+        category = Category.objects.create(group=group, name='bench')
+        return group, category, users[0], [u.id for u in users]
+
+    def measure(self, create, group, category, user, member_ids, repeat):
+        # median latency in ms of one expense creation, each wrapped in its own savepoint like the real request
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            with transaction.atomic():
+                create(group, category, user, member_ids, Decimal('1000.00'))
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,81 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from exp_bud.models import Group, Member, Category, Expense, ExpenseSplit
+from exp_bud.serializers import ExpenseSerializer, equal_shares
+from exp_bud.views import splits_prefetch
+from exp_bud import fastread
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    # raised at the end of the benchmark so every row it created is rolled back
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmark expense list rendering: ExpenseSerializer vs the fastread path (rows/second, query included)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', default='50,200,1000', help='comma separated page sizes to render')
+        parser.add_argument('--members', type=int, default=4, help='splits per expense')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        sizes = [int(x) for x in options['rows'].split(',')]
+        self.stdout.write(f"{'rows':>6} {'serializer rows/s':>18} {'fastread rows/s':>16} {'speedup':>8}")
+        try:
+            with transaction.atomic():
+                group = self.seed(max(sizes), options['members'])
+                queryset = Expense.objects.filter(group=group).order_by('-spent_at', '-id')
+                for size in sizes:
+                    slow_bytes, slow = self.measure(lambda: self.render_serializer(queryset, group, size), options['repeat'])
+                    fast_bytes, fast = self.measure(lambda: self.render_fast(queryset, size), options['repeat'])
+                    if slow_bytes != fast_bytes:
+                        raise CommandError(f'output differs at {size} rows')
+                    self.stdout.write(f'{size:>6} {size / slow:>18.0f} {size / fast:>16.0f} {slow / fast:>7.1f}x')
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def render_serializer(self, queryset, group, size):
+        rows = list(queryset.select_related('category', 'paid_by', 'created_by').prefetch_related(splits_prefetch())[:size])
+        return JSONRenderer().render(ExpenseSerializer(rows, many=True, context={'group': group}).data)
+
+    def render_fast(self, queryset, size):
+        return JSONRenderer().render(fastread.expense_dicts(list(fastread.expense_values(queryset)[:size])))
+
+    def measure(self, render, repeat):
+        # median seconds of one full render (queries + building the data + JSON)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            output = render()
+            timings.append(time.perf_counter() - started)
+        return output, statistics.median(timings)
+
+    def seed(self, expenses, members):
+        prefix = f'bench-ser-{time.time_ns()}'
+        users = User.objects.bulk_create([User(username=f'{prefix}-{i}') for i in range(members)])
+        group = Group.objects.create(name=prefix, created_by=users[0])
+        Member.objects.bulk_create([Member(group=group, user=u) for u in users])
+        category = Category.objects.create(group=group, name='bench')
+        rnd = random.Random(1)
+        now = timezone.now()
+        rows = Expense.objects.bulk_create([
+            Expense(group=group, category=category, paid_by=rnd.choice(users), created_by=users[0],
+                    amount=Decimal(rnd.randint(100, 50000)) / 100, spent_at=now - timedelta(minutes=i), description=f'expense {i}')
+            for i in range(expenses)
+        ], batch_size=1000)
+        ExpenseSplit.objects.bulk_create([
+            ExpenseSplit(expense=e, user=u, share=s) for e in rows for u, s in zip(users, equal_shares(e.amount, len(users)))
+        ], batch_size=2000)
+        return group
@@ -0,0 +1,40 @@
+import random
+import statistics
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from exp_bud import settleup
+
+
+def random_balances(size, rnd):
+    # size members with random cent balances that sum to exactly zero (like a real ledger)
+    balances = {uid: Decimal(rnd.randint(-500000, 500000)) / 100 for uid in range(1, size)}
+    balances[size] = -sum(balances.values(), Decimal('0.00'))
+    return balances
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the settle-up planner on large groups (pure Python, no database)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,5000,20000', help='comma separated member counts')
+        parser.add_argument('--repeat', type=int, default=5, help='plans per size')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        sizes = [int(x) for x in options['sizes'].split(',')]
+        self.stdout.write(f"{'members':>8} {'transfers':>10} {'median ms':>10} {'us/member':>10}")
+        for size in sizes:
+            balances = random_balances(size, rnd)
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                transfers = settleup.plan_transfers(balances)
+                timings.append((time.perf_counter() - started) * 1000)
+
+            # the plan must settle everyone exactly and use at most n - 1 transfers
+            if settleup.unsettled(balances, transfers) or len(transfers) > size - 1:
+                raise CommandError(f'invalid plan for {size} members')
+            median = statistics.median(timings)
+            self.stdout.write(f'{size:>8} {len(transfers):>10} {median:>10.2f} {median * 1000 / size:>10.2f}')
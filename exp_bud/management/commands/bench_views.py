@@ -0,0 +1,142 @@
+import json
+import statistics
+import time
+from contextlib import ExitStack
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from exp_bud.models import Group
+
+
+class Rollback(Exception):
+    # raised at the end of the run so the expenses / settlements / budgets it created are rolled back
+    pass
+
+
+class QueryCounter:
+    # execute_wrapper that counts the SQL statements of one request
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(sorted_values, p):
+    # nearest-rank percentile of an already sorted list
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = 'Replay requests against every exp_bud view in-process and print throughput, latency percentiles and query counts as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, help='group id to hit (default: the group with most expenses)')
+        parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+        parser.add_argument('--warmup', type=int, default=10, help='untimed requests per scenario')
+        parser.add_argument('--only', help='comma separated scenario names')
+        parser.add_argument('--label', default='', help='free text stored in the output (e.g. the commit)')
+        parser.add_argument('--output', help='write the JSON here instead of stdout')
+
+    def handle(self, *args, **options):
+        group = self.pick_group(options['group'])
+        user = group.created_by
+        client = APIClient()
+        client.force_authenticate(user)
+
+        scenarios = self.scenarios(group)
+        if options['only']:
+            wanted = options['only'].split(',')
+            scenarios = {name: s for name, s in scenarios.items() if name in wanted}
+
+        results = {}
+        try:
+            # writes (expense create, settlements, budget upsert) are rolled back at the end
+            with override_settings(ALLOWED_HOSTS=['localhost']), transaction.atomic():
+                for name, (method, url, data_for) in scenarios.items():
+                    results[name] = self.run(client, method, url, data_for, options['requests'], options['warmup'])
+                    self.stderr.write(f"{name:>18}: {results[name]['throughput_rps']:>8.1f} req/s  p95 {results[name]['p95_ms']:.2f} ms")
+                raise Rollback()
+        except Rollback:
+            pass
+
+        report = {
+            'label': options['label'],
+            'database': connections['default'].vendor,
+            'group': {'id': group.id, 'members': group.member_links.count(), 'expenses': group.expenses.count()},
+            'requests_per_scenario': options['requests'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def pick_group(self, group_id):
+        if group_id:
+            group = Group.objects.filter(id=group_id).select_related('created_by').first()
+        else:
+            group = Group.objects.annotate(n=Count('expenses')).order_by('-n').select_related('created_by').first()
+        if group is None:
+            raise CommandError('No group found, run seed_data first')
+        return group
+
+    def scenarios(self, group):
+        # name: (method, url, function(i) → request body or None)
+        now = timezone.localtime()
+        member_ids = list(group.member_links.order_by('id').values_list('user_id', flat=True))
+        category_id = group.categories.order_by('id').values_list('id', flat=True).first()
+        base = f'/api/groups/{group.id}'
+        return {
+            'group_list': ('get', '/api/groups/', None),
+            'group_detail': ('get', f'/api/groups/{group.id}/', None),
+            'expense_list': ('get', f'{base}/expenses/', None),
+            'expense_create': ('post', f'{base}/expenses/', lambda i: {
+                'amount': f'{10 + i % 90}.{i % 100:02d}', 'paid_by_id': member_ids[i % len(member_ids)], 'category_id': category_id}),
+            'settlement_list': ('get', f'{base}/settlements/', None),
+            'settlement_create': ('post', f'{base}/settlements/', lambda i: {
+                'from_user': member_ids[i % len(member_ids)], 'to_user': member_ids[(i + 1) % len(member_ids)], 'amount': '5.00'}),
+            'summary': ('get', f'{base}/summary/?year={now.year}&month={now.month}', None),
+            'budget_status': ('get', f'{base}/budget/status/?year={now.year}&month={now.month}', None),
+            'budget_upsert': ('post', f'{base}/budget/', lambda i: {'year': now.year, 'month': now.month, 'limit': f'{1000 + i}.00'}),
+            'report': ('get', f'{base}/report/', None),
+            'settle_up': ('get', f'{base}/settle-up/', None),
+        }
+
+    def run(self, client, method, url, data_for, requests, warmup):
+        send = getattr(client, method)
+        timings, queries, errors = [], [], 0
+        for i in range(warmup + requests):
+            counter = QueryCounter()
+            kwargs = {'data': data_for(i), 'format': 'json'} if data_for else {}
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(counter))
+                started = time.perf_counter()
+                response = send(url, HTTP_HOST='localhost', **kwargs)
+                elapsed = time.perf_counter() - started
+            if i < warmup:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(counter.count)
+            errors += response.status_code >= 400
+
+        timings.sort()
+        return {
+            'requests': requests,
+            'errors': errors,
+            'throughput_rps': round(requests / (sum(timings) / 1000), 1),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'max_ms': round(timings[-1], 3),
+            'queries': {'min': min(queries), 'max': max(queries), 'mean': round(statistics.mean(queries), 2)},
+        }
@@ -0,0 +1,58 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from exp_bud.models import Group, BudgetPeriod, MemberBalance, MonthlySpend
+from exp_bud.partitions import add_months
+from exp_bud.ledger import period_of
+from exp_bud import periods
+
+
+class Command(BaseCommand):
+    help = 'Close (snapshot + freeze) old budget periods and move their raw expense rows to the archive tables'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help='YYYY-MM: compact the months before this one (default: see --keep-months)')
+        parser.add_argument('--keep-months', type=int, default=12,
+                            help='months before the current one that stay open (default: 12)')
+        parser.add_argument('--group', type=int, action='append', dest='groups', help='group id (repeatable), default: all groups')
+        parser.add_argument('--no-archive', action='store_true', help='only close the periods, keep the raw rows where they are')
+        parser.add_argument('--batch-size', type=int, default=periods.ARCHIVE_BATCH, help='expenses moved per transaction')
+        parser.add_argument('--sleep', type=float, default=0, help='seconds to pause between batches')
+    
+    def handle(self, *args, **options):
+        current = period_of(timezone.now())
+        if options['before']:
+            match = re.fullmatch(r'(\d{4})-(\d{2})', options['before'])
+            if not match or not 1 <= int(match[2]) <= 12:
+                raise CommandError('--before must look like 2024-06')
+            cutoff = min((int(match[1]), int(match[2])), current) # only ended months can be closed
+        else:
+            if options['keep_months'] < 0:
+                raise CommandError('--keep-months must be 0 or more')
+            cutoff = add_months(*current, -options['keep_months'])
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be 1 or more')
+        
+        groups = Group.objects.order_by('id')
+        if options['groups']:
+            groups = groups.filter(id__in=options['groups'])
+        closed = archived = 0
+        
+        for group_id, created_by_id in groups.values_list('id', 'created_by_id'):
+            # months with any activity (expenses → rollup rows, settlements → ledger rows), plus months closed earlier
+            months = set()
+            for model in (MonthlySpend, MemberBalance, BudgetPeriod):
+                months.update(model.objects.filter(group_id=group_id).values_list('year', 'month').distinct())
+            
+            for year, month in sorted(m for m in months if m < cutoff):
+                with transaction.atomic(): # one short transaction per period
+                    budget = periods.close(group_id, year, month, created_by_id)
+                closed += 1
+                if options['no_archive'] or budget.archived_at is not None:
+                    continue
+                moved = periods.archive_period(group_id, year, month, options['batch_size'], options['sleep'])
+                archived += moved
+                self.stdout.write(f'group {group_id} {year}-{month:02d}: closed, {moved} expense(s) archived')
+        
+        self.stdout.write(self.style.SUCCESS(f'{closed} period(s) closed, {archived} expense(s) archived'))
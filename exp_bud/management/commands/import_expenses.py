@@ -0,0 +1,35 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from exp_bud.models import Group
+from exp_bud import importer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSONL file of expenses into a group (same format as groups/<id>/expenses/import/)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('group_id', type=int)
+        parser.add_argument('path', help='file to import')
+        parser.add_argument('--user', required=True, help='username recorded as created_by')
+        parser.add_argument('--type', choices=importer.FORMATS, help='default: guessed from the file extension')
+        parser.add_argument('--chunk-size', type=int, default=importer.CHUNK_SIZE)
+    
+    def handle(self, *args, **options):
+        try:
+            group = Group.objects.get(id=options['group_id'])
+            user = User.objects.get(username=options['user'])
+        except (Group.DoesNotExist, User.DoesNotExist) as exc:
+            raise CommandError(str(exc))
+        
+        kind = importer.detect_format(options['path'], options['type'])
+        if kind is None:
+            raise CommandError('Cannot tell the file type, pass --type csv or --type jsonl')
+        
+        with open(options['path'], 'rb') as stream:
+            report = importer.import_expenses(group, user, stream, kind, chunk_size=options['chunk_size'])
+        
+        for error in report['errors']:
+            self.stdout.write(self.style.WARNING(f"row {error['row']}: {error['errors']}"))
+        self.stdout.write(self.style.SUCCESS(f"created {report['created']} expense(s), {report['error_count']} row(s) rejected"))
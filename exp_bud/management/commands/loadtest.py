@@ -0,0 +1,94 @@
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import RefreshToken
+from exp_bud.models import Group
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('HTTP load test against a running server, at several concurrency levels. Compare deployments, e.g.\n'
+            '  gunicorn expense_budget.wsgi -w 2 --threads 4 -b :8000\n'
+            '  EXP_BUD_ASYNC_READS=1 uvicorn expense_budget.asgi:application --workers 2 --port 8001\n'
+            'then: manage.py loadtest --base http://localhost:8000 / --base http://localhost:8001')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base', default='http://localhost:8000', help='server root URL')
+        parser.add_argument('--group', type=int, help='group id (default: the group with the lowest id)')
+        parser.add_argument('--paths', default='summary/,expenses/,settlements/',
+                            help='comma separated paths under /api/groups/<id>/')
+        parser.add_argument('--concurrency', default='1,8,32,64', help='comma separated numbers of concurrent clients')
+        parser.add_argument('--duration', type=float, default=10.0, help='seconds per concurrency level')
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--output', help='write the JSON here instead of stdout')
+
+    def handle(self, *args, **options):
+        group = (Group.objects.filter(id=options['group']) if options['group'] else Group.objects.order_by('id')).select_related('created_by').first()
+        if group is None:
+            raise CommandError('No group found, run seed_data first')
+        token = str(RefreshToken.for_user(group.created_by).access_token)
+        urls = [f"{options['base'].rstrip('/')}/api/groups/{group.id}/{path.lstrip('/')}" for path in options['paths'].split(',')]
+
+        results = {}
+        for level in [int(x) for x in options['concurrency'].split(',')]:
+            results[str(level)] = self.run_level(urls, token, level, options['duration'], options['timeout'])
+            r = results[str(level)]
+            self.stderr.write(f"{level:>4} clients: {r['throughput_rps']:>8.1f} req/s  p50 {r['p50_ms']:.1f} ms  p99 {r['p99_ms']:.1f} ms  errors {r['errors']}")
+
+        output = json.dumps({'base': options['base'], 'group': group.id, 'urls': urls, 'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def run_level(self, urls, token, clients, duration, timeout):
+        # each client sends requests back to back (round robin over urls) until the time is up
+        timings, errors = [], [0]
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def client(n):
+            i = n
+            while time.perf_counter() < deadline:
+                request = urllib.request.Request(urls[i % len(urls)], headers={'Authorization': f'Bearer {token}'})
+                i += 1
+                started = time.perf_counter()
+                try:
+                    with urllib.request.urlopen(request, timeout=timeout) as response:
+                        response.read()
+                    ok = True
+                except (urllib.error.URLError, OSError):
+                    ok = False
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    if ok:
+                        timings.append(elapsed)
+                    else:
+                        errors[0] += 1
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            list(pool.map(client, range(clients)))
+        wall = time.perf_counter() - started
+
+        if not timings:
+            return {'requests': 0, 'errors': errors[0], 'throughput_rps': 0.0, 'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0}
+        timings.sort()
+        cut = statistics.quantiles(timings, n=100) if len(timings) > 1 else timings * 99
+        return {
+            'requests': len(timings),
+            'errors': errors[0],
+            'throughput_rps': round(len(timings) / wall, 1),
+            'p50_ms': round(cut[49], 2),
+            'p95_ms': round(cut[94], 2),
+            'p99_ms': round(cut[98], 2),
+            'max_ms': round(timings[-1], 2),
+        }
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from exp_bud import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create the monthly partitions of the expense/split tables ahead of time (PostgreSQL, see exp_bud/partitions.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=None,
+                            help='months to create after the current one (default: EXP_BUD_PARTITIONING["MONTHS_AHEAD"])')
+        parser.add_argument('--convert', action='store_true',
+                            help='first turn the plain tables into partitioned ones (copies every row; maintenance window)')
+        parser.add_argument('--list', action='store_true', help='only print the existing partitions')
+
+    def handle(self, *args, **options):
+        if not partitions.supported(connection):
+            # SQLite dev setups: the plain tables are used as they are
+            self.stdout.write(f'partitioning needs PostgreSQL (database is {connection.vendor}), nothing to do')
+            return
+        if options['months_ahead'] is not None and options['months_ahead'] < 0:
+            raise CommandError('--months-ahead must be 0 or more')
+
+        if not options['list']:
+            with transaction.atomic():
+                if options['convert']:
+                    for table in partitions.convert(connection, options['months_ahead']):
+                        self.stdout.write(self.style.SUCCESS(f'{table}: converted to monthly partitions'))
+                created = partitions.ensure(connection, options['months_ahead'])
+            for name in created:
+                self.stdout.write(f'created {name}')
+            self.stdout.write(self.style.SUCCESS(f'{len(created)} partition(s) created'))
+
+        with connection.cursor() as cursor:
+            for table in partitions.TABLES:
+                if not partitions.is_partitioned(cursor, table):
+                    self.stdout.write(self.style.WARNING(f'{table}: not partitioned (run with --convert)'))
+                    continue
+                for name, bound in partitions.partitions_of(cursor, table):
+                    self.stdout.write(f'{table}: {name} {bound}')
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from exp_bud.models import Group
+from exp_bud import ledger
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the MemberBalance ledger from raw expenses, splits and settlements, and verify it'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, action='append', dest='groups', help='group id (repeatable), default: all groups')
+        parser.add_argument('--verify', action='store_true', help='only compare the ledger with the raw rows, do not write')
+    
+    def handle(self, *args, **options):
+        group_ids = options['groups'] or list(Group.objects.order_by('id').values_list('id', flat=True))
+        broken = 0
+        
+        for group_id in group_ids:
+            if not options['verify']:
+                with transaction.atomic(): # one short transaction per group, not one for the whole table
+                    rows = ledger.rebuild_group(group_id)
+                self.stdout.write(f'group {group_id}: rebuilt {rows} ledger rows')
+            
+            mismatches = ledger.verify_group(group_id)
+            for m in mismatches:
+                self.stdout.write(self.style.WARNING(
+                    f"group {group_id} user {m['user_id']} {m['year']}-{m['month']}: expected {m['expected']} stored {m['stored']}"
+                ))
+            broken += bool(mismatches)
+        
+        if broken:
+            raise CommandError(f'{broken} group(s) have a ledger that does not match the raw rows')
+        self.stdout.write(self.style.SUCCESS(f'{len(group_ids)} group(s) verified'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from exp_bud.models import Group
+from exp_bud import rollups
+
+
+class Command(BaseCommand):
+    help = 'Backfill the MonthlySpend rollup from raw expenses, and verify it'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--group', type=int, action='append', dest='groups', help='group id (repeatable), default: all groups')
+        parser.add_argument('--verify', action='store_true', help='only compare the rollup with the raw expenses, do not write')
+    
+    def handle(self, *args, **options):
+        group_ids = options['groups'] or list(Group.objects.order_by('id').values_list('id', flat=True))
+        broken = 0
+        
+        for group_id in group_ids:
+            if not options['verify']:
+                with transaction.atomic(): # one short transaction per group
+                    rows = rollups.rebuild_group(group_id)
+                self.stdout.write(f'group {group_id}: rebuilt {rows} rollup rows')
+            
+            mismatches = rollups.verify_group(group_id)
+            for m in mismatches:
+                self.stdout.write(self.style.WARNING(
+                    f"group {group_id} category {m['category_id']} {m['year']}-{m['month']}: expected {m['expected']} stored {m['stored']}"
+                ))
+            broken += bool(mismatches)
+        
+        if broken:
+            raise CommandError(f'{broken} group(s) have a rollup that does not match the raw expenses')
+        self.stdout.write(self.style.SUCCESS(f'{len(group_ids)} group(s) verified'))
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from exp_bud import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (rebuilds, exports; see exp_bud/jobs.py). Start one process per worker.'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='exit when the queue is empty instead of polling')
+        parser.add_argument('--poll', type=float, default=2.0, help='seconds to wait when the queue is empty')
+        parser.add_argument('--max-jobs', type=int, default=None, help='exit after running this many jobs')
+    
+    def handle(self, *args, **options):
+        if options['poll'] < 0:
+            raise CommandError('--poll must be 0 or more')
+        done = 0
+        while options['max_jobs'] is None or done < options['max_jobs']:
+            # like the start of a request: drop connections that died or reached CONN_MAX_AGE while idle
+            close_old_connections()
+            jobs.requeue_stale()
+            job = jobs.claim()
+            if job is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll'])
+                continue
+            
+            job = jobs.run(job)
+            done += 1
+            style = self.style.SUCCESS if job.status == job.Status.DONE else self.style.WARNING
+            self.stdout.write(style(f'job {job.id} {job.kind} group {job.group_id}: {job.status} (attempt {job.attempts})'
+                                    + (f' {job.error}' if job.error and job.status != job.Status.DONE else '')))
+        self.stdout.write(f'{done} job(s) run')
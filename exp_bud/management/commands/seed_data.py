@@ -0,0 +1,100 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from exp_bud.models import Group, Member, Category, Expense, ExpenseSplit, BudgetPeriod, Settlement
+from exp_bud.serializers import equal_shares
+from exp_bud.cache import group_cache
+from exp_bud import ledger, rollups
+
+User = get_user_model()
+
+CATEGORY_NAMES = ['food', 'rent', 'travel', 'utilities', 'fun', 'groceries', 'transport', 'health']
+
+
+class Command(BaseCommand):
+    help = 'Generate a realistic local dataset (users, groups, members, months of expenses with splits) for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--members', type=int, default=8, help='members per group (picked from --users)')
+        parser.add_argument('--months', type=int, default=6, help='months of history, ending this month')
+        parser.add_argument('--expenses', type=int, default=100, help='expenses per group per month')
+        parser.add_argument('--splits', type=int, default=4, help='participants per expense (0 = every member)')
+        parser.add_argument('--settlements', type=int, default=5, help='settlements per group per month')
+        parser.add_argument('--prefix', default='seed', help='username / group name prefix')
+        parser.add_argument('--seed', type=int, default=1, help='random seed, same seed → same dataset')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(options['seed'])
+        prefix = options['prefix']
+        started = time.perf_counter()
+        members = min(options['members'], options['users'])
+
+        # bulk_create skips set_password(): the users get an empty password, so nobody can log in as them
+        users = User.objects.bulk_create(
+            [User(username=f'{prefix}-user-{i}') for i in range(options['users'])], batch_size=1000)
+        
+        # (start, end) of each month, oldest first; the current month ends now
+        now = timezone.localtime()
+        this_month = now.year * 12 + now.month - 1
+        months = []
+        for index in range(this_month - options['months'] + 1, this_month + 1):
+            start = now.replace(year=index // 12, month=index % 12 + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+            months.append((start, min((start + timedelta(days=32)).replace(day=1), now)))
+
+        totals = {'expenses': 0, 'splits': 0, 'settlements': 0}
+        for g in range(options['groups']):
+            # one transaction per group keeps memory and lock time bounded on big runs
+            with transaction.atomic():
+                counts = self.seed_group(rnd, f'{prefix}-group-{g}', rnd.sample(users, members), months, options)
+            for key, value in counts.items():
+                totals[key] += value
+            self.stdout.write(f'group {g + 1}/{options["groups"]}: {counts["expenses"]} expenses, {counts["splits"]} splits')
+
+        group_cache.clear() # bulk_create sends no signals
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(users)} users, {options['groups']} groups, {totals['expenses']} expenses, {totals['splits']} splits, "
+            f"{totals['settlements']} settlements in {time.perf_counter() - started:.1f}s"))
+
+    def seed_group(self, rnd, name, users, months, options):
+        owner = users[0]
+        group = Group.objects.create(name=name, created_by=owner)
+        Member.objects.bulk_create([Member(group=group, user=u, role=Member.Role.CREATOR if u == owner else Member.Role.MEMBER)
+                                    for u in users])
+        categories = Category.objects.bulk_create([Category(group=group, name=n) for n in CATEGORY_NAMES[:5]])
+
+        expenses, budgets, settlements = [], [], []
+        for start, end in months:
+            seconds = max(int((end - start).total_seconds()), 1)
+            budgets.append(BudgetPeriod(group=group, year=start.year, month=start.month, created_by=owner,
+                                        limit=Decimal(rnd.randint(20, 80) * 100)))
+            for _ in range(options['expenses']):
+                expenses.append(Expense(group=group, category=rnd.choice(categories), paid_by=rnd.choice(users), created_by=owner,
+                                        amount=Decimal(rnd.randint(100, 30000)) / 100, description=f'{rnd.choice(CATEGORY_NAMES)} expense',
+                                        spent_at=start + timedelta(seconds=rnd.randrange(seconds))))
+            if len(users) > 1:
+                for _ in range(options['settlements']):
+                    a, b = rnd.sample(users, 2)
+                    settlements.append(Settlement(group=group, from_user=a, to_user=b, amount=Decimal(rnd.randint(500, 5000)) / 100,
+                                                  settled_at=start + timedelta(seconds=rnd.randrange(seconds))))
+
+        BudgetPeriod.objects.bulk_create(budgets)
+        expenses = Expense.objects.bulk_create(expenses, batch_size=1000)
+        per_expense = options['splits'] or len(users)
+        splits = []
+        for expense in expenses:
+            sharing = rnd.sample(users, min(per_expense, len(users)))
+            splits += [ExpenseSplit(expense=expense, user=u, share=s) for u, s in zip(sharing, equal_shares(expense.amount, len(sharing)))]
+        ExpenseSplit.objects.bulk_create(splits, batch_size=2000)
+        Settlement.objects.bulk_create(settlements, batch_size=1000)
+
+        # the bulk inserts bypass the write paths, so build the derived tables once at the end
+        ledger.rebuild_group(group.id)
+        rollups.rebuild_group(group.id)
+        return {'expenses': len(expenses), 'splits': len(splits), 'settlements': len(settlements)}
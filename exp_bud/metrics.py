@@ -0,0 +1,110 @@
+import bisect
+import threading
+from django.conf import settings
+
+# In-process request metrics, filled by middleware.QueryMetricsMiddleware and exposed by views.metrics_view
+# in the Prometheus text format. Every worker process keeps its own numbers (Prometheus sums them per instance).
+#
+# settings.EXP_BUD_METRICS (all keys optional):
+#   'ENABLED': True       → record metrics at all
+#   'QUERY_BUDGET': 50    → log a warning with the SQL of any request that runs more queries than this (None = off)
+#   'TOKEN': None         → when set, /metrics requires "Authorization: Bearer <TOKEN>"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def config():
+    return {'ENABLED': True, 'QUERY_BUDGET': 50, 'TOKEN': None, **getattr(settings, 'EXP_BUD_METRICS', {})}
+
+
+class Histogram:
+    # cumulative-bucket histogram like the Prometheus client's; observe() is a bisect and three additions
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    METRICS = {
+        # name: (help, buckets)
+        'exp_bud_request_latency_seconds': ('Total request latency', LATENCY_BUCKETS),
+        'exp_bud_request_db_seconds': ('Time spent in SQL queries per request', LATENCY_BUCKETS),
+        'exp_bud_request_render_seconds': ('Time spent rendering (serializing) the response', LATENCY_BUCKETS),
+        'exp_bud_request_queries': ('SQL queries per request', QUERY_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {} # (metric, endpoint, method) -> Histogram
+        self.over_budget = {} # (endpoint, method) -> requests over the query budget
+
+    def observe(self, endpoint, method, latency, db_time, render_time, queries, over_budget=False):
+        values = {
+            'exp_bud_request_latency_seconds': latency,
+            'exp_bud_request_db_seconds': db_time,
+            'exp_bud_request_render_seconds': render_time,
+            'exp_bud_request_queries': queries,
+        }
+        with self._lock:
+            for metric, value in values.items():
+                key = (metric, endpoint, method)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(self.METRICS[metric][1])
+                histogram.observe(value)
+            if over_budget:
+                self.over_budget[(endpoint, method)] = self.over_budget.get((endpoint, method), 0) + 1
+
+    def snapshot(self, metric, endpoint, method):
+        with self._lock:
+            histogram = self._histograms.get((metric, endpoint, method))
+            return None if histogram is None else (list(histogram.counts), histogram.sum, histogram.count)
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self.over_budget.clear()
+
+    def render(self, extra_gauges=None):
+        # Prometheus text exposition format 0.0.4
+        with self._lock:
+            items = sorted((key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items())
+            over_budget = sorted(self.over_budget.items())
+
+        lines = []
+        for metric, (help_text, _) in self.METRICS.items():
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} histogram']
+            for (name, endpoint, method), counts, total, count, buckets in items:
+                if name != metric:
+                    continue
+                labels = f'endpoint="{_escape(endpoint)}",method="{method}"'
+                cumulative = 0
+                for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{labels}}} {total}')
+                lines.append(f'{metric}_count{{{labels}}} {count}')
+
+        lines += ['# HELP exp_bud_requests_over_query_budget_total Requests that ran more SQL queries than QUERY_BUDGET',
+                  '# TYPE exp_bud_requests_over_query_budget_total counter']
+        lines += [f'exp_bud_requests_over_query_budget_total{{endpoint="{_escape(endpoint)}",method="{method}"}} {n}'
+                  for (endpoint, method), n in over_budget]
+
+        for name, (help_text, kind, value) in (extra_gauges or {}).items():
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
@@ -0,0 +1,152 @@
+import logging
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connections
+from .metrics import config, registry
+from . import replicas
+
+logger = logging.getLogger('exp_bud.metrics')
+
+
+class RequestStats:
+    # installed with connection.execute_wrapper(): sees every SQL statement of the request
+    def __init__(self):
+        self.queries = []   # (sql, seconds); only the text reference is kept, no formatting
+        self.db_time = 0.0
+        self.render_started = None
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.db_time += elapsed
+            self.queries.append((sql, elapsed))
+
+    def rendered(self, response):
+        self.render_time = time.perf_counter() - self.render_started
+
+
+class QueryMetricsMiddleware:
+    # Records per URL name: SQL query count, DB time, render (serialization) time and total latency.
+    # The cost per request is one perf_counter() pair per query plus a dict lookup, cheap enough to leave on.
+    
+    # Works in both modes, so the async views (async_views.py) are not pushed back onto a thread under ASGI.
+    sync_capable = True
+    async_capable = True
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        options = config()
+        if not options['ENABLED']:
+            return self.get_response(request)
+        
+        stats = request._exp_bud_stats = RequestStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            self.install(stack, stats)
+            response = self.get_response(request)
+        self.record(request, stats, time.perf_counter() - started, options)
+        return response
+    
+    async def __acall__(self, request):
+        options = config()
+        if not options['ENABLED']:
+            return await self.get_response(request)
+        
+        stats = request._exp_bud_stats = RequestStats()
+        started = time.perf_counter()
+        # database connections are per thread and the async ORM runs its queries in the request's
+        # thread-sensitive worker thread, so the wrappers are installed (and removed) in that thread
+        stack = ExitStack()
+        await sync_to_async(self.install)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        self.record(request, stats, time.perf_counter() - started, options)
+        return response
+    
+    def install(self, stack, stats):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+    
+    def record(self, request, stats, latency, options):
+        match = request.resolver_match
+        endpoint = (match.view_name or match.route) if match else 'unmatched'
+        budget = options['QUERY_BUDGET']
+        over_budget = budget is not None and len(stats.queries) > budget
+        registry.observe(endpoint, request.method, latency, stats.db_time, stats.render_time, len(stats.queries), over_budget)
+        
+        if over_budget:
+            logger.warning('%s %s (%s) ran %d SQL queries (budget %d) in %.1f ms; most repeated:\n%s',
+                           request.method, request.path, endpoint, len(stats.queries), budget, stats.db_time * 1000,
+                           self.offending_sql(stats.queries))
+    
+    def offending_sql(self, queries, limit=10):
+        # group identical statements (params are placeholders), so an N+1 shows up as one line with a big count
+        grouped = {}
+        for sql, elapsed in queries:
+            count, total = grouped.get(sql, (0, 0.0))
+            grouped[sql] = (count + 1, total + elapsed)
+        top = sorted(grouped.items(), key=lambda item: (-item[1][0], -item[1][1]))[:limit]
+        return '\n'.join(f'  {count}x {total * 1000:.2f} ms  {sql}' for sql, (count, total) in top)
+    
+    def process_template_response(self, request, response):
+        # DRF Responses are rendered after the view returns: time from here to the post-render callback
+        stats = getattr(request, '_exp_bud_stats', None)
+        if stats is not None:
+            stats.render_started = time.perf_counter()
+            response.add_post_render_callback(stats.rendered)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    # Safe requests read from the replica (replicas.py) unless the client wrote within the last STICKY_SECONDS;
+    # any other request uses the primary and marks its client sticky. Off while no replica is configured.
+    sync_capable = True
+    async_capable = True
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+    
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not replicas.enabled():
+            return self.get_response(request)
+        
+        key = replicas.client_key(request)
+        if request.method not in self.safe_methods:
+            response = self.get_response(request)
+            replicas.mark_sticky(key) # also after a failed write: it may have changed something before failing
+            return response
+        with replicas.reading(not replicas.is_sticky(key)):
+            return self.get_response(request)
+    
+    async def __acall__(self, request):
+        if not replicas.enabled():
+            return await self.get_response(request)
+        
+        key = replicas.client_key(request)
+        if request.method not in self.safe_methods:
+            response = await self.get_response(request)
+            await replicas.amark_sticky(key)
+            return response
+        # the context variable is copied into the threads the async ORM runs its queries in
+        with replicas.reading(not await replicas.ais_sticky(key)):
+            return await self.get_response(request)
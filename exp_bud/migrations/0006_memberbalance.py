@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:12
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_balances(apps, schema_editor):
+    # fill the new ledger from the rows that already exist (same math as exp_bud.ledger.compute_group_ledger)
+    Expense = apps.get_model('exp_bud', 'Expense')
+    ExpenseSplit = apps.get_model('exp_bud', 'ExpenseSplit')
+    Settlement = apps.get_model('exp_bud', 'Settlement')
+    MemberBalance = apps.get_model('exp_bud', 'MemberBalance')
+    
+    rows = {}
+    def row(group_id, user_id, dt):
+        local = timezone.localtime(dt)
+        key = (group_id, user_id, local.year, local.month)
+        if key not in rows:
+            rows[key] = MemberBalance(group_id=group_id, user_id=user_id, year=local.year, month=local.month)
+        return rows[key]
+    
+    for group_id, user_id, amount, spent_at in Expense.objects.values_list('group_id', 'paid_by_id', 'amount', 'spent_at').iterator():
+        row(group_id, user_id, spent_at).paid += amount
+    for group_id, user_id, share, spent_at in ExpenseSplit.objects.values_list('expense__group_id', 'user_id', 'share', 'expense__spent_at').iterator():
+        row(group_id, user_id, spent_at).owed += share
+    for group_id, from_id, to_id, amount, settled_at in Settlement.objects.values_list('group_id', 'from_user_id', 'to_user_id', 'amount', 'settled_at').iterator():
+        row(group_id, from_id, settled_at).sent += amount
+        row(group_id, to_id, settled_at).received += amount
+    
+    MemberBalance.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exp_bud', '0005_rename_join_at_member_joined_at_alter_member_role'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('owed', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('sent', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('received', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balances', to='exp_bud.group')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_balances', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('group', 'user', 'year', 'month'), name='uniq_balance_group_user_period')],
+            },
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
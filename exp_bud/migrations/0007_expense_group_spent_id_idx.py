@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exp_bud', '0006_memberbalance'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['group', 'spent_at', 'id'], name='expense_group_spent_id_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exp_bud', '0007_expense_group_spent_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='expense',
+            name='expense_group_spent_id_idx',
+        ),
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['group', 'spent_at', 'id'], include=('paid_by', 'amount'), name='expense_group_spent_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expensesplit',
+            index=models.Index(fields=['expense'], include=('user', 'share'), name='split_expense_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(fields=['user', 'group'], name='member_user_group_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='memberbalance',
+            index=models.Index(fields=['group', 'year', 'month'], name='balance_group_period_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='settlement',
+            index=models.Index(fields=['group', 'settled_at'], include=('from_user', 'to_user', 'amount'), name='settlement_group_settled_idx'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:23
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_spend(apps, schema_editor):
+    # fill the rollup from the expenses that already exist (same math as exp_bud.rollups.compute_group_spend)
+    Expense = apps.get_model('exp_bud', 'Expense')
+    MonthlySpend = apps.get_model('exp_bud', 'MonthlySpend')
+    
+    rows = {}
+    for group_id, category_id, amount, spent_at in Expense.objects.values_list('group_id', 'category_id', 'amount', 'spent_at').iterator():
+        local = timezone.localtime(spent_at)
+        key = (group_id, category_id, local.year, local.month)
+        if key not in rows:
+            rows[key] = MonthlySpend(group_id=group_id, category_id=category_id, year=local.year, month=local.month)
+        rows[key].total += amount
+        rows[key].count += 1
+    
+    MonthlySpend.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exp_bud', '0008_hot_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlySpend',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('total', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_spend', to='exp_bud.category')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_spend', to='exp_bud.group')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('group', 'year', 'month', 'category'), name='uniq_spend_group_period_category')],
+            },
+        ),
+        migrations.RunPython(backfill_spend, migrations.RunPython.noop),
+    ]
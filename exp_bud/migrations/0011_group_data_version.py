@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exp_bud', '0010_expense_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='data_version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
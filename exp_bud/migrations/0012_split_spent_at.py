@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_split_spent_at(apps, schema_editor):
+    # copy every expense's spent_at onto its splits (one UPDATE with a correlated subquery)
+    Expense = apps.get_model('exp_bud', 'Expense')
+    ExpenseSplit = apps.get_model('exp_bud', 'ExpenseSplit')
+    ExpenseSplit.objects.update(spent_at=Subquery(Expense.objects.filter(id=OuterRef('expense_id')).values('spent_at')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exp_bud', '0011_group_data_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expensesplit',
+            name='expense',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='splits', to='exp_bud.expense'),
+        ),
+        migrations.AddField(
+            model_name='expensesplit',
+            name='spent_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(backfill_split_spent_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='expensesplit',
+            name='spent_at',
+            field=models.DateTimeField(),
+        ),
+    ]
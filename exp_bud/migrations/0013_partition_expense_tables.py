@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:55
+
+from django.db import migrations
+
+
+def partition_tables(apps, schema_editor):
+    # PostgreSQL with EXP_BUD_PARTITIONING['ENABLED'] only; everywhere else the tables stay as they are.
+    # The table layout is invisible to the ORM, so the migration state is the same either way
+    # (`manage.py partitions --convert` does the same later if the setting is turned on after this ran).
+    from exp_bud import partitions
+    if partitions.enabled(schema_editor.connection):
+        partitions.convert(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exp_bud', '0012_split_spent_at'),
+    ]
+
+    operations = [
+        # no automatic way back: un-partitioning means copying the rows into plain tables again
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
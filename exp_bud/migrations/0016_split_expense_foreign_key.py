@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:10
+
+import copy
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def set_foreign_key(apps, schema_editor, enforced):
+    # 0012 made ExpenseSplit.expense db_constraint=False everywhere; give the foreign key back to every database
+    # except a PostgreSQL one whose expense table is already partitioned (0013), which can't have it (partitions.py)
+    from exp_bud import partitions
+    connection = schema_editor.connection
+    if partitions.supported(connection):
+        with connection.cursor() as cursor:
+            if partitions.is_partitioned(cursor, partitions.TABLES[0]):
+                return
+    model = apps.get_model('exp_bud', 'ExpenseSplit')
+    field = model._meta.get_field('expense')
+    old, new = copy.copy(field), copy.copy(field)
+    old.db_constraint, new.db_constraint = not enforced, enforced
+    schema_editor.alter_field(model, old, new)
+
+
+def add_foreign_key(apps, schema_editor):
+    set_foreign_key(apps, schema_editor, True)
+
+
+def drop_foreign_key(apps, schema_editor):
+    set_foreign_key(apps, schema_editor, False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exp_bud', '0015_jobs'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='expensesplit',
+                    name='expense',
+                    field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='splits', to='exp_bud.expense'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_foreign_key, drop_foreign_key),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exp_bud', '0016_split_expense_foreign_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='expensesplit',
+            name='expense',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='splits', to='exp_bud.expense'),
+        ),
+    ]
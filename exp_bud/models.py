@@ -25,9 +25,19 @@ class Group(models.Model):
     # through='Member':
     # Instead of Django auto-creating a hidden join table, you explicitly created your own join table model: Member.
     
+    # goes up whenever the group's data changes (versions.py); ETags and the response cache are keyed by it
+    data_version = models.PositiveIntegerField(default=1)
+    
     def __str__(self):
         return f"{self.name}"
     
+    def save(self, *args, **kwargs):
+        # data_version is only changed with UPDATE ... data_version + 1 (versions.bump); saving an instance that was
+        # loaded earlier must not write its old copy back and make the version go backwards
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields if not f.primary_key and f.name != 'data_version']
+        super().save(*args, **kwargs)
+    
 
 class Member(models.Model):
     class Role(models.TextChoices):
@@ -41,6 +51,9 @@ class Member(models.Model):
     
     class Meta:
         constraints = [models.UniqueConstraint(fields=['group', 'user'], name='uniq_member_group_user')] # same user can't join same group twice
+        # the unique constraint already serves (group, user) lookups; this one serves "groups of this user"
+        # (Group.objects.filter(members=user)) without touching the member table heap
+        indexes = [models.Index(fields=['user', 'group'], name='member_user_group_idx')]
         
     def __str__(self):
         return f"{self.user.username} ({self.group.name})"
@@ -71,31 +84,74 @@ class Expense(models.Model):
     # Real-world: when the expense happened vs when it was created
     spent_at = models.DateTimeField(default=timezone.now)
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped by every update; an edit only applies if the row still has the version the client read (else 409)
+    version = models.PositiveIntegerField(default=1)
+    
+    class Meta:
+        # serves the expense list keyset pagination: WHERE group = ? AND (spent_at, id) < (?, ?) ORDER BY spent_at, id
+        # include → PostgreSQL covering index, the summary/ledger aggregates (paid_by, amount) become index-only scans
+        indexes = [models.Index(fields=['group', 'spent_at', 'id'], include=['paid_by', 'amount'], name='expense_group_spent_id_idx')]
     
     def __str__(self):
         return f'{self.group.name}: {self.amount} by  {self.paid_by.username}'
 
 
+class ExpenseSplitQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # every bulk insert of splits fills the denormalized spent_at from its expense (see ExpenseSplit.spent_at)
+        objs = list(objs)
+        for split in objs:
+            split.fill_spent_at()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
 class ExpenseSplit(models.Model):
-    expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name='splits')
+    # A real foreign key, except on a PostgreSQL database whose expense table is partitioned by month (partitions.py):
+    # its primary key is then (id, spent_at), the database can't enforce a foreign key on id alone, and
+    # partitions.convert() drops this one. Deleting an expense deletes its splits either way (CASCADE is done by Django).
+    # db_index=False: split_expense_cover_idx below already leads with expense, a plain FK index would only be a copy
+    expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name='splits', db_index=False)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='expense_splits')
     share = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.00'))])
+    # copy of expense.spent_at: the partition key of the split table, and lets split queries filter a date range
+    # without joining the expense table. Filled automatically on save() / bulk_create(); ExpenseSerializer.update
+    # moves it when the expense's spent_at changes.
+    spent_at = models.DateTimeField()
+    
+    objects = ExpenseSplitQuerySet.as_manager()
     
     class Meta:
         constraints = [models.UniqueConstraint(fields=['expense', 'user'], name='uniq_split_expense_user')]
+        # covering index for "splits of these expenses" (expense__in / joins from Expense): user and share come from the index
+        indexes = [models.Index(fields=['expense'], include=['user', 'share'], name='split_expense_cover_idx')]
     
     def __str__(self):
         return f'{self.user.username} owes {self.share} for expense {self.expense_id}'
     
+    def fill_spent_at(self):
+        if self.spent_at is None:
+            self.spent_at = self.expense.spent_at
+    
+    def save(self, *args, **kwargs):
+        self.fill_spent_at()
+        super().save(*args, **kwargs)
+    
 
 class BudgetPeriod(models.Model):
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='budgets')
     year = models.PositiveIntegerField()
     month = models.PositiveSmallIntegerField()
-    limit = models.DecimalField(max_digits=12, decimal_places=2, validators=[MinValueValidator(Decimal('0.00'))])
+    # null: no budget was set (a month can be closed without one); the budget endpoint still requires a value
+    limit = models.DecimalField(max_digits=12, decimal_places=2, null=True, validators=[MinValueValidator(Decimal('0.00'))])
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='budget_created')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    # closing a period (periods.py): no more edits in that month, the summary reads `snapshot`
+    # (per-member balances and per-category totals), and the raw rows may move to the archive tables
+    closed_at = models.DateTimeField(null=True, blank=True)
+    snapshot = models.JSONField(null=True, blank=True)
+    archived_at = models.DateTimeField(null=True, blank=True) # set once every raw row of the month is archived
+    
     class Meta:
         constraints = [models.UniqueConstraint(fields=['group', 'year', 'month'], name='uniq_budget_group_period')]
         
@@ -103,6 +159,39 @@ class BudgetPeriod(models.Model):
         return f'{self.group.name} budget {self.year}-{self.month} : {self.limit}'
 
 
+class ArchivedExpense(models.Model):
+    # Expense rows of archived (closed) periods, moved out of the hot expense table by periods.archive_period().
+    # Same id as the original row; the ledger and the rollup keep counting them (see ledger.py / rollups.py).
+    id = models.BigIntegerField(primary_key=True)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='archived_expenses')
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, related_name='archived_expenses')
+    description = models.TextField(blank=True)
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    paid_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='archived_expenses_paid')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='archived_expenses_created')
+    spent_at = models.DateTimeField()
+    created_at = models.DateTimeField()
+    version = models.PositiveIntegerField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [models.Index(fields=['group', 'spent_at'], name='archived_expense_group_idx')]
+    
+    def __str__(self):
+        return f'archived {self.amount} ({self.spent_at:%Y-%m})'
+
+
+class ArchivedExpenseSplit(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    expense = models.ForeignKey(ArchivedExpense, on_delete=models.CASCADE, related_name='splits')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='archived_expense_splits')
+    share = models.DecimalField(max_digits=12, decimal_places=2)
+    spent_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f'archived split {self.share} of expense {self.expense_id}'
+
+
 class Settlement(models.Model):
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='settlements')
     from_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='settlements_sent')
@@ -111,7 +200,99 @@ class Settlement(models.Model):
     note = models.TextField(blank=True)
     settled_at = models.DateTimeField(default=timezone.now)
     
+    class Meta:
+        # settlement list and the month range in summary/ledger queries: WHERE group = ? AND settled_at range
+        indexes = [models.Index(fields=['group', 'settled_at'], include=['from_user', 'to_user', 'amount'], name='settlement_group_settled_idx')]
+    
     def __str__(self):
         return f'{self.from_user.username} to {self.to_user.username}: {self.amount}'
     
-    
\ No newline at end of file
+    
+
+class MemberBalance(models.Model):
+    # Materialized ledger: one row per (group, user, month). It is kept up to date in the same transaction
+    # as every expense/settlement write (see ledger.py), so the summary only reads one row per member
+    # instead of re-summing every expense, split and settlement of the month.
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='balances')
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='group_balances')
+    year = models.PositiveIntegerField()
+    month = models.PositiveSmallIntegerField()
+    paid = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))     # sum of Expense.amount paid by user
+    owed = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))     # sum of ExpenseSplit.share of user
+    sent = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))     # settlements paid by user
+    received = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00')) # settlements received by user
+    
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['group', 'user', 'year', 'month'], name='uniq_balance_group_user_period')]
+        # the summary reads one period of a group: WHERE group = ? AND year = ? AND month = ?
+        indexes = [models.Index(fields=['group', 'year', 'month'], name='balance_group_period_idx')]
+    
+    @property
+    def net(self):
+        # + means user should receive, - means user owes (same sign rule as GroupSummaryView)
+        return self.paid - self.owed + self.sent - self.received
+    
+    def __str__(self):
+        return f'{self.user_id} in {self.group_id} {self.year}-{self.month}: {self.net}'
+
+
+class MonthlySpend(models.Model):
+    # Rollup of Expense.amount per (group, month, category), kept up to date by every expense write (see rollups.py).
+    # Budget tracking and the summary read a month's spend from here (one row per category) instead of scanning expenses.
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='monthly_spend')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='monthly_spend')
+    year = models.PositiveIntegerField()
+    month = models.PositiveSmallIntegerField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    count = models.PositiveIntegerField(default=0) # number of expenses
+    
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['group', 'year', 'month', 'category'], name='uniq_spend_group_period_category')]
+    
+    def __str__(self):
+        return f'{self.group_id} {self.year}-{self.month} category {self.category_id}: {self.total}'
+
+
+class Job(models.Model):
+    # Background work handed off by the API (see jobs.py): a worker (`manage.py run_jobs`) claims queued rows,
+    # runs them, retries failures with a delay and reports progress on the row, which GET jobs/<id>/ returns.
+    class Kind(models.TextChoices):
+        REBUILD_BALANCES = 'rebuild_balances', 'Rebuild balances'
+        REBUILD_ROLLUPS = 'rebuild_rollups', 'Rebuild rollups'
+        EXPORT = 'export', 'Export'
+    
+    class Status(models.TextChoices):
+        QUEUED = 'queued', 'Queued'
+        RUNNING = 'running', 'Running'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+    
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=30, choices=Kind.choices)
+    key = models.CharField(max_length=100, blank=True, default='') # tells apart jobs of one kind, e.g. the export file
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0) # percent
+    message = models.CharField(max_length=200, blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now) # retries wait until then
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True) # running jobs touch it; a stale one is requeued
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            # dedup: one queued/running job per (group, kind, key); enqueueing again returns that job
+            models.UniqueConstraint(fields=['group', 'kind', 'key'], condition=models.Q(status__in=['queued', 'running']),
+                                    name='uniq_active_job'),
+        ]
+        # the worker's poll: WHERE status = 'queued' AND run_after <= now ORDER BY run_after, id
+        indexes = [models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx')]
+    
+    def __str__(self):
+        return f'{self.kind} for group {self.group_id}: {self.status}'
@@ -0,0 +1,84 @@
+import base64
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ExpenseCursorPagination(BasePagination):
+    # Keyset pagination on (spent_at, id), newest first.
+    # The cursor remembers the last row of the page, and the next page is "rows strictly before that row",
+    # so with the Expense(group, spent_at, id) index page 1,000 costs the same as page 1 (no OFFSET scan).
+    # id breaks ties, so expenses with the same spent_at (e.g. imported at midnight) are never skipped or repeated.
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = 50
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, expense):
+        raw = f'{expense.spent_at.isoformat()}|{expense.id}'
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            spent_at, _, pk = base64.urlsafe_b64decode(encoded.encode()).decode().partition('|')
+            position = parse_datetime(spent_at), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound('Invalid cursor')
+        if position[0] is None:
+            raise NotFound('Invalid cursor')
+        return position
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    def page_queryset(self, queryset, request):
+        # the (unevaluated) queryset for one page + 1 extra row; split from paginate_queryset so the async
+        # views (async_views.py) can evaluate it with the async ORM and then hand the rows to set_page()
+        self.request = request
+        page_size = self.page_size_used = self.get_page_size(request)
+        queryset = queryset.order_by('-spent_at', '-id')
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            spent_at, pk = position
+            # (spent_at, id) < (cursor spent_at, cursor id); the spent_at__lte part lets the db use the index range
+            queryset = queryset.filter(Q(spent_at__lte=spent_at), Q(spent_at__lt=spent_at) | Q(id__lt=pk))
+
+        return queryset[:page_size + 1] # one extra row tells us if there is a next page
+
+    def set_page(self, rows):
+        self.has_next = len(rows) > self.page_size_used
+        self.page = rows[:self.page_size_used]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.page[-1]))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,169 @@
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.utils import timezone
+from .reports import months_between
+
+# Monthly range partitioning of the expense and split tables on PostgreSQL (PARTITION BY RANGE (spent_at)).
+# Every hot query filters a group and a spent_at range (summary, ledger, expense list pages), so with one partition
+# per month the planner only opens the partitions of the months asked for ("partition pruning"), and old months
+# stay out of the way (and can later be detached or archived one by one).
+#
+# Only PostgreSQL is touched, and only when settings.EXP_BUD_PARTITIONING['ENABLED'] is on; SQLite dev setups and
+# PostgreSQL without the setting keep the plain tables, the ORM code is the same for both.
+#   - migration 0013 converts the tables when the setting is on at migrate time
+#   - `manage.py partitions --convert` converts them later; `manage.py partitions` (run it monthly, e.g. from cron)
+#     creates the partitions of the next MONTHS_AHEAD months
+# A DEFAULT partition catches rows outside every monthly partition (e.g. a typo'd year); creating a month's
+# partition later moves its rows out of the default one.
+#
+# Partitioned tables need the partition key in every unique constraint, so the primary keys become (id, spent_at)
+# and uniq_split_expense_user gets spent_at too (all splits of an expense share it, so it means the same).
+# That's also why convert() drops the split table's foreign key to the expense table (the only one pointing at it):
+# without a unique key on id alone there is nothing for it to reference. Unpartitioned databases keep it.
+#
+# settings.EXP_BUD_PARTITIONING (all keys optional):
+#   'ENABLED': False
+#   'MONTHS_AHEAD': 3 → partitions created ahead of the current month
+
+TABLES = ('exp_bud_expense', 'exp_bud_expensesplit') # both have a spent_at column (ExpenseSplit.spent_at is a copy)
+KEY = 'spent_at'
+
+
+def config():
+    return {'ENABLED': False, 'MONTHS_AHEAD': 3, **getattr(settings, 'EXP_BUD_PARTITIONING', {})}
+
+
+def supported(connection):
+    return connection.vendor == 'postgresql'
+
+
+def enabled(connection):
+    return supported(connection) and config()['ENABLED']
+
+
+def add_months(year, month, count):
+    index = year * 12 + month - 1 + count
+    return index // 12, index % 12 + 1
+
+
+def month_bounds(year, month):
+    # [first instant of the month, first instant of the next one), in UTC like the stored timestamps
+    return datetime(year, month, 1, tzinfo=dt_timezone.utc), datetime(*add_months(year, month, 1), 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(table, year, month):
+    return f'{table}_p{year:04d}{month:02d}'
+
+
+def current_month():
+    now = timezone.now().astimezone(dt_timezone.utc)
+    return now.year, now.month
+
+
+def is_partitioned(cursor, table):
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))', [table])
+    return cursor.fetchone()[0]
+
+
+def partitions_of(cursor, table):
+    # [(partition name, bound expression)] of a partitioned table
+    cursor.execute('SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+                   'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname', [table])
+    return cursor.fetchall()
+
+
+def create_partition(cursor, qn, table, year, month):
+    # Create the table, move the month's rows out of the DEFAULT partition (if any landed there), then attach it.
+    # (CREATE TABLE ... PARTITION OF would fail while the default partition holds rows of that range.)
+    name = partition_name(table, year, month)
+    start, end = month_bounds(year, month)
+    cursor.execute(f'CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS)')
+    cursor.execute(f'WITH moved AS (DELETE FROM {qn(table + "_default")} WHERE {KEY} >= %s AND {KEY} < %s RETURNING *) '
+                   f'INSERT INTO {qn(name)} SELECT * FROM moved', [start, end])
+    # partition bounds must be literals, they can't be query parameters
+    cursor.execute(f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+    return name
+
+
+def ensure(connection, months_ahead=None):
+    # partitions for the current month and the next months_ahead ones, on the tables that are partitioned.
+    # Returns the names created (existing ones are left alone, so it's safe to run any number of times).
+    if not supported(connection):
+        return []
+    months_ahead = config()['MONTHS_AHEAD'] if months_ahead is None else months_ahead
+    first = current_month()
+    wanted = months_between(first, add_months(*first, months_ahead))
+    qn = connection.ops.quote_name
+    created = []
+    with connection.cursor() as cursor:
+        for table in TABLES:
+            if not is_partitioned(cursor, table):
+                continue
+            existing = {name for name, _ in partitions_of(cursor, table)}
+            created += [create_partition(cursor, qn, table, y, m) for y, m in wanted if partition_name(table, y, m) not in existing]
+    return created
+
+
+def drop_expense_foreign_keys(cursor, qn):
+    # the split → expense foreign key can't survive the partitioning of the expense table (see above)
+    expense, split = TABLES
+    cursor.execute("SELECT conname FROM pg_constraint WHERE contype = 'f' AND conrelid = to_regclass(%s) "
+                   "AND confrelid = to_regclass(%s)", [split, expense])
+    for (name,) in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {qn(split)} DROP CONSTRAINT {qn(name)}')
+
+
+def convert(connection, months_ahead=None):
+    # Turn the plain tables into partitioned ones, keeping every row, index and constraint (but the split → expense
+    # foreign key). Copies the whole table inside the caller's transaction, so run it in a maintenance window on big
+    # databases. Returns the tables converted.
+    if not supported(connection):
+        return []
+    months_ahead = config()['MONTHS_AHEAD'] if months_ahead is None else months_ahead
+    qn = connection.ops.quote_name
+    converted = []
+    with connection.cursor() as cursor:
+        if not is_partitioned(cursor, TABLES[0]):
+            drop_expense_foreign_keys(cursor, qn)
+        for table in TABLES:
+            if is_partitioned(cursor, table):
+                continue
+            # definitions of the foreign keys / unique constraints and of the other indexes, recreated afterwards
+            cursor.execute("SELECT conname, contype, pg_get_constraintdef(oid), "
+                           "ARRAY(SELECT attname FROM pg_attribute WHERE attrelid = conrelid AND attnum = ANY(conkey) "
+                           "ORDER BY array_position(conkey, attnum)) "
+                           "FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype IN ('f', 'u')", [table])
+            constraints = cursor.fetchall()
+            cursor.execute('SELECT pg_get_indexdef(x.indexrelid) FROM pg_index x WHERE x.indrelid = to_regclass(%s) '
+                           'AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)', [table])
+            indexes = [definition for (definition,) in cursor.fetchall()]
+            cursor.execute(f'SELECT min({KEY}) FROM {qn(table)}')
+            oldest = cursor.fetchone()[0]
+
+            old = f'{table}_unpartitioned'
+            cursor.execute(f'ALTER TABLE {qn(table)} RENAME TO {qn(old)}')
+            cursor.execute(f'CREATE TABLE {qn(table)} (LIKE {qn(old)} INCLUDING DEFAULTS) PARTITION BY RANGE ({KEY})')
+            cursor.execute(f'CREATE TABLE {qn(table + "_default")} PARTITION OF {qn(table)} DEFAULT')
+            first = current_month()
+            if oldest is not None:
+                oldest = oldest.astimezone(dt_timezone.utc)
+                first = min(first, (oldest.year, oldest.month))
+            for year, month in months_between(first, add_months(*current_month(), months_ahead)):
+                create_partition(cursor, qn, table, year, month)
+            cursor.execute(f'INSERT INTO {qn(table)} SELECT * FROM {qn(old)}')
+            cursor.execute(f'DROP TABLE {qn(old)}') # also drops its identity sequence, indexes and constraints
+
+            cursor.execute(f'ALTER TABLE {qn(table)} ADD PRIMARY KEY (id, {KEY})')
+            for name, contype, definition, columns in constraints:
+                if contype == 'u' and KEY not in columns:
+                    definition = 'UNIQUE ({})'.format(', '.join(qn(column) for column in [*columns, KEY]))
+                cursor.execute(f'ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} {definition}')
+            for definition in indexes: # an index on the parent is created on every partition, present and future
+                cursor.execute(definition)
+            # ids keep coming from a sequence (identity columns only work on partitioned tables from PostgreSQL 17)
+            sequence = f'{table}_id_seq'
+            cursor.execute(f'CREATE SEQUENCE {qn(sequence)} OWNED BY {qn(table)}.id')
+            cursor.execute(f'SELECT setval(%s, COALESCE((SELECT max(id) FROM {qn(table)}), 0) + 1, false)', [sequence])
+            cursor.execute(f"ALTER TABLE {qn(table)} ALTER COLUMN id SET DEFAULT nextval('{sequence}'::regclass)")
+            converted.append(table)
+    return converted
@@ -0,0 +1,129 @@
+import time
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from rest_framework import serializers
+from .models import (BudgetPeriod, Expense, ExpenseSplit, ArchivedExpense, ArchivedExpenseSplit,
+                     MemberBalance, MonthlySpend)
+from .cache import group_cache
+from .ledger import period_of
+from . import versions
+
+# Closing a period (one group, one month) that has ended:
+#   1. freeze it: BudgetPeriod.closed_at is set, and writes dated in that month are rejected (check_open)
+#   2. snapshot it: per-member balances and per-category totals, copied from the ledger and the rollup into
+#      BudgetPeriod.snapshot; GroupSummaryView answers a closed month from it (no rollup/ledger query)
+#   3. optionally archive it: the month's Expense/ExpenseSplit rows move to ArchivedExpense/ArchivedExpenseSplit in
+#      batches of short transactions, so the hot tables (and every scan of them) only hold months still in use.
+#      The ledger and the rollup keep the archived amounts, and their rebuild/verify read the archive tables too.
+# Only ended months can be closed, so a write dated this month or later never needs the closed-period lookup.
+# The check runs when the write is validated: a write racing with the close of its month can still land.
+
+ZERO = Decimal('0.00')
+ARCHIVE_BATCH = 1000 # expenses moved per transaction
+EXPENSE_FIELDS = ('id', 'group_id', 'category_id', 'description', 'amount', 'paid_by_id', 'created_by_id',
+                  'spent_at', 'created_at', 'version')
+SPLIT_FIELDS = ('id', 'expense_id', 'user_id', 'share', 'spent_at')
+
+
+def month_range(year, month):
+    # [start, end) of the month in the current timezone, same as the summary and the ledger buckets
+    start = timezone.datetime(year, month, 1, tzinfo=timezone.get_current_timezone())
+    return start, (start + timezone.timedelta(days=32)).replace(day=1)
+
+
+def ensure_open(group_id, year, month):
+    if (year, month) < period_of(timezone.now()) and (year, month) in group_cache.closed_periods(group_id):
+        raise serializers.ValidationError({'detail': f'{year}-{month:02d} is closed, it can no longer change'})
+
+
+def check_open(group_id, *moments):
+    # every datetime a write touches (new and old spent_at, settled_at); None = "now", always open
+    for when in moments:
+        if when is not None:
+            ensure_open(group_id, *period_of(when))
+
+
+def snapshot(group_id, year, month):
+    # the month as the summary needs it, from the materialized ledger and rollup rows (two small queries)
+    balances = [
+        {'user_id': uid, 'paid': str(money(paid)), 'owed': str(money(owed)), 'sent': str(money(sent)),
+         'received': str(money(received)), 'net': str(money(paid - owed + sent - received))}
+        for uid, paid, owed, sent, received in MemberBalance.objects.filter(group_id=group_id, year=year, month=month)
+        .order_by('user_id').values_list('user_id', 'paid', 'owed', 'sent', 'received')
+    ]
+    categories = [
+        {'category_id': cat_id, 'total': str(money(total)), 'count': count}
+        for cat_id, total, count in MonthlySpend.objects.filter(group_id=group_id, year=year, month=month)
+        .order_by('category_id').values_list('category_id', 'total', 'count')
+    ]
+    return {
+        'total_spent': str(sum((Decimal(c['total']) for c in categories), ZERO)),
+        'expense_count': sum(c['count'] for c in categories),
+        'categories': categories,
+        'balances': balances,
+    }
+
+
+def money(value):
+    return Decimal(value).quantize(ZERO)
+
+
+def snapshot_totals(data):
+    # snapshot → (total_spent, net_by_user) in the shape summary_payload() takes
+    return Decimal(data['total_spent']), {row['user_id']: Decimal(row['net']) for row in data['balances']}
+
+
+def close(group_id, year, month, created_by_id):
+    # Must be called inside transaction.atomic. Closing an already closed period does nothing.
+    # A month without a budget gets a BudgetPeriod row with limit=None to hold the snapshot.
+    if (year, month) >= period_of(timezone.now()):
+        raise serializers.ValidationError({'detail': 'only months that have ended can be closed'})
+    period, _ = BudgetPeriod.objects.select_for_update().get_or_create(
+        group_id=group_id, year=year, month=month, defaults={'limit': None, 'created_by_id': created_by_id})
+    if period.closed_at is None:
+        period.snapshot = snapshot(group_id, year, month)
+        period.closed_at = timezone.now()
+        period.save(update_fields=['snapshot', 'closed_at']) # signals: closed-period cache + data_version
+    return period
+
+
+def archive_period(group_id, year, month, batch_size=ARCHIVE_BATCH, pause=0):
+    # Move the raw rows of a closed period to the archive tables, batch_size expenses (and their splits) per
+    # transaction, so locks are only held for one batch. pause: seconds to sleep between batches (lets replicas /
+    # other writers catch up on big backfills). Returns the number of expenses moved.
+    period = BudgetPeriod.objects.get(group_id=group_id, year=year, month=month)
+    if period.closed_at is None:
+        raise ValueError(f'close {year}-{month:02d} before archiving it')
+    start, end = month_range(year, month)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(Expense.objects.filter(group_id=group_id, spent_at__gte=start, spent_at__lt=end)
+                        .order_by('id').values_list(*EXPENSE_FIELDS)[:batch_size])
+            if not rows:
+                break
+            ids = [row[0] for row in rows]
+            splits = ExpenseSplit.objects.filter(expense_id__in=ids, spent_at__gte=start, spent_at__lt=end)
+            ArchivedExpense.objects.bulk_create([ArchivedExpense(**dict(zip(EXPENSE_FIELDS, row))) for row in rows])
+            ArchivedExpenseSplit.objects.bulk_create(
+                [ArchivedExpenseSplit(**dict(zip(SPLIT_FIELDS, row))) for row in splits.values_list(*SPLIT_FIELDS)],
+                batch_size=1000)
+            splits.delete()
+            # a plain DELETE: the splits are gone already, and one version bump below replaces a post_delete per row
+            Expense.objects.filter(id__in=ids)._raw_delete(Expense.objects.db)
+            versions.bump(group_id)
+        moved += len(rows)
+        if len(rows) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    BudgetPeriod.objects.filter(id=period.id).update(archived_at=timezone.now())
+    return moved
+
+
+def archived_total(group_id, start, end):
+    # spend of [start, end) that lives in the archive (partial-month summaries of closed months)
+    total = ArchivedExpense.objects.filter(group_id=group_id, spent_at__gte=start, spent_at__lt=end).aggregate(total=Sum('amount'))['total']
+    return money(total or ZERO)
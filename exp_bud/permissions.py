@@ -3,6 +3,10 @@ from .models import Group, Member, Expense
 
 class IsGroupMember(BasePermission):
     def has_permission(self, request, view):
+        group_ctx = getattr(view, 'group_ctx', None)
+        if group_ctx is not None: # member ids already loaded for this request (GroupContextMixin) → no query
+            return group_ctx.is_member(request.user.id)
+        
         group = getattr(view, 'group', None) # getattrs Python function that safely reads an attribute from an object.
         if group is None:            # getattr is used to avoid AttributeError when the attribute might not be present.
             return True
@@ -19,8 +23,9 @@ class IsGroupCreator(BasePermission):
 
 class IsGroupCreatorOrExpenseCreator(BasePermission):
     def has_object_permission(self, request, view, obj):
-        # obj is Expense
-        if obj.group.created_by_id == request.user.id:
+        # obj is Expense; the view already has its group loaded, so don't fetch obj.group again
+        group = getattr(view, 'group', None) or obj.group
+        if group.created_by_id == request.user.id:
             return True
         return obj.created_by_id == request.user.id
     
\ No newline at end of file
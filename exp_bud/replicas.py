@@ -0,0 +1,93 @@
+import contextvars
+import hashlib
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Read-replica routing: the safe (GET/HEAD/OPTIONS) requests read from a replica, everything else stays on the primary.
+# ReplicaRoutingMiddleware (middleware.py) decides per request and sets a context variable; ReplicaRouter (listed in
+# settings.DATABASE_ROUTERS) sends the reads of that request to the replica alias. Dashboards polling the summary,
+# report, export and list endpoints then stop competing with expense creation for the primary.
+#
+# Read-your-writes: a replica lags the primary a little, so after a client writes (any non-safe request) its reads
+# stay on the primary for STICKY_SECONDS. The client is recognised before authentication runs, by a hash of its
+# Authorization header (JWT) or session cookie; the mark lives in a cache (use a shared one with several workers).
+# Reads inside a transaction on the primary always stay there, so a view never mixes both databases in one atomic block.
+#
+# Nothing changes while settings.DATABASES has no replica alias. To try it locally, point a second alias at a copy
+# of the database (two SQLite files, or a PostgreSQL streaming replica), e.g. with DB_REPLICA_HOST in settings.py.
+#
+# settings.EXP_BUD_REPLICA (all keys optional):
+#   'ALIAS': 'replica'       → settings.DATABASES alias of the replica
+#   'STICKY_SECONDS': 5      → how long a client's reads stay on the primary after it wrote (>= replication lag)
+#   'CACHE_ALIAS': 'default' → settings.CACHES alias holding the sticky marks
+
+_reading = contextvars.ContextVar('exp_bud_replica_reads', default=False)
+
+
+def config():
+    return {'ALIAS': 'replica', 'STICKY_SECONDS': 5, 'CACHE_ALIAS': 'default', **getattr(settings, 'EXP_BUD_REPLICA', {})}
+
+
+def enabled():
+    return config()['ALIAS'] in settings.DATABASES
+
+
+@contextmanager
+def reading(on=True):
+    # reads in this block go to the replica (when the router allows it)
+    token = _reading.set(on)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+def read_alias():
+    # the database the router sends a read to right now
+    if _reading.get() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return config()['ALIAS']
+    return DEFAULT_DB_ALIAS
+
+
+def client_key(request):
+    # None for anonymous requests: they can't read any group data, so they never need to stick to the primary
+    credential = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credential:
+        return None
+    return 'exp_bud:sticky:' + hashlib.sha256(credential.encode()).hexdigest()[:32]
+
+
+def is_sticky(key):
+    return key is not None and caches[config()['CACHE_ALIAS']].get(key) is not None
+
+
+async def ais_sticky(key):
+    return key is not None and await caches[config()['CACHE_ALIAS']].aget(key) is not None
+
+
+def mark_sticky(key):
+    options = config()
+    if key is not None and options['STICKY_SECONDS'] > 0:
+        caches[options['CACHE_ALIAS']].set(key, 1, options['STICKY_SECONDS'])
+
+
+async def amark_sticky(key):
+    options = config()
+    if key is not None and options['STICKY_SECONDS'] > 0:
+        await caches[options['CACHE_ALIAS']].aset(key, 1, options['STICKY_SECONDS'])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True # both aliases hold the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != config()['ALIAS'] # the replica gets its schema from the primary
@@ -0,0 +1,100 @@
+import hashlib
+import json
+from decimal import Decimal
+from django.db.models import Q
+from .models import MonthlySpend, MemberBalance, BudgetPeriod
+
+# reports.py builds the multi-month budget report from the materialized tables only:
+# one grouped query each for spend by category (MonthlySpend), spend by payer (MemberBalance.paid) and budgets,
+# however many months the range covers.
+
+ZERO = Decimal('0.00')
+MAX_MONTHS = 120 # ten years; the response has one entry per month
+
+
+def parse_month(value):
+    # 'YYYY-MM' -> (year, month); raises ValueError on anything else
+    year, _, month = value.partition('-')
+    year, month = int(year), int(month)
+    if not 1 <= month <= 12 or year < 1:
+        raise ValueError(value)
+    return year, month
+
+
+def months_between(first, last):
+    # every (year, month) from first to last, both included
+    index, end = first[0] * 12 + first[1] - 1, last[0] * 12 + last[1] - 1
+    return [(i // 12, i % 12 + 1) for i in range(index, end + 1)]
+
+
+def period_range(first, last):
+    # WHERE (year, month) BETWEEN first AND last, written so the (group, year, month) indexes can be used
+    (fy, fm), (ly, lm) = first, last
+    return Q(year__gte=fy, year__lte=ly) & ~Q(year=fy, month__lt=fm) & ~Q(year=ly, month__gt=lm)
+
+
+def build_report(group, first, last):
+    in_range = period_range(first, last)
+    months = {(y, m): {'spent': ZERO, 'budget': None, 'categories': {}} for y, m in months_between(first, last)}
+    categories = {}
+    payers = {}
+
+    spend = (MonthlySpend.objects.filter(in_range, group=group, count__gt=0)
+             .values_list('year', 'month', 'category_id', 'category__name', 'total', 'count'))
+    for year, month, cat_id, name, total, count in spend:
+        entry = months[(year, month)]
+        entry['spent'] += total
+        entry['categories'][cat_id] = {'category_id': cat_id, 'category_name': name, 'spent': total, 'count': count}
+        category = categories.setdefault(cat_id, {'category_id': cat_id, 'category_name': name, 'spent': ZERO, 'count': 0})
+        category['spent'] += total
+        category['count'] += count
+
+    paid = (MemberBalance.objects.filter(in_range, group=group, paid__gt=0)
+            .values_list('user_id', 'user__username', 'paid'))
+    for user_id, username, amount in paid:
+        payer = payers.setdefault(user_id, {'user_id': user_id, 'username': username, 'paid': ZERO})
+        payer['paid'] += amount
+
+    for year, month, limit in BudgetPeriod.objects.filter(in_range, group=group).values_list('year', 'month', 'limit'):
+        months[(year, month)]['budget'] = limit
+
+    month_list = []
+    total_spent, total_budget = ZERO, ZERO
+    budgeted_spent = ZERO # spend of the months that have a budget, to compare against total_budget
+    for (year, month), entry in months.items():
+        budget = entry['budget']
+        total_spent += entry['spent']
+        if budget is not None:
+            total_budget += budget
+            budgeted_spent += entry['spent']
+        month_list.append({
+            'year': year,
+            'month': month,
+            'spent': str(entry['spent']),
+            'budget_limit': str(budget) if budget is not None else None,
+            'remaining': str(budget - entry['spent']) if budget is not None else None,
+            'categories': [_money_fields(c) for c in sorted(entry['categories'].values(), key=lambda c: c['category_name'])],
+        })
+
+    return {
+        'group_id': group.id,
+        'currency': group.currency,
+        'from': f'{first[0]:04d}-{first[1]:02d}',
+        'to': f'{last[0]:04d}-{last[1]:02d}',
+        'total_spent': str(total_spent),
+        'total_budget': str(total_budget),
+        'remaining': str(total_budget - budgeted_spent),
+        'months': month_list,
+        'by_category': [_money_fields(c) for c in sorted(categories.values(), key=lambda c: (-c['spent'], c['category_name']))],
+        'by_payer': [_money_fields(p) for p in sorted(payers.values(), key=lambda p: (-p['paid'], p['user_id']))],
+    }
+
+
+def _money_fields(row):
+    return {key: str(value) if isinstance(value, Decimal) else value for key, value in row.items()}
+
+
+def etag_for(payload):
+    # strong ETag from the content, so an unchanged report is answered with 304 and no body
+    raw = json.dumps(payload, sort_keys=True, separators=(',', ':')).encode()
+    return '"%s"' % hashlib.sha256(raw).hexdigest()[:32]
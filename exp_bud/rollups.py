@@ -0,0 +1,120 @@
+from collections import defaultdict
+from decimal import Decimal
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from .models import Expense, MonthlySpend, ArchivedExpense
+from .ledger import period_of, lock_group
+
+# rollups.py keeps MonthlySpend in sync with Expense. Like ledger.py, every write path calls apply_expense()
+# inside the same transaction.atomic block as the expense write itself.
+
+ZERO = Decimal('0.00')
+
+
+def _new_delta():
+    return {'total': ZERO, 'count': 0}
+
+
+def expense_deltas(expenses, sign=1):
+    # key: (category_id, year, month) -> {'total': .., 'count': ..}
+    deltas = defaultdict(_new_delta)
+    for expense in expenses:
+        delta = deltas[(expense.category_id, *period_of(expense.spent_at))]
+        delta['total'] += sign * expense.amount
+        delta['count'] += sign
+    return deltas
+
+
+def merge_deltas(target, deltas):
+    # add deltas into target so an update (old expense out, new expense in) is applied with one apply_deltas() call
+    for key, delta in deltas.items():
+        merged = target.setdefault(key, _new_delta())
+        merged['total'] += delta['total']
+        merged['count'] += delta['count']
+    return target
+
+
+def apply_deltas(group_id, deltas):
+    # Must be called inside transaction.atomic. One expense touches one row, an import chunk one row per (month, category).
+    deltas = {key: delta for key, delta in deltas.items() if delta['count'] or delta['total']}
+    if not deltas:
+        return
+    lock_group(group_id) # same group lock as the ledger: serializes writers with rebuild_group() below
+    MonthlySpend.objects.bulk_create(
+        [MonthlySpend(group_id=group_id, category_id=cat_id, year=y, month=m) for (cat_id, y, m) in deltas],
+        ignore_conflicts=True,
+    )
+    locked = (MonthlySpend.objects.select_for_update()
+              .filter(group_id=group_id,
+                      category_id__in={k[0] for k in deltas},
+                      year__in={k[1] for k in deltas},
+                      month__in={k[2] for k in deltas})
+              .order_by('id') # same lock order for every writer → no deadlock
+              .values_list('id', 'category_id', 'year', 'month'))
+    for row_id, cat_id, year, month in locked:
+        delta = deltas.get((cat_id, year, month))
+        if delta is not None:
+            MonthlySpend.objects.filter(id=row_id).update(total=F('total') + delta['total'], count=F('count') + delta['count'])
+
+
+def apply_expense(expense, sign=1):
+    # sign=1 adds the expense to the rollup, sign=-1 removes it (used before update/delete)
+    apply_deltas(expense.group_id, expense_deltas([expense], sign))
+
+
+def compute_group_spend(group_id):
+    # the rollup rows of a group computed from the raw expenses with one GROUP BY query per table,
+    # UNION ALL'd with the archived expenses (periods.py) so it stays one round trip
+    hot, archived = [
+        (model.objects.filter(group_id=group_id)
+         .annotate(year=ExtractYear('spent_at'), month=ExtractMonth('spent_at'))
+         .values_list('category_id', 'year', 'month')
+         .annotate(total=Sum('amount'), count=Count('id'))
+         .order_by())
+        for model in (Expense, ArchivedExpense)
+    ]
+    spend = defaultdict(_new_delta)
+    for cat_id, year, month, total, count in hot.union(archived, all=True):
+        spend[(cat_id, year, month)]['total'] += Decimal(total).quantize(ZERO)
+        spend[(cat_id, year, month)]['count'] += count
+    return dict(spend)
+
+
+def rebuild_group(group_id):
+    # Must be called inside transaction.atomic
+    lock_group(group_id)
+    spend = compute_group_spend(group_id)
+    MonthlySpend.objects.filter(group_id=group_id).delete()
+    MonthlySpend.objects.bulk_create(
+        [MonthlySpend(group_id=group_id, category_id=cat_id, year=y, month=m, **values) for (cat_id, y, m), values in spend.items()],
+        batch_size=1000,
+    )
+    return len(spend)
+
+
+def verify_group(group_id):
+    expected = compute_group_spend(group_id)
+    stored = {
+        (row.category_id, row.year, row.month): {'total': row.total, 'count': row.count}
+        for row in MonthlySpend.objects.filter(group_id=group_id)
+    }
+    mismatches = []
+    for key in expected.keys() | stored.keys():
+        want = expected.get(key, _new_delta())
+        have = stored.get(key, _new_delta())
+        if want != have:
+            cat_id, year, month = key
+            mismatches.append({'category_id': cat_id, 'year': year, 'month': month, 'expected': want, 'stored': have})
+    return mismatches
+
+
+def month_spend(group_id, year, month):
+    # total spent in a month, read from at most one rollup row per category
+    total = MonthlySpend.objects.filter(group_id=group_id, year=year, month=month).aggregate(total=Sum('total'))['total']
+    return Decimal(total or ZERO).quantize(ZERO)
+
+
+async def amonth_spend(group_id, year, month):
+    # month_spend() for async views
+    total = (await MonthlySpend.objects.filter(group_id=group_id, year=year, month=month).aaggregate(total=Sum('total')))['total']
+    return Decimal(total or ZERO).quantize(ZERO)
@@ -1,9 +1,14 @@
 from decimal import Decimal
+import copy
 from django.db import transaction # transaction : a group of database operations that must succeed together as one unit.
                                   # It follows the rule: all succeed (commit) or none succeed (rollback).
 from django.contrib.auth import get_user_model
+from django.db.models import F
 from rest_framework import serializers
-from .models import Group, Member, Category, Expense, ExpenseSplit, BudgetPeriod, Settlement
+from .models import Group, Member, Category, Expense, ExpenseSplit, BudgetPeriod, Settlement, Job
+from .context import GroupContext
+from .exceptions import Conflict, PreconditionRequired
+from . import ledger, rollups, versions, periods, export
 
 User = get_user_model()
 
@@ -75,6 +80,14 @@ class GroupSerializer(serializers.ModelSerializer):
         model = Group
         fields = ['id', 'name','currency', 'categories', 'created_by', 'created_by_username', 'members_info', 'created_at']
         read_only_fields = ['id', 'created_by', 'created_at']
+    
+    def __init__(self, *args, **kwargs):
+        # optional fields=[...] keeps only those fields (sparse fieldsets, ?fields= on the group views)
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
         
 
 class AddMemberSerializer(serializers.Serializer):
@@ -102,6 +115,17 @@ class ExpenseSplitOutputSerializer(serializers.ModelSerializer):
         fields = ['id', 'user_id', 'username','expense', 'share']
         
 
+def equal_shares(amount, count):
+    # split amount into count equal shares rounded to cents; the last share absorbs the rounding remainder
+    base = (amount/count).quantize(Decimal('0.01')) # quantize is used to round a Decimal to a fixed number of decimal places.
+    shares = [base] * count
+    
+    # fix rounding remainder
+    remainder = amount - sum(shares) # remainder ensures the total of all shares equals the original amount 
+    shares[-1] = shares[-1] + remainder
+    return shares
+
+
 class ExpenseSerializer(serializers.ModelSerializer):
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
     paid_by_username = serializers.CharField(source='paid_by.username', read_only=True)
@@ -112,11 +136,14 @@ class ExpenseSerializer(serializers.ModelSerializer):
     category_id = serializers.IntegerField(required=False, allow_null=True)
     paid_by_id = serializers.IntegerField()
     split_items = ExpenseSplitInputSerializer(many=True, required=False)    
+    # optimistic concurrency: send back the version you read (or send it in If-Match); an update against an older
+    # version gets 409, an update without any gets 428. Not needed on create.
+    version = serializers.IntegerField(required=False, min_value=1)
     
     class Meta:
         model = Expense
         fields = ['id', 'group', 'description', 'amount', 'spent_at', 'category_id', 'category_name', 'created_by', 
-                  'created_by_username', 'paid_by_id','paid_by_username', 'splits', 'split_items']
+                  'created_by_username', 'paid_by_id','paid_by_username', 'splits', 'split_items', 'version']
         
         read_only_fields = ['id', 'group', 'created_by', 'created_by_username', 'category_name', 'paid_by_username', 
                 'created_at','splits']
@@ -127,37 +154,38 @@ class ExpenseSerializer(serializers.ModelSerializer):
         group = self.context['group'] # context is a dictionary used for runtime data passed from View to Serializer
                                       # Used for authorization, validation, and controlled object creation
                                       # uses of context : security and validation, object creation, access request user
-        request = self.context['request']
+        group_ctx = self.context.get('group_ctx') or GroupContext(group) # request-wide member/category ids (context.py)
+        instance = self.instance # set on update; a PATCH only sends the fields that change
         
-        # paid_by user must be a member of the group
-        try:
-            paid_by = User.objects.get(id=attrs['paid_by_id'])
-        except User.DoesNotExist:
-            raise serializers.ValidationError({'paid_by_id': 'Invalid User'})
-        
-        if not Member.objects.filter(group=group, user=paid_by).exists():  # exists() → checks if any row exists (True or False)
+        # paid_by user must be a member of the group (members are always valid users)
+        paid_by_id = attrs.get('paid_by_id', instance.paid_by_id if instance else None)
+        if not group_ctx.is_member(paid_by_id):
             raise serializers.ValidationError({'paid_by_id': 'paid_by user must be a member of the group'})
         
         # category must belongs to the same group (if provided)
         cat_id = attrs.get('category_id', None)
         if cat_id is not None:
-            if not Category.objects.filter(id=cat_id, group=group).exists():
+            if cat_id not in group_ctx.category_ids:
                 raise serializers.ValidationError({'category_id': 'category id does not belongs to the group'})
         
         # validate split 
         split_items = attrs.get('split_items')
         if split_items:
-            member_ids = set(Member.objects.filter(group=group).values_list('user_id', flat=True))
-            # values_list("user_id") is a Django ORM method used to fetch only one column from the database
-            # flat=True give just the user IDs as a plain list
             total = Decimal('0.00')
             for item in split_items:
-                if item['user_id'] not in member_ids:
+                if not group_ctx.is_member(item['user_id']):
                     raise serializers.ValidationError({'split_items': 'split user must be the member of the group'})
                 total += item['share']
             
-            if total != attrs['amount']:
-                raise serializers.ValidationError({'split_items": "split total must equal the expense amount'})
+            if len({item['user_id'] for item in split_items}) != len(split_items):
+                raise serializers.ValidationError({'split_items': 'each user can appear only once'})
+            
+            amount = attrs.get('amount', instance.amount if instance else None)
+            if total != amount:
+                raise serializers.ValidationError({'split_items': 'split total must equal the expense amount'})
+        
+        # an expense can't be added to, moved into or out of a closed month (periods.py)
+        periods.check_open(group.id, attrs.get('spent_at'), instance.spent_at if instance else None)
         
         return attrs
     
@@ -166,6 +194,7 @@ class ExpenseSerializer(serializers.ModelSerializer):
     def create(self, validated_data): # validated_data is a dictionary(key --> value)
         group = self.context['group']
         request = self.context['request']
+        group_ctx = self.context.get('group_ctx') or GroupContext(group)
         
         cat_id = validated_data.pop('category_id', None) 
         # pop removes key from the dictionary and returns its value  (data = {"paid_by_id": 10, "amount": 250})
@@ -174,55 +203,161 @@ class ExpenseSerializer(serializers.ModelSerializer):
                                                                      # data == {"amount": 250}
         paid_by_id = validated_data.pop('paid_by_id')
         split_items = validated_data.pop('split_items', None)
+        validated_data.pop('version', None) # a new expense always starts at version 1
+        # the view passes group/created_by to save(); they are set explicitly below
+        validated_data.pop('group', None)
+        validated_data.pop('created_by', None)
         
-        category = None
-        if cat_id is not None:
-            category = Category.objects.get(id=cat_id, group=group)
-        
-        paid_by = User.objects.get(id=paid_by_id)
-        
+        # ids were checked in validate(), so set the foreign keys by id without fetching the rows again
         expense = Expense.objects.create(
             group=group,
-            category=category,
-            paid_by=paid_by,
+            category_id=cat_id,
+            paid_by_id=paid_by_id,
             created_by=request.user,
             **validated_data,
         )
         
         # If client did not send split_items, do equal split across current members
         if not split_items:
-            member_ids = list(Member.objects.filter(group=group).values_list('user_id', flat=True))
-            count = len(member_ids)
-            if count == 0:
+            member_ids = group_ctx.member_ids
+            if len(member_ids) == 0:
                 raise serializers.ValidationError('Group has no member')
+            
+            # zip() is a Python built-in function that combines multiple lists into pairs (tuples) element by element.
+            # each member ID gets its corresponding share.
+            pairs = zip(member_ids, equal_shares(expense.amount, len(member_ids)))
+        else:
+            pairs = [(item['user_id'], item['share']) for item in split_items]
         
-            amount = expense.amount
-            base = (amount/count).quantize(Decimal('0.01')) # quantize is used to round a Decimal to a fixed number of decimal places.
-            shares = [base] * count
+        # build every split in memory and write them with one INSERT instead of one round trip per member,
+        # so the transaction (and its row locks) stays short even for big groups
+        splits = ExpenseSplit.objects.bulk_create(
+            [ExpenseSplit(expense=expense, user_id=uid, share=share) for uid, share in pairs]
+        )
         
-            # fix rounding remainder
-            remainder = amount - sum(shares) # remainder ensures the total of all shares equals the original amount 
-            shares[-1] = shares[-1] + remainder
+        # keep the balance ledger and the monthly spend rollup in sync inside the same transaction (@transaction.atomic above)
+        ledger.apply_expense(expense, splits)
+        rollups.apply_expense(expense)
+        return expense
+    
+    
+    def update(self, instance, validated_data):
+        # Everything that only needs Python (new shares, the split diff, ledger/rollup deltas) is worked out first,
+        # then one short transaction writes it. The conditional UPDATE ... WHERE version = ? is the first write, so a
+        # concurrent edit is detected (409) before anything else is touched, and no row lock is held while we compute.
+        expected = validated_data.pop('version', None)
+        if_match = self.context.get('if_match_version') # parsed by ExpenseDetailView
+        if expected is None:
+            expected = if_match
+        elif if_match is not None and if_match != expected:
+            raise serializers.ValidationError({'version': 'does not match the If-Match header'})
+        if expected is None:
+            raise PreconditionRequired()
+        if expected != instance.version:
+            raise Conflict()
+        split_items = validated_data.pop('split_items', None)
+        validated_data.pop('group', None)
+        validated_data.pop('created_by', None)
+        if validated_data.get('category_id', 0) is None: # category is required on the model, null means "keep it"
+            validated_data.pop('category_id')
         
-            for uid, share in zip(member_ids, shares):
-                # zip() is a Python built-in function that combines multiple lists into pairs (tuples) element by element.
-                # each member ID gets its corresponding share.
-                ExpenseSplit.objects.create(expense=expense, user_id=uid, share=share)
+        old = copy.copy(instance)
+        old_splits = list(instance.splits.all()) # prefetched by the view (same read as the version we check)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
         
+        if split_items:
+            pairs = [(item['user_id'], item['share']) for item in split_items]
+        elif instance.amount != old.amount:
+            # amount changed but no new split → split it equally again among the same participants
+            user_ids = [s.user_id for s in old_splits] or self.context['group_ctx'].member_ids
+            pairs = list(zip(user_ids, equal_shares(instance.amount, len(user_ids))))
         else:
-            for item in split_items:
-                ExpenseSplit.objects.create(expense=expense, user_id=item['user_id'], share=item['share'])
+            pairs = [(s.user_id, s.share) for s in old_splits]
+        
+        # diff old and new splits by user: only rows that really change are written
+        old_by_user = {s.user_id: s for s in old_splits}
+        new_by_user = dict(pairs)
+        removed = [s.id for uid, s in old_by_user.items() if uid not in new_by_user]
+        added = [ExpenseSplit(expense=instance, user_id=uid, share=share) for uid, share in pairs if uid not in old_by_user]
+        changed = [ExpenseSplit(id=old_by_user[uid].id, share=share) for uid, share in pairs
+                   if uid in old_by_user and old_by_user[uid].share != share]
+        
+        # one combined delta (old out, new in) each for the ledger and the rollup; entries that cancel out are dropped
+        new_splits = [ExpenseSplit(user_id=uid, share=share) for uid, share in pairs]
+        balance_deltas = ledger.merge_deltas(ledger.expense_deltas(old, old_splits, sign=-1), ledger.expense_deltas(instance, new_splits))
+        balance_deltas = {key: delta for key, delta in balance_deltas.items() if any(delta.values())}
+        spend_deltas = rollups.merge_deltas(rollups.expense_deltas([old], sign=-1), rollups.expense_deltas([instance]))
+        
+        with transaction.atomic():
+            updated = Expense.objects.filter(pk=instance.pk, version=expected).update(version=F('version') + 1, **validated_data)
+            if not updated: # someone else saved (or deleted) it since we read it
+                raise Conflict()
+            if removed:
+                ExpenseSplit.objects.filter(id__in=removed).delete()
+            if added:
+                ExpenseSplit.objects.bulk_create(added)
+            if changed:
+                ExpenseSplit.objects.bulk_update(changed, ['share'], batch_size=500)
+            if instance.spent_at != old.spent_at: # the splits' copy of spent_at follows (and their partition, on PostgreSQL)
+                ExpenseSplit.objects.filter(expense_id=instance.id).update(spent_at=instance.spent_at)
+            ledger.apply_deltas(instance.group_id, balance_deltas)
+            rollups.apply_deltas(instance.group_id, spend_deltas)
+            versions.bump(instance.group_id) # queryset update / bulk ops send no signals
+        
+        instance.version = expected + 1
+        return instance
         
 
 
 class BudgetPeriodSerializer(serializers.ModelSerializer):
+    # the model allows no limit (a closed month without a budget), setting a budget still needs one
+    limit = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.00'))
+    
     class Meta:
         model = BudgetPeriod
-        fields = ['id', 'year', 'month', 'limit', 'created_at']
-        read_only_fields = ['id', 'created_at']
+        fields = ['id', 'year', 'month', 'limit', 'created_at', 'closed_at', 'archived_at']
+        read_only_fields = ['id', 'created_at', 'closed_at', 'archived_at']
         
 
 
+class ClosePeriodSerializer(serializers.Serializer):
+    year = serializers.IntegerField(min_value=1)
+    month = serializers.IntegerField(min_value=1, max_value=12)
+    archive = serializers.BooleanField(default=False) # also move the month's raw rows to the archive tables
+
+
+class JobCreateSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=Job.Kind.choices)
+    # export only, same values as the query params of GET groups/<id>/export/
+    table = serializers.ChoiceField(choices=list(export.TABLES), default='expenses')
+    type = serializers.ChoiceField(choices=list(export.TYPES), default='csv')
+    gzip = serializers.BooleanField(default=False)
+
+
+class ExportJobCreateSerializer(JobCreateSerializer):
+    # POST groups/<id>/export/: the kind is fixed, the body only carries the export parameters
+    kind = serializers.HiddenField(default=Job.Kind.EXPORT)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'group', 'kind', 'params', 'status', 'progress', 'message', 'result', 'error', 'attempts',
+                  'max_attempts', 'run_after', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+
+class SettlementInputSerializer(serializers.Serializer):
+    # one item of the bulk endpoint: plain user ids (membership is checked against the group's member set,
+    # so there is no per-item User lookup like the PrimaryKeyRelatedFields of SettlementSerializer do)
+    from_user = serializers.IntegerField()
+    to_user = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0.01'))
+    note = serializers.CharField(required=False, allow_blank=True, default='')
+    settled_at = serializers.DateTimeField(required=False)
+
+
 class SettlementSerializer(serializers.ModelSerializer):
     from_username = serializers.CharField(source='from_user.username', read_only=True)
     to_username = serializers.CharField(source='to_user.username', read_only=True)
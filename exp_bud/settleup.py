@@ -0,0 +1,84 @@
+import heapq
+from decimal import Decimal
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import MemberBalance, Settlement
+from . import ledger, versions
+
+# settleup.py turns the net balance of every member (+ should receive, - owes) into a short list of transfers.
+#
+# Greedy matching with two heaps: always let the member who owes the most pay the member who is owed the most.
+# Each transfer settles at least one of the two completely, so there are at most n - 1 transfers for n members
+# with a non-zero balance, and the whole plan costs O(n log n). (The true minimum number of transfers is an
+# NP-hard subset-sum problem; the greedy plan is the standard good-enough answer.)
+# Amounts stay Decimal end to end, so the transfers add up to the balances to the cent.
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+
+def group_balances(group_id, year=None, month=None):
+    # {user_id: net} from the MemberBalance ledger in one GROUP BY query: all time, or one month
+    rows = MemberBalance.objects.filter(group_id=group_id)
+    if year is not None:
+        rows = rows.filter(year=year, month=month)
+    rows = (rows.values_list('user_id')
+            .annotate(net=Sum(F('paid') - F('owed') + F('sent') - F('received')))
+            .order_by())
+    # quantize before dropping zeros: SQLite sums decimals as floats and leaves residue like 1e-13
+    balances = {uid: Decimal(net or 0).quantize(CENT) for uid, net in rows}
+    return {uid: net for uid, net in balances.items() if net}
+
+
+def plan_transfers(balances):
+    # balances: {user_id: Decimal net}. Returns [(from_user_id, to_user_id, amount), ...], biggest debts first.
+    # heapq is a min-heap, so amounts are pushed negated; user id breaks ties so the plan is deterministic.
+    creditors = [(-net, uid) for uid, net in balances.items() if net > 0]
+    debtors = [(net, uid) for uid, net in balances.items() if net < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+
+    transfers = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        amount = min(-credit, -debt)
+        transfers.append((debtor, creditor, amount))
+
+        # whoever is not fully settled goes back in with what is left
+        if -credit > amount:
+            heapq.heappush(creditors, (credit + amount, creditor))
+        if -debt > amount:
+            heapq.heappush(debtors, (debt + amount, debtor))
+    return transfers
+
+
+def unsettled(balances, transfers):
+    # what is left of each balance after the transfers (empty when the balances summed to zero)
+    left = dict(balances)
+    for from_id, to_id, amount in transfers:
+        left[from_id] += amount
+        left[to_id] -= amount
+    return {uid: net for uid, net in left.items() if net}
+
+
+def commit_plan(group_id, note='settle up'):
+    # Must be called inside transaction.atomic. Takes the group lock first (ledger.lock_group, the same lock and the
+    # same order as every other writer: group, then ledger rows), so two concurrent commits cannot both plan against
+    # the same balances and pay everything twice, and no expense write changes the balances in between.
+    ledger.lock_group(group_id)
+    transfers = plan_transfers(group_balances(group_id))
+    now = timezone.now()
+    return record(group_id, [
+        Settlement(group_id=group_id, from_user_id=from_id, to_user_id=to_id, amount=amount, note=note, settled_at=now)
+        for from_id, to_id, amount in transfers
+    ])
+
+
+def record(group_id, settlements):
+    # Must be called inside transaction.atomic. One INSERT for all the rows, the ledger touched once,
+    # one version bump (bulk_create sends no signals). Returns the rows with their ids, in input order.
+    settlements = Settlement.objects.bulk_create(settlements)
+    ledger.apply_settlements(group_id, settlements)
+    versions.bump(group_id)
+    return settlements
@@ -0,0 +1,60 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Group, Member, Category, Expense, ExpenseSplit, Settlement, BudgetPeriod
+from .cache import group_cache
+from . import versions
+
+# Keep cache.group_cache correct: any change to a group's members or categories drops the cached set.
+# The entry is dropped right away and again after commit, so a request that re-reads the old rows
+# before this transaction commits cannot leave a stale value behind.
+# (bulk_create / queryset.update do not send signals; code using them must invalidate itself.)
+
+
+@receiver([post_save, post_delete], sender=Member)
+def member_changed(sender, instance, **kwargs):
+    group_cache.invalidate_members(instance.group_id)
+    transaction.on_commit(lambda: group_cache.invalidate_members(instance.group_id))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    group_cache.invalidate_categories(instance.group_id)
+    transaction.on_commit(lambda: group_cache.invalidate_categories(instance.group_id))
+
+
+@receiver([post_save, post_delete], sender=BudgetPeriod)
+def budget_period_changed(sender, instance, **kwargs):
+    group_cache.invalidate_closed(instance.group_id)
+    transaction.on_commit(lambda: group_cache.invalidate_closed(instance.group_id))
+
+
+# Group.data_version (versions.py): one bump per saved/deleted row of the group.
+# Rows deleted because their group is being deleted are skipped (origin): the group is gone, so a cascade
+# doesn't cost one UPDATE per child row.
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        versions.bump(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Expense)
+@receiver([post_save, post_delete], sender=Settlement)
+@receiver([post_save, post_delete], sender=BudgetPeriod)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Member)
+def group_row_changed(sender, instance, origin=None, **kwargs):
+    if not isinstance(origin, Group):
+        versions.bump(instance.group_id)
+
+
+@receiver(post_save, sender=ExpenseSplit)
+def split_saved(sender, instance, **kwargs):
+    # (no post_delete receiver: it would turn the one-query delete of an expense's splits into a select + delete.
+    # Splits are only deleted with their expense or by ExpenseSerializer.update, and both bump the version.)
+    if ExpenseSplit.expense.is_cached(instance):
+        versions.bump(instance.expense.group_id)
+    else:
+        Group.objects.filter(expenses__id=instance.expense_id).update(data_version=F('data_version') + 1)
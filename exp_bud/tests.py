@@ -1,3 +1,1595 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+from datetime import timedelta
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.db.models import F, Sum
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Group, Member, Category, Expense, ExpenseSplit, Settlement, BudgetPeriod, MemberBalance, ArchivedExpense, ArchivedExpenseSplit, Job
+from .serializers import equal_shares
+from .cache import group_cache, LRUCache, MISSING
+from .exceptions import Conflict
+from .views import ExpenseListCreateView, GroupListCreateView
+from .middleware import ReplicaRoutingMiddleware
+from . import ledger, rollups, settleup, metrics, async_views, partitions, replicas, jobs, periods
 
-# Create your tests here.
+User = get_user_model()
+
+
+def login(client, user):
+    client.force_authenticate(user)
+
+
+def seed_group(name, members, expenses, settlements, start):
+    # bulk-create one group with realistic history (expenses spread over ~6 months, equal splits)
+    users = User.objects.bulk_create([User(username=f'{name}-u{i}') for i in range(members)])
+    group = Group.objects.create(name=name, created_by=users[0])
+    Member.objects.bulk_create([Member(group=group, user=u, role=Member.Role.CREATOR if i == 0 else Member.Role.MEMBER)
+                                for i, u in enumerate(users)])
+    categories = Category.objects.bulk_create([Category(group=group, name=f'cat{i}') for i in range(5)])
+    BudgetPeriod.objects.create(group=group, year=start.year, month=start.month, limit=Decimal('5000.00'), created_by=users[0])
+
+    rnd = random.Random(name)
+    rows = Expense.objects.bulk_create([
+        Expense(group=group, category=rnd.choice(categories), paid_by=rnd.choice(users), created_by=users[0],
+                amount=Decimal(rnd.randint(100, 50000)) / 100, spent_at=start + timedelta(minutes=rnd.randint(0, 260000)))
+        for _ in range(expenses)
+    ], batch_size=1000)
+
+    splits = []
+    for expense in rows:
+        sharing = rnd.sample(users, min(4, len(users)))
+        splits += [ExpenseSplit(expense=expense, user=u, share=s) for u, s in zip(sharing, equal_shares(expense.amount, len(sharing)))]
+    ExpenseSplit.objects.bulk_create(splits, batch_size=2000)
+
+    Settlement.objects.bulk_create([
+        Settlement(group=group, from_user=a, to_user=b, amount=Decimal('10.00'), settled_at=start + timedelta(minutes=rnd.randint(0, 260000)))
+        for a, b in (rnd.sample(users, 2) for _ in range(settlements))
+    ], batch_size=1000)
+    ledger.rebuild_group(group.id)
+    rollups.rebuild_group(group.id)
+    return group, users
+
+
+class ExpBudTestCase(TestCase):
+    def setUp(self):
+        # test rollbacks don't send signals and ids get reused, so start every test with empty caches
+        group_cache.clear()
+        cache.clear()
+
+
+def full_scans(sql):
+    # tables of this app that the plan reads with a sequential / full table scan
+    vendor = connection.vendor
+    with connection.cursor() as cursor:
+        if vendor == 'postgresql':
+            cursor.execute('EXPLAIN ' + sql)
+            return [line for (line,) in cursor.fetchall() if 'Seq Scan on exp_bud_' in line]
+        if vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            # "SCAN <table>" without an index = full scan; "SEARCH ... USING INDEX" / "SCAN ... USING INDEX" are fine
+            return [row[-1] for row in cursor.fetchall()
+                    if row[-1].startswith('SCAN exp_bud_') and 'USING' not in row[-1]]
+    return []
+
+
+class ExpenseListTests(ExpBudTestCase):
+    # keyset pagination and the filters of the expense list (shared with the async list, async_views.py)
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=60)
+        cls.group, cls.users = seed_group('list', members=3, expenses=130, settlements=0, start=cls.start)
+        # same spent_at on several rows: id must break the tie without skipping or repeating any
+        Expense.objects.filter(id__in=list(cls.group.expenses.order_by('id').values_list('id', flat=True)[:20])).update(spent_at=cls.start)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        self.url = f'/api/groups/{self.group.id}/expenses/'
+
+    def test_cursor_pages_cover_every_row_once_newest_first(self):
+        seen, path = [], f'{self.url}?page_size=17'
+        while path:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 17)
+            seen += [row['id'] for row in response.data['results']]
+            path = response.data['next']
+        expected = list(self.group.expenses.order_by('-spent_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_filters(self):
+        category = self.group.categories.order_by('id').first()
+        since = self.start + timedelta(days=20)
+        response = self.client.get(f'{self.url}?page_size=200&category={category.id}&paid_by={self.users[1].id}'
+                                   f'&min_amount=50&max_amount=300&start={since.date()}')
+        self.assertEqual(response.status_code, 200)
+        expected = self.group.expenses.filter(category=category, paid_by=self.users[1], amount__gte=50, amount__lte=300,
+                                              spent_at__gte=since)
+        self.assertEqual(sorted(row['id'] for row in response.data['results']), sorted(expected.values_list('id', flat=True)))
+
+    def test_bad_values_are_400_not_500(self):
+        for query in ('start=yesterday', 'start=2024-02-30', 'end=2024-13-01T00:00', 'category=x', 'min_amount=abc',
+                      'min_amount=NaN', 'max_amount=Infinity', 'max_amount=-inf'):
+            response = self.client.get(f'{self.url}?{query}')
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn(query.split('=')[0], response.data)
+        self.assertEqual(self.client.get(f'{self.url}?cursor=not-a-cursor').status_code, 404)
+
+
+class ImportTests(ExpBudTestCase):
+    # the CSV / JSONL importer (importer.py): bad rows are reported per line, good rows are written chunk by chunk
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=60)
+        cls.group, cls.users = seed_group('import', members=3, expenses=0, settlements=0, start=cls.start)
+        cls.category = cls.group.categories.order_by('id').first()
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        self.url = f'/api/groups/{self.group.id}/expenses/import/'
+
+    def csv(self, *lines):
+        return BytesIO(('amount,paid_by_id,category_id,spent_at,splits\n' + ''.join(line + '\n' for line in lines)).encode())
+
+    def test_bad_rows_are_reported_by_line_and_good_rows_imported(self):
+        from .importer import import_expenses
+        a, b, c = (u.id for u in self.users)
+        outsider = User.objects.create(username='import-outsider')
+        when = self.start.isoformat()
+        report = import_expenses(self.group, self.users[0], self.csv(
+            f'10.00,{a},{self.category.id},{when},',                     # line 2: ok, equal split
+            f'0,{a},{self.category.id},{when},',                         # line 3: amount too small
+            f'5.00,{outsider.id},{self.category.id},{when},',            # line 4: payer not a member
+            f'5.00,{a},{self.category.id},{when},{a}:2.00;{a}:3.00',     # line 5: same user twice
+            f'5.00,{a},{self.category.id},{when},{a}:2.00;{b}:2.00',     # line 6: shares don't add up
+            f'6.00,{b},{self.category.id},{when},{b}:1.00;{c}:5.00',     # line 7: ok, explicit split
+        ), 'csv', chunk_size=2)
+        self.assertEqual((report['created'], report['error_count']), (2, 4), report)
+        self.assertEqual([e['row'] for e in report['errors']], [3, 4, 5, 6])
+        self.assertIn('amount', report['errors'][0]['errors'])
+        self.assertIn('paid_by_id', report['errors'][1]['errors'])
+        self.assertEqual(str(report['errors'][2]['errors']['split_items'][0]), 'each user can appear only once')
+        self.assertEqual(sorted(ExpenseSplit.objects.filter(expense__group=self.group, expense__amount=Decimal('10.00'))
+                                .values_list('share', flat=True)), [Decimal('3.33'), Decimal('3.33'), Decimal('3.34')])
+        self.assertEqual(ledger.verify_group(self.group.id), [])
+        self.assertEqual(rollups.verify_group(self.group.id), [])
+
+    def test_chunks_write_in_bulk(self):
+        from .importer import import_expenses
+        lines = [f'{i}.00,{self.users[i % 3].id},{self.category.id},{self.start.isoformat()},' for i in range(1, 26)]
+        with CaptureQueriesContext(connection) as queries:
+            report = import_expenses(self.group, self.users[0], self.csv(*lines), 'csv', chunk_size=10)
+        self.assertEqual(report['created'], 25, report)
+        # three chunks (10 + 10 + 5): one bulk insert of expenses and one of splits each, not one per row
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO')]
+        self.assertEqual(len([sql for sql in inserts if '"exp_bud_expense"' in sql.split('(')[0]]), 3)
+        self.assertEqual(len([sql for sql in inserts if '"exp_bud_expensesplit"' in sql.split('(')[0]]), 3)
+        self.assertEqual(ledger.verify_group(self.group.id), [])
+
+    def test_endpoint(self):
+        a = self.users[0].id
+        jsonl = BytesIO((json.dumps({'amount': '4.50', 'paid_by_id': a, 'category': self.category.name}) + '\n'
+                         + 'not json\n').encode())
+        response = self.client.post(self.url + '?type=jsonl', {'file': jsonl}, format='multipart')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual((response.data['created'], response.data['errors'][0]['row']), (1, 2))
+
+        self.assertEqual(self.client.post(self.url, {}, format='multipart').status_code, 400)
+        self.assertEqual(self.client.post(self.url + '?type=xml', {'file': self.csv()}, format='multipart').status_code, 400)
+        response = self.client.post(self.url + '?type=csv', {'file': self.csv(f'0,{a},{self.category.id},,')}, format='multipart')
+        self.assertEqual((response.status_code, response.data['created']), (400, 0))
+
+    def test_equal_split_matches_the_api(self):
+        # members joined in the reverse order of their user ids: the rounding cent must go to the same member either way
+        users = User.objects.bulk_create([User(username=f'import-order-{i}') for i in range(3)])
+        group = Group.objects.create(name='import-order', created_by=users[0])
+        Member.objects.bulk_create([Member(group=group, user=u) for u in reversed(users)])
+        category = Category.objects.create(group=group, name='food')
+        login(self.client, users[0])
+
+        from .importer import import_expenses
+        report = import_expenses(group, users[0], BytesIO(f'amount,paid_by_id,category_id\n10.00,{users[0].id},{category.id}\n'.encode()), 'csv')
+        self.assertEqual(report['created'], 1, report)
+        data = {'amount': '10.00', 'paid_by_id': users[0].id, 'category_id': category.id}
+        self.assertEqual(self.client.post(f'/api/groups/{group.id}/expenses/', data, format='json').status_code, 201)
+
+        imported, created = (dict(ExpenseSplit.objects.filter(expense=e).values_list('user_id', 'share'))
+                             for e in group.expenses.order_by('id'))
+        self.assertEqual(imported, created)
+        self.assertEqual(created[users[0].id], Decimal('3.34')) # joined last
+
+    def test_non_utf8_file_is_400(self):
+        upload = BytesIO(b'amount,paid_by_id,category_id\n\xff\xfe4.00,1,1\n')
+        response = self.client.post(self.url + '?type=csv', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['file'], 'The file must be UTF-8 encoded')
+        self.assertFalse(Expense.objects.filter(group=self.group).exists())
+
+
+class LedgerTests(ExpBudTestCase):
+    # MemberBalance (ledger.py): every write applies its deltas, rebuild_balances recomputes it from the raw rows
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.localtime().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        cls.group, cls.users = seed_group('ledger', members=3, expenses=0, settlements=0, start=cls.start)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        self.base = f'/api/groups/{self.group.id}'
+
+    def balances(self):
+        # user -> (paid, owed, sent, received) of the current month
+        rows = MemberBalance.objects.filter(group=self.group, year=self.start.year, month=self.start.month)
+        return {row.user_id: (row.paid, row.owed, row.sent, row.received) for row in rows}
+
+    def test_writes_update_the_ledger_incrementally(self):
+        a, b, c = (u.id for u in self.users)
+        category = self.group.categories.first()
+        expense = self.client.post(f'{self.base}/expenses/', {'amount': '90.00', 'paid_by_id': a, 'category_id': category.id},
+                                   format='json').data
+        d = Decimal
+        self.assertEqual(self.balances(), {a: (d('90.00'), d('30.00'), 0, 0), b: (0, d('30.00'), 0, 0), c: (0, d('30.00'), 0, 0)})
+
+        response = self.client.patch(f'{self.base}/expense/{expense["id"]}/', {'amount': '60.00', 'version': 1}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.balances(), {a: (d('60.00'), d('20.00'), 0, 0), b: (0, d('20.00'), 0, 0), c: (0, d('20.00'), 0, 0)})
+
+        self.client.post(f'{self.base}/settlements/', {'from_user': b, 'to_user': a, 'amount': '20.00'}, format='json')
+        self.assertEqual(self.balances()[a][3], d('20.00'))
+        self.assertEqual(self.balances()[b][2], d('20.00'))
+        self.assertEqual(self.client.get(f'{self.base}/summary/').data['balances'],
+                         [{'user_id': a, 'username': self.users[0].username, 'net': '20.00'},
+                          {'user_id': b, 'username': self.users[1].username, 'net': '0.00'},
+                          {'user_id': c, 'username': self.users[2].username, 'net': '-20.00'}])
+
+        self.assertEqual(self.client.delete(f'{self.base}/expense/{expense["id"]}/').status_code, 204)
+        self.assertEqual({uid: values[:2] for uid, values in self.balances().items()}, {a: (0, 0), b: (0, 0), c: (0, 0)})
+        self.assertEqual(ledger.verify_group(self.group.id), [])
+
+    def test_rebuild_command_finds_and_repairs_drift(self):
+        self.client.post(f'{self.base}/expenses/', {'amount': '12.00', 'paid_by_id': self.users[1].id,
+                                                    'category_id': self.group.categories.first().id}, format='json')
+        expected = self.balances()
+        MemberBalance.objects.filter(group=self.group, user=self.users[1]).update(paid=F('paid') + 5)
+        MemberBalance.objects.filter(group=self.group, user=self.users[2]).delete()
+
+        out = StringIO()
+        with self.assertRaisesMessage(CommandError, '1 group(s) have a ledger that does not match'):
+            call_command('rebuild_balances', verify=True, groups=[self.group.id], stdout=out)
+        self.assertIn(f'user {self.users[1].id}', out.getvalue())
+        self.assertIn(f'user {self.users[2].id}', out.getvalue())
+
+        out = StringIO()
+        call_command('rebuild_balances', groups=[self.group.id], stdout=out)
+        self.assertIn('1 group(s) verified', out.getvalue())
+        self.assertEqual(self.balances(), expected)
+
+
+class BalanceAggregateTests(ExpBudTestCase):
+    # ledger.raw_balances / compute_group_ledger sum in SQL; they must agree with the plain Python loops they replaced
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.localtime().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=100)
+        cls.group, cls.users = seed_group('aggregate', members=6, expenses=500, settlements=40, start=cls.start)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+
+    def python_balances(self, start, end):
+        # the old GroupSummaryView math, over model instances
+        net = {}
+        for e in Expense.objects.filter(group=self.group, spent_at__gte=start, spent_at__lt=end):
+            net[e.paid_by_id] = net.get(e.paid_by_id, Decimal('0.00')) + e.amount
+        for s in ExpenseSplit.objects.select_related('expense').filter(expense__group=self.group,
+                                                                       expense__spent_at__gte=start, expense__spent_at__lt=end):
+            net[s.user_id] = net.get(s.user_id, Decimal('0.00')) - s.share
+        for st in Settlement.objects.filter(group=self.group, settled_at__gte=start, settled_at__lt=end):
+            net[st.from_user_id] = net.get(st.from_user_id, Decimal('0.00')) + st.amount
+            net[st.to_user_id] = net.get(st.to_user_id, Decimal('0.00')) - st.amount
+        return net
+
+    def test_raw_balances_match_the_python_math_in_one_query(self):
+        for start, end in ((self.start, self.start + timedelta(days=9)),
+                           (self.start + timedelta(days=40), self.start + timedelta(days=75)),
+                           (self.start, self.start + timedelta(days=400))):
+            expected = self.python_balances(start, end)
+            with self.assertNumQueries(1): # every source UNION ALL'd into one round trip
+                balances = ledger.raw_balances(self.group.id, start, end)
+            self.assertEqual(dict(balances), expected)
+            self.assertEqual(sum(balances.values()), Decimal('0.00'))
+
+    def test_ledger_months_match_the_python_math(self):
+        month = self.start
+        for _ in range(4):
+            following = (month + timedelta(days=32)).replace(day=1)
+            expected = self.python_balances(month, following)
+            summary = self.client.get(f'/api/groups/{self.group.id}/summary/?year={month.year}&month={month.month}').data
+            self.assertEqual({row['user_id']: Decimal(row['net']) for row in summary['balances']},
+                             {u.id: expected.get(u.id, Decimal('0.00')) for u in self.users})
+            month = following
+
+
+class ExpenseSplitCreateTests(ExpBudTestCase):
+    # ExpenseSerializer.create: equal_shares() rounding, and every split written by a single INSERT
+    @classmethod
+    def setUpTestData(cls):
+        cls.group, cls.users = seed_group('splits', members=7, expenses=0, settlements=0, start=timezone.now())
+
+    def test_equal_shares_last_share_takes_the_remainder(self):
+        d = Decimal
+        self.assertEqual(equal_shares(d('100.00'), 3), [d('33.33'), d('33.33'), d('33.34')])
+        self.assertEqual(equal_shares(d('0.05'), 3), [d('0.02'), d('0.02'), d('0.01')])
+        self.assertEqual(equal_shares(d('20.00'), 4), [d('5.00')] * 4)
+        for amount, count in ((d('100.01'), 7), (d('0.01'), 3), (d('99999.99'), 13)):
+            self.assertEqual(sum(equal_shares(amount, count)), amount)
+
+    def test_splits_are_one_bulk_insert(self):
+        client = APIClient()
+        login(client, self.users[0])
+        data = {'amount': '100.00', 'paid_by_id': self.users[0].id, 'category_id': self.group.categories.first().id}
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(f'/api/groups/{self.group.id}/expenses/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        inserts = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "exp_bud_expensesplit"')]
+        self.assertEqual(len(inserts), 1)
+
+        shares = list(ExpenseSplit.objects.filter(expense_id=response.data['id']).order_by('user_id').values_list('user_id', 'share'))
+        last = max(u.id for u in self.users) # members in join order; the last one absorbs the remainder
+        self.assertEqual(shares, [(u.id, Decimal('14.29') if u.id != last else Decimal('14.26')) for u in self.users])
+
+
+class QueryPlanRegressionTests(ExpBudTestCase):
+    # Seeds a large local dataset, replays every hot read endpoint and runs EXPLAIN on each SQL statement it issued.
+    # A hot query falling back to a sequential scan on an exp_bud table fails the test.
+    # Raise EXP_BUD_PLAN_EXPENSES (e.g. 200000 on PostgreSQL) to test at production-like size.
+    @classmethod
+    def setUpTestData(cls):
+        size = int(os.environ.get('EXP_BUD_PLAN_EXPENSES', '4000'))
+        cls.start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=150)
+        cls.group, cls.users = seed_group('hot', members=60, expenses=size, settlements=size // 10, start=cls.start)
+        for i in range(20): # other groups so that "WHERE group = ?" is selective
+            seed_group(f'cold{i}', members=8, expenses=size // 20, settlements=10, start=cls.start)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE') # fresh statistics, otherwise the planner guesses table sizes
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+
+    def assertNoSequentialScans(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+        selects = [q['sql'] for q in ctx.captured_queries
+                   if q['sql'].lstrip().upper().startswith(('SELECT', '(SELECT')) and 'exp_bud_' in q['sql']]
+        self.assertTrue(selects, url)
+        for sql in selects:
+            self.assertEqual(full_scans(sql), [], f'{url}\n{sql}')
+        return response
+
+    def test_group_list(self):
+        self.assertNoSequentialScans('/api/groups/')
+
+    def test_group_detail(self):
+        self.assertNoSequentialScans(f'/api/groups/{self.group.id}/')
+
+    def test_category_list(self):
+        self.assertNoSequentialScans(f'/api/groups/{self.group.id}/categories/')
+
+    def test_expense_list_first_and_deep_page(self):
+        response = self.assertNoSequentialScans(f'/api/groups/{self.group.id}/expenses/')
+        for _ in range(3):
+            response = self.assertNoSequentialScans(response.json()['next'])
+
+    def test_expense_list_filtered(self):
+        category = self.group.categories.first()
+        self.assertNoSequentialScans(
+            f'/api/groups/{self.group.id}/expenses/?category={category.id}&start={self.start.date()}&min_amount=10')
+
+    def test_settlement_list(self):
+        self.assertNoSequentialScans(f'/api/groups/{self.group.id}/settlements/')
+
+    def test_summary_from_ledger(self):
+        self.assertNoSequentialScans(f'/api/groups/{self.group.id}/summary/?year={self.start.year}&month={self.start.month}')
+
+    def test_budget_status_from_rollup(self):
+        self.assertNoSequentialScans(f'/api/groups/{self.group.id}/budget/status/?year={self.start.year}&month={self.start.month}')
+
+    def test_year_report(self):
+        self.assertNoSequentialScans(f'/api/groups/{self.group.id}/report/?from={self.start.year - 1}-01&to={self.start.year}-12')
+
+    def test_summary_partial_month_from_raw_rows(self):
+        self.assertNoSequentialScans(f'/api/groups/{self.group.id}/summary/?year={self.start.year}&month={self.start.month}&day=10')
+
+    def test_no_duplicate_split_indexes(self):
+        # every index is written on every split insert: one leading with expense is enough (split_expense_cover_idx)
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'exp_bud_expensesplit')
+        plain = [name for name, c in constraints.items() if c['index'] and not c['unique'] and c['columns'][:1] == ['expense_id']]
+        self.assertEqual(plain, ['split_expense_cover_idx'])
+
+
+class GroupContextQueryCountTests(ExpBudTestCase):
+    # GroupContext loads the group and its member ids once per request; the permission, the view and
+    # ExpenseSerializer all reuse them, so the number of queries does not depend on the size of the group.
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        cls.small, cls.small_users = seed_group('small', members=3, expenses=5, settlements=2, start=start)
+        cls.large, cls.large_users = seed_group('large', members=40, expenses=5, settlements=2, start=start)
+
+    def post_expense(self, group, users, queries, **extra):
+        client = APIClient()
+        login(client, users[0])
+        data = {'amount': '100.01', 'paid_by_id': users[1].id, 'category_id': group.categories.first().id, **extra}
+        with self.assertNumQueries(queries):
+            response = client.post(f'/api/groups/{group.id}/expenses/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response
+
+    def test_create_expense_equal_split(self):
+        # group, members, categories, savepoint, insert expense, bump data_version, bulk insert splits,
+        # ledger (lock group, insert missing, lock, 3 updates), rollup (lock group, insert missing, lock, update),
+        # release savepoint, response: splits joined with their users, category name, payer name
+        self.post_expense(self.small, self.small_users, 21)
+        response = self.post_expense(self.large, self.large_users, 21)
+        self.assertEqual(len(response.data['splits']), 40)
+        self.assertEqual(sum(Decimal(s['share']) for s in response.data['splits']), Decimal('100.01'))
+
+    def test_create_expense_with_split_items(self):
+        users = self.large_users
+        items = [{'user_id': u.id, 'share': '2.50'} for u in users[:-1]] + [{'user_id': users[-1].id, 'share': '2.51'}]
+        response = self.post_expense(self.large, users, 21, split_items=items)
+        self.assertEqual(len(response.data['splits']), 40)
+
+    def test_create_settlement(self):
+        client = APIClient()
+        login(client, self.large_users[0])
+        # group, members, from_user, to_user, savepoint, insert, bump data_version,
+        # ledger (lock group, insert missing, lock, 2 updates), release
+        with self.assertNumQueries(13):
+            response = client.post(f'/api/groups/{self.large.id}/settlements/',
+                                   {'from_user': self.large_users[1].id, 'to_user': self.large_users[2].id, 'amount': '5.00'},
+                                   format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_invalid_payer_and_category(self):
+        client = APIClient()
+        login(client, self.small_users[0])
+        data = {'amount': '10.00', 'paid_by_id': self.large_users[1].id, 'category_id': self.large.categories.first().id}
+        with self.assertNumQueries(2): # group, members; the payer check fails before categories are needed
+            response = client.post(f'/api/groups/{self.small.id}/expenses/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('paid_by_id', response.data)
+
+    def test_non_member_gets_404_and_anonymous_gets_401(self):
+        client = APIClient()
+        login(client, self.small_users[0])
+        self.assertEqual(client.get(f'/api/groups/{self.large.id}/expenses/').status_code, 404)
+        self.assertEqual(APIClient().get(f'/api/groups/{self.large.id}/expenses/').status_code, 401)
+
+
+class GroupCacheTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        cls.group, cls.users = seed_group('cached', members=3, expenses=2, settlements=0, start=start)
+        cls.outsider = User.objects.create_user('outsider', password='x')
+
+    def setUp(self):
+        super().setUp()
+        self.creator = APIClient()
+        login(self.creator, self.users[0])
+        self.other = APIClient()
+        login(self.other, self.outsider)
+
+    def test_second_request_reads_members_from_cache(self):
+        url = f'/api/groups/{self.group.id}/categories/'
+        self.assertEqual(self.creator.get(url).status_code, 200)
+        with self.assertNumQueries(1): # group only; membership and the categories response come from the caches
+            self.assertEqual(self.creator.get(url).status_code, 200)
+        self.assertGreaterEqual(group_cache.stats()['hits'], 1)
+
+    def test_add_member_takes_effect_immediately(self):
+        url = f'/api/groups/{self.group.id}/categories/'
+        self.assertEqual(self.other.get(url).status_code, 404) # caches the member set without the outsider
+        response = self.creator.post(f'/api/groups/{self.group.id}/add-member/', {'username': 'outsider'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.other.get(url).status_code, 200)
+
+    def test_remove_member_takes_effect_immediately(self):
+        member = self.users[2]
+        client = APIClient()
+        login(client, member)
+        url = f'/api/groups/{self.group.id}/categories/'
+        self.assertEqual(client.get(url).status_code, 200) # caches the member set with the member
+        response = self.creator.delete(f'/api/groups/{self.group.id}/remove-member/{member.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(client.get(url).status_code, 404)
+
+    def test_new_category_is_accepted_immediately(self):
+        expenses = f'/api/groups/{self.group.id}/expenses/'
+        self.assertEqual(self.creator.get(expenses).status_code, 200)
+        category = self.creator.post(f'/api/groups/{self.group.id}/categories/', {'name': 'new'}, format='json').data
+        response = self.creator.post(expenses, {'amount': '9.00', 'paid_by_id': self.users[0].id, 'category_id': category['id']}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_lru_eviction_and_ttl(self):
+        lru = LRUCache(max_size=2, ttl=60)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a') # a is now most recently used
+        lru.set('c', 3) # evicts b
+        self.assertIs(lru.get('b'), MISSING)
+        self.assertEqual((lru.get('a'), lru.get('c')), (1, 3))
+
+        expired = LRUCache(max_size=2, ttl=-1)
+        expired.set('a', 1)
+        self.assertIs(expired.get('a'), MISSING)
+
+
+class MonthlySpendRollupTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=90)
+        cls.group, cls.users = seed_group('rollup', members=4, expenses=300, settlements=5, start=cls.start)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        self.categories = list(self.group.categories.order_by('id'))
+
+    def test_seeded_rollup_matches_raw_expenses(self):
+        self.assertEqual(rollups.verify_group(self.group.id), [])
+
+    def test_create_update_delete_keep_rollup_in_sync(self):
+        url = f'/api/groups/{self.group.id}/expenses/'
+        data = {'amount': '42.10', 'paid_by_id': self.users[1].id, 'category_id': self.categories[0].id,
+                'spent_at': self.start.isoformat()}
+        expense_id = self.client.post(url, data, format='json').data['id']
+        self.assertEqual(rollups.verify_group(self.group.id), [])
+
+        # move it to another category and month
+        data.update(amount='7.05', category_id=self.categories[1].id, spent_at=(self.start + timedelta(days=40)).isoformat(), version=1)
+        response = self.client.put(f'/api/groups/{self.group.id}/expense/{expense_id}/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(rollups.verify_group(self.group.id), [])
+
+        self.assertEqual(self.client.delete(f'/api/groups/{self.group.id}/expense/{expense_id}/').status_code, 204)
+        self.assertEqual(rollups.verify_group(self.group.id), [])
+
+    def test_summary_and_budget_status_read_the_rollup(self):
+        year, month = self.start.year, self.start.month
+        expected = Expense.objects.filter(group=self.group, spent_at__gte=self.start,
+                                          spent_at__lt=(self.start + timedelta(days=32)).replace(day=1)).aggregate(t=Sum('amount'))['t']
+        expected = Decimal(expected).quantize(Decimal('0.01'))
+
+        summary = self.client.get(f'/api/groups/{self.group.id}/summary/?year={year}&month={month}').data
+        self.assertEqual(Decimal(summary['total_spent']), expected)
+
+        with self.assertNumQueries(3): # group, rollup rows, budget (members are cached by the summary request)
+            status = self.client.get(f'/api/groups/{self.group.id}/budget/status/?year={year}&month={month}').data
+        self.assertEqual(Decimal(status['total_spent']), expected)
+        self.assertEqual(Decimal(status['remaining']), Decimal('5000.00') - expected)
+        self.assertEqual(sum(Decimal(c['spent']) for c in status['categories']), expected)
+        self.assertEqual(sum(c['count'] for c in status['categories']),
+                         Expense.objects.filter(group=self.group, spent_at__gte=self.start,
+                                                spent_at__lt=(self.start + timedelta(days=32)).replace(day=1)).count())
+
+    def test_import_updates_rollup(self):
+        from .importer import import_expenses
+        csv = ''.join(f'{i}.25,{self.users[i % 4].id},{self.categories[i % 5].id},{self.start.isoformat()}\n' for i in range(1, 30))
+        report = import_expenses(self.group, self.users[0], BytesIO(('amount,paid_by_id,category_id,spent_at\n' + csv).encode()), 'csv', chunk_size=7)
+        self.assertEqual(report['created'], 29, report)
+        self.assertEqual(rollups.verify_group(self.group.id), [])
+
+
+class GroupReportTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.localtime().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=150)
+        cls.group, cls.users = seed_group('report', members=5, expenses=400, settlements=5, start=cls.start)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        self.url = f'/api/groups/{self.group.id}/report/?from={self.start.year - 1}-06&to={self.start.year + 1}-05'
+
+    def test_report_matches_raw_rows_in_constant_queries(self):
+        self.client.get(self.url) # warm the member cache
+        with self.assertNumQueries(4): # group, spend by category, paid by payer, budgets
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['months']), 24)
+
+        expenses = Expense.objects.filter(group=self.group)
+        total = Decimal(expenses.aggregate(t=Sum('amount'))['t']).quantize(Decimal('0.01'))
+        self.assertEqual(Decimal(data['total_spent']), total)
+        self.assertEqual(sum(Decimal(c['spent']) for c in data['by_category']), total)
+        self.assertEqual(sum(Decimal(p['paid']) for p in data['by_payer']), total)
+        self.assertEqual(data['total_budget'], '5000.00')
+        start_month = next(m for m in data['months'] if (m['year'], m['month']) == (self.start.year, self.start.month))
+        self.assertEqual(Decimal(start_month['remaining']), Decimal('5000.00') - Decimal(start_month['spent']))
+
+    def test_etag_answers_304_until_data_changes(self):
+        first = self.client.get(self.url)
+        etag = first['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.post(f'/api/groups/{self.group.id}/expenses/',
+                         {'amount': '3.00', 'paid_by_id': self.users[0].id, 'category_id': self.group.categories.first().id,
+                          'spent_at': self.start.isoformat()}, format='json')
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_invalid_range(self):
+        base = f'/api/groups/{self.group.id}/report/'
+        self.assertEqual(self.client.get(base + '?from=2024-13').status_code, 400)
+        self.assertEqual(self.client.get(base + '?from=2024-05&to=2024-01').status_code, 400)
+        self.assertEqual(self.client.get(base + '?from=2000-01&to=2024-01').status_code, 400)
+
+
+class GroupExportTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(microsecond=0) - timedelta(days=100)
+        cls.group, cls.users = seed_group('export', members=4, expenses=3000, settlements=40, start=cls.start)
+        cls.outsider = User.objects.create_user('export-outsider', password='x')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        self.url = f'/api/groups/{self.group.id}/export/'
+
+    def download(self, query):
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_has_every_row_in_several_pieces(self):
+        response = self.client.get(self.url + '?table=splits')
+        pieces = list(response.streaming_content)
+        self.assertGreater(len(pieces), 1) # streamed, not built in one string
+        lines = b''.join(pieces).decode().splitlines()
+        self.assertEqual(lines[0], 'id,expense_id,spent_at,user_id,username,share')
+        self.assertEqual(len(lines) - 1, ExpenseSplit.objects.filter(expense__group=self.group).count())
+        self.assertIn('attachment; filename="group-', response['Content-Disposition'])
+
+    def test_jsonl_matches_the_database(self):
+        _, body = self.download('?table=expenses&type=jsonl')
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        expenses = Expense.objects.filter(group=self.group)
+        self.assertEqual(len(rows), expenses.count())
+        self.assertEqual(sum(Decimal(row['amount']) for row in rows), Decimal(expenses.aggregate(t=Sum('amount'))['t']).quantize(Decimal('0.01')))
+        self.assertEqual([row['id'] for row in rows], list(expenses.order_by('spent_at', 'id').values_list('id', flat=True)))
+
+    def test_gzip_is_the_same_file_compressed(self):
+        plain = self.download('?table=settlements')[1]
+        response, body = self.download('?table=settlements&gzip=1')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(gzip.decompress(body), plain)
+        self.assertEqual(len(plain.decode().splitlines()), 41)
+
+    def test_rows_come_from_a_chunked_iterator(self):
+        with mock.patch('django.db.models.query.QuerySet.iterator', autospec=True,
+                        side_effect=lambda qs, chunk_size=None: iter(qs)) as iterator:
+            self.download('')
+        self.assertEqual(iterator.call_args.kwargs['chunk_size'], 2000)
+
+    def test_bad_params_and_non_members(self):
+        self.assertEqual(self.client.get(self.url + '?table=users').status_code, 400)
+        self.assertEqual(self.client.get(self.url + '?type=xml').status_code, 400)
+        login(self.client, self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ConditionalGetTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        cls.group, cls.users = seed_group('etag', members=4, expenses=60, settlements=4, start=cls.start)
+        cls.newcomer = User.objects.create_user('etag-newcomer', password='x')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        self.summary = f'/api/groups/{self.group.id}/summary/?year={self.start.year}&month={self.start.month}'
+        self.categories = f'/api/groups/{self.group.id}/categories/'
+
+    def version(self):
+        return Group.objects.values_list('data_version', flat=True).get(id=self.group.id)
+
+    def test_unchanged_data_answers_304_from_the_group_row_only(self):
+        for url in (self.summary, self.categories):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            with self.assertNumQueries(1): # the group row (membership from the group cache); no expense tables
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(response.status_code, 304)
+            with self.assertNumQueries(1): # without If-None-Match: the cached response
+                self.assertEqual(self.client.get(url).json(), first.json())
+
+    def test_every_kind_of_write_bumps_the_version(self):
+        base = f'/api/groups/{self.group.id}'
+        category = self.group.categories.first()
+        expense = self.client.post(f'{base}/expenses/', {'amount': '9.00', 'paid_by_id': self.users[1].id,
+                                                         'category_id': category.id}, format='json').data
+        writes = [
+            lambda: self.client.patch(f'{base}/expense/{expense["id"]}/', {'amount': '12.00', 'version': 1}, format='json'),
+            lambda: self.client.delete(f'{base}/expense/{expense["id"]}/'),
+            lambda: self.client.post(f'{base}/settlements/', {'from_user': self.users[1].id, 'to_user': self.users[2].id,
+                                                              'amount': '1.00'}, format='json'),
+            lambda: self.client.post(f'{base}/settle-up/'),
+            lambda: self.client.post(f'{base}/budget/', {'year': self.start.year, 'month': self.start.month, 'limit': '10.00'}, format='json'),
+            lambda: self.client.post(f'{base}/categories/', {'name': 'new'}, format='json'),
+            lambda: self.client.post(f'{base}/add-member/', {'username': self.newcomer.username}, format='json'),
+            lambda: self.client.post(f'{base}/expenses/import/?type=csv', {'file': BytesIO(
+                f'amount,paid_by_id,category_id\n4.00,{self.users[0].id},{category.id}\n'.encode())}, format='multipart'),
+        ]
+        for write in writes:
+            before = self.version()
+            response = write()
+            self.assertLess(response.status_code, 300, getattr(response, "data", None))
+            self.assertGreater(self.version(), before)
+
+    def test_a_write_changes_the_etag_and_the_cached_data(self):
+        first = self.client.get(self.summary)
+        self.client.post(f'/api/groups/{self.group.id}/expenses/',
+                         {'amount': '5.00', 'paid_by_id': self.users[0].id, 'category_id': self.group.categories.first().id,
+                          'spent_at': self.start.isoformat()}, format='json')
+        second = self.client.get(self.summary, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertEqual(Decimal(second.data['total_spent']) - Decimal(first.data['total_spent']), Decimal('5.00'))
+
+    def test_saving_a_stale_group_instance_keeps_the_version(self):
+        stale = Group.objects.get(id=self.group.id)
+        Category.objects.create(group=self.group, name='bump')
+        current = self.version()
+        stale.name = 'renamed'
+        stale.save()
+        self.assertEqual(self.version(), current + 1) # the rename bumps; the old data_version is not written back
+
+    async def test_async_summary_uses_the_same_etag(self):
+        response = await sync_to_async(self.client.get)(self.summary)
+        auth = {'Authorization': f'Bearer {RefreshToken.for_user(self.users[0]).access_token}',
+                'If-None-Match': response['ETag']}
+        async_response = await async_views.group_summary(AsyncRequestFactory().get(self.summary, headers=auth), group_id=self.group.id)
+        self.assertEqual(async_response.status_code, 304)
+
+
+class SettleUpTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=60)
+        cls.group, cls.users = seed_group('settle', members=12, expenses=200, settlements=10, start=start)
+
+    def test_planner_settles_everyone_exactly(self):
+        balances = {1: Decimal('30.00'), 2: Decimal('-10.00'), 3: Decimal('-20.00'), 4: Decimal('0.00')}
+        self.assertEqual(settleup.plan_transfers(balances), [(3, 1, Decimal('20.00')), (2, 1, Decimal('10.00'))])
+
+        rnd = random.Random(7)
+        balances = {uid: Decimal(rnd.randint(-100000, 100000)) / 100 for uid in range(1, 500)}
+        balances[500] = -sum(balances.values())
+        transfers = settleup.plan_transfers(balances)
+        self.assertEqual(settleup.unsettled(balances, transfers), {})
+        self.assertLessEqual(len(transfers), 499)
+        self.assertTrue(all(amount > 0 for _, _, amount in transfers))
+
+    def test_commit_plan_zeroes_balances(self):
+        client = APIClient()
+        login(client, self.users[0])
+        url = f'/api/groups/{self.group.id}/settle-up/'
+        plan = client.get(url).json()
+        self.assertGreater(plan['count'], 0)
+        self.assertLessEqual(plan['count'], 11)
+
+        response = client.post(url)
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['transfers'], plan['transfers'])
+        self.assertEqual(Settlement.objects.filter(id__in=response.data['settlement_ids']).count(), plan['count'])
+        self.assertEqual(settleup.group_balances(self.group.id), {})
+        self.assertEqual(ledger.verify_group(self.group.id), [])
+        self.assertEqual(client.get(url).json()['count'], 0)
+
+    def test_commit_locks_the_group_before_the_ledger(self):
+        # same lock order as every other writer (group, then ledger rows), so a settle-up running next to an expense
+        # write waits instead of deadlocking on PostgreSQL
+        with transaction.atomic(), CaptureQueriesContext(connection) as queries:
+            settleup.commit_plan(self.group.id)
+        self.assertIn('FROM "exp_bud_group"', queries.captured_queries[0]['sql'])
+        self.assertNotIn('exp_bud_memberbalance', queries.captured_queries[0]['sql'])
+
+    def test_only_creator_commits(self):
+        client = APIClient()
+        login(client, self.users[1])
+        url = f'/api/groups/{self.group.id}/settle-up/'
+        self.assertEqual(client.get(url + '?year=2020&month=1').json()['count'], 0)
+        self.assertEqual(client.post(url).status_code, 403)
+
+
+class SplitSpentAtTests(ExpBudTestCase):
+    # ExpenseSplit.spent_at is the partition key of the split table: it must always equal its expense's spent_at
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=70)
+        cls.group, cls.users = seed_group('partition', members=4, expenses=40, settlements=0, start=cls.start)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+
+    def assertSplitsFollowExpenses(self):
+        self.assertFalse(ExpenseSplit.objects.filter(expense__group=self.group).exclude(spent_at=F('expense__spent_at')).exists())
+
+    def test_create_import_and_move(self):
+        self.assertSplitsFollowExpenses() # bulk_create in seed_group
+        category = self.group.categories.first()
+        expense = self.client.post(f'/api/groups/{self.group.id}/expenses/',
+                                   {'amount': '12.00', 'paid_by_id': self.users[0].id, 'category_id': category.id,
+                                    'spent_at': self.start.isoformat()}, format='json').data
+        self.client.post(f'/api/groups/{self.group.id}/expenses/import/?type=csv', {'file': BytesIO(
+            f'amount,paid_by_id,category_id,spent_at\n4.00,{self.users[0].id},{category.id},2021-03-04T10:00:00Z\n'.encode())},
+            format='multipart')
+        self.assertSplitsFollowExpenses()
+
+        moved = (self.start + timedelta(days=45)).isoformat()
+        response = self.client.patch(f'/api/groups/{self.group.id}/expense/{expense["id"]}/', {'spent_at': moved, 'version': 1}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertSplitsFollowExpenses()
+        self.assertEqual(ledger.verify_group(self.group.id), [])
+
+    def test_partitioning_is_a_no_op_outside_postgresql(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('checks the fallback of the other backends')
+        self.assertEqual(partitions.ensure(connection), [])
+        self.assertEqual(partitions.convert(connection), [])
+        out = StringIO()
+        call_command('partitions', '--convert', stdout=out)
+        self.assertIn('nothing to do', out.getvalue())
+
+    def test_splits_keep_their_foreign_key_unless_partitioned(self):
+        with connection.cursor() as cursor:
+            if partitions.supported(connection) and partitions.is_partitioned(cursor, 'exp_bud_expense'):
+                self.skipTest('a partitioned expense table has no foreign key pointing at it')
+            constraints = connection.introspection.get_constraints(cursor, 'exp_bud_expensesplit')
+        self.assertIn(('exp_bud_expense', 'id'), [c['foreign_key'] for c in constraints.values()])
+
+    def test_month_partitions(self):
+        self.assertEqual(partitions.add_months(2024, 11, 3), (2025, 2))
+        start, end = partitions.month_bounds(2024, 12)
+        self.assertEqual((start.isoformat(), end.isoformat()), ('2024-12-01T00:00:00+00:00', '2025-01-01T00:00:00+00:00'))
+        self.assertEqual(partitions.partition_name('exp_bud_expense', 2025, 3), 'exp_bud_expense_p202503')
+
+
+class BulkSettlementTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        cls.group, cls.users = seed_group('bulk-settle', members=8, expenses=30, settlements=0, start=start)
+        cls.outsider = User.objects.create_user('bulk-outsider', password='x')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        self.url = f'/api/groups/{self.group.id}/settlements/bulk/'
+
+    def items(self, count):
+        return [{'from_user': self.users[i % 8].id, 'to_user': self.users[(i + 1) % 8].id, 'amount': f'{i + 1}.00'}
+                for i in range(count)]
+
+    def test_creates_all_rows_in_constant_queries(self):
+        # group, members, savepoint, one insert, ledger (lock group, insert missing, lock, one update per member touched),
+        # bump, release: 3 items touch 4 members; 60 items touch all 8 (the member set is cached by then)
+        for count, queries in ((3, 13), (60, 16)):
+            with self.assertNumQueries(queries):
+                response = self.client.post(self.url, self.items(count), format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(response.data['count'], count)
+            created = dict(Settlement.objects.filter(id__in=response.data['ids']).values_list('id', 'amount'))
+            self.assertEqual([created[i] for i in response.data['ids']], [Decimal(f'{i + 1}.00') for i in range(count)])
+        self.assertEqual(ledger.verify_group(self.group.id), [])
+
+    def test_one_bad_item_rejects_the_whole_batch(self):
+        items = self.items(5)
+        items[3]['to_user'] = self.outsider.id
+        response = self.client.post(self.url, items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[3], {'to_user': 'Not a group member'})
+        self.assertEqual(response.data[0], {})
+        self.assertFalse(Settlement.objects.filter(group=self.group).exists())
+
+    def test_invalid_payloads(self):
+        self.assertEqual(self.client.post(self.url, [], format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, self.items(501), format='json').status_code, 400)
+        self.assertEqual(self.client.post(self.url, [{'from_user': self.users[0].id, 'to_user': self.users[1].id,
+                                                      'amount': '0.00'}], format='json').status_code, 400)
+
+
+class ExpenseUpdateTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        cls.group, cls.users = seed_group('edit', members=6, expenses=20, settlements=2, start=start)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        items = [{'user_id': u.id, 'share': '10.00'} for u in self.users[:3]]
+        self.expense = self.client.post(f'/api/groups/{self.group.id}/expenses/',
+                                         {'amount': '30.00', 'paid_by_id': self.users[0].id,
+                                          'category_id': self.group.categories.first().id, 'split_items': items},
+                                         format='json').data
+        self.url = f'/api/groups/{self.group.id}/expense/{self.expense["id"]}/'
+
+    def assertDerivedDataInSync(self):
+        self.assertEqual(ledger.verify_group(self.group.id), [])
+        self.assertEqual(rollups.verify_group(self.group.id), [])
+
+    def shares(self):
+        return dict(ExpenseSplit.objects.filter(expense_id=self.expense['id']).values_list('user_id', 'share'))
+
+    def test_amount_change_resplits_existing_participants(self):
+        response = self.client.patch(self.url, {'amount': '45.00', 'version': 1}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['version'], 2)
+        self.assertEqual(self.shares(), {u.id: Decimal('15.00') for u in self.users[:3]})
+        self.assertDerivedDataInSync()
+
+    def test_split_items_are_diffed(self):
+        before = dict(ExpenseSplit.objects.filter(expense_id=self.expense['id']).values_list('user_id', 'id'))
+        # users[0] unchanged, users[1] changed, users[2] removed, users[3] added
+        items = [{'user_id': self.users[0].id, 'share': '10.00'}, {'user_id': self.users[1].id, 'share': '5.00'},
+                 {'user_id': self.users[3].id, 'share': '15.00'}]
+        response = self.client.patch(self.url, {'split_items': items, 'version': 1}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.shares(), {self.users[0].id: Decimal('10.00'), self.users[1].id: Decimal('5.00'),
+                                         self.users[3].id: Decimal('15.00')})
+        after = dict(ExpenseSplit.objects.filter(expense_id=self.expense['id']).values_list('user_id', 'id'))
+        self.assertEqual(after[self.users[0].id], before[self.users[0].id]) # untouched rows keep their id
+        self.assertEqual(after[self.users[1].id], before[self.users[1].id])
+        self.assertEqual(len(response.data['splits']), 3)
+        self.assertDerivedDataInSync()
+
+    def test_move_to_other_category_and_payer(self):
+        category = self.group.categories.order_by('-id').first()
+        response = self.client.patch(self.url, {'category_id': category.id, 'paid_by_id': self.users[2].id}, format='json',
+                                     HTTP_IF_MATCH='"1"')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['category_name'], category.name)
+        self.assertDerivedDataInSync()
+
+    def test_stale_version_gets_409(self):
+        self.assertEqual(self.client.patch(self.url, {'description': 'first', 'version': 1}, format='json').status_code, 200)
+        response = self.client.patch(self.url, {'description': 'second', 'version': 1}, format='json')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Expense.objects.get(id=self.expense['id']).description, 'first')
+
+    def test_update_without_a_version_gets_428(self):
+        for method in (self.client.patch, self.client.put):
+            response = method(self.url, {'description': 'blind write', 'amount': '30.00', 'paid_by_id': self.users[0].id}, format='json')
+            self.assertEqual(response.status_code, 428, response.data)
+        self.assertEqual(self.client.patch(self.url, {'description': 'x'}, format='json', HTTP_IF_MATCH='*').status_code, 400)
+        self.assertEqual(self.client.patch(self.url, {'description': 'x', 'version': 1}, format='json', HTTP_IF_MATCH='"2"').status_code, 400)
+        self.assertEqual(self.client.patch(self.url, {'description': 'x'}, format='json', HTTP_IF_MATCH='"2"').status_code, 409)
+        self.assertEqual(self.client.patch(self.url, {'description': 'x'}, format='json', HTTP_IF_MATCH='W/"1"').status_code, 200)
+        self.assertEqual(Expense.objects.get(id=self.expense['id']).version, 2)
+
+    def test_concurrent_write_between_read_and_update_gets_409(self):
+        # another request bumps the version after this one loaded the row: the conditional UPDATE matches nothing
+        from .serializers import ExpenseSerializer
+        from .context import GroupContext
+        expense = Expense.objects.prefetch_related('splits').get(id=self.expense['id'])
+        serializer = ExpenseSerializer(expense, data={'amount': '60.00', 'version': 1}, partial=True,
+                                       context={'group': self.group, 'group_ctx': GroupContext(self.group)})
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        Expense.objects.filter(id=expense.id).update(version=F('version') + 1)
+        with self.assertRaises(Conflict):
+            serializer.save()
+        self.assertEqual(self.shares(), {u.id: Decimal('10.00') for u in self.users[:3]})
+        self.assertDerivedDataInSync()
+
+    def test_split_items_must_match_amount_and_be_unique(self):
+        items = [{'user_id': self.users[0].id, 'share': '20.00'}, {'user_id': self.users[0].id, 'share': '10.00'}]
+        self.assertEqual(self.client.patch(self.url, {'split_items': items, 'version': 1}, format='json').status_code, 400)
+        items = [{'user_id': self.users[0].id, 'share': '20.00'}]
+        self.assertEqual(self.client.patch(self.url, {'split_items': items, 'version': 1}, format='json').status_code, 400)
+
+
+class FastReadParityTests(ExpBudTestCase):
+    # the fastread path must render exactly the same bytes as the DRF serializers it replaces
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30)
+        cls.group, cls.users = seed_group('parity', members=6, expenses=120, settlements=3, start=start)
+        Expense.objects.filter(id=Expense.objects.filter(group=cls.group).first().id).update(description='naïve "quotes" ✓')
+        for i in range(3):
+            other = Group.objects.create(name=f'other{i}', created_by=cls.users[i])
+            Member.objects.create(group=other, user=cls.users[0])
+            Category.objects.create(group=other, name='x')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+
+    def assertSameBytes(self, view, url):
+        fast = self.client.get(url)
+        with mock.patch.object(view, 'fast_read', False):
+            slow = self.client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+        return fast
+
+    def test_expense_list_pages(self):
+        url = f'/api/groups/{self.group.id}/expenses/?page_size=40'
+        while url:
+            url = self.assertSameBytes(ExpenseListCreateView, url).json()['next']
+
+    def test_expense_list_filtered_and_empty(self):
+        self.assertSameBytes(ExpenseListCreateView, f'/api/groups/{self.group.id}/expenses/?min_amount=250')
+        self.assertSameBytes(ExpenseListCreateView, f'/api/groups/{self.group.id}/expenses/?min_amount=999999')
+
+    def test_group_list(self):
+        response = self.assertSameBytes(GroupListCreateView, '/api/groups/')
+        self.assertEqual(len(response.json()), 4)
+
+
+class GroupEndpointQueryCountTests(ExpBudTestCase):
+    # the group list / detail cost the same number of queries for a user in 1 or 1,000 groups
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = {}
+        for size in (1, 100, 1000):
+            owner, friend = User.objects.bulk_create([User(username=f'in{size}-a'), User(username=f'in{size}-b')])
+            groups = Group.objects.bulk_create([Group(name=f'g{size}-{i}', created_by=owner if i % 2 else friend)
+                                                for i in range(size)])
+            Member.objects.bulk_create([Member(group=g, user=u) for g in groups for u in (owner, friend)])
+            Category.objects.bulk_create([Category(group=g, name=n) for g in groups for n in ('food', 'rent')])
+            cls.users[size] = owner
+
+    def get(self, size, url, queries, fast=True):
+        client = APIClient()
+        login(client, self.users[size])
+        with mock.patch.object(GroupListCreateView, 'fast_read', fast), self.assertNumQueries(queries):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_list(self):
+        for size in (1, 100, 1000):
+            for fast in (True, False):
+                # groups (+ created_by), categories, members
+                groups = self.get(size, '/api/groups/', 3, fast)
+                self.assertEqual(len(groups), size)
+                self.assertEqual(len(groups[-1]['members_info']), 2)
+                self.assertEqual(len(groups[-1]['categories']), 2)
+
+    def test_detail(self):
+        for size in (1, 100, 1000):
+            group_id = Group.objects.filter(members=self.users[size]).order_by('-id').first().id
+            group = self.get(size, f'/api/groups/{group_id}/', 3)
+            self.assertEqual([c['name'] for c in group['categories']], ['food', 'rent'])
+
+    def test_sparse_fields_skip_nested_queries(self):
+        for fast in (True, False):
+            groups = self.get(100, '/api/groups/?fields=name,id', 1, fast)
+            self.assertEqual(list(groups[0]), ['id', 'name'])
+            groups = self.get(100, '/api/groups/?fields=id,categories', 2, fast)
+            self.assertEqual(list(groups[0]), ['id', 'categories'])
+        group_id = Group.objects.filter(members=self.users[1]).first().id
+        self.assertEqual(self.get(1, f'/api/groups/{group_id}/?fields=id,members_info', 2),
+                         {'id': group_id, 'members_info': self.get(1, f'/api/groups/{group_id}/', 3)['members_info']})
+
+    def test_unknown_field_is_rejected(self):
+        client = APIClient()
+        login(client, self.users[1])
+        self.assertEqual(client.get('/api/groups/?fields=id,password').status_code, 400)
+        # authentication comes first: an anonymous request is 401 whatever it asks for
+        self.assertEqual(APIClient().get('/api/groups/?fields=id,password').status_code, 401)
+        self.assertEqual(APIClient().get(f'/api/groups/{self.users[1].id}/?fields=nope').status_code, 401)
+
+
+class MetricsMiddlewareTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        cls.group, cls.users = seed_group('metrics', members=3, expenses=10, settlements=1, start=start)
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.clear()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+
+    def test_records_per_endpoint_histograms(self):
+        url = f'/api/groups/{self.group.id}/expenses/'
+        with self.assertNumQueries(4): # group, members, expenses, splits
+            self.client.get(url)
+        with self.assertNumQueries(3): # members come from the group cache
+            self.client.get(url)
+        counts, total, count = metrics.registry.snapshot('exp_bud_request_queries', 'expense-list-create', 'GET')
+        self.assertEqual((count, total, sum(counts)), (2, 7, 2))
+        latency = metrics.registry.snapshot('exp_bud_request_latency_seconds', 'expense-list-create', 'GET')
+        render = metrics.registry.snapshot('exp_bud_request_render_seconds', 'expense-list-create', 'GET')
+        self.assertGreater(latency[1], 0)
+        self.assertGreater(render[1], 0)
+        self.assertLess(render[1], latency[1])
+
+    @override_settings(EXP_BUD_METRICS={'QUERY_BUDGET': 2})
+    def test_query_budget_warning_logs_sql(self):
+        with self.assertLogs('exp_bud.metrics', 'WARNING') as logs:
+            self.client.get(f'/api/groups/{self.group.id}/expenses/')
+        self.assertIn('budget 2', logs.output[0])
+        self.assertIn('FROM "exp_bud_expense"', logs.output[0])
+
+    @override_settings(EXP_BUD_METRICS={'TOKEN': 'secret'})
+    def test_metrics_endpoint(self):
+        self.client.get(f'/api/groups/{self.group.id}/summary/')
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('# TYPE exp_bud_request_latency_seconds histogram', body)
+        self.assertIn('exp_bud_request_queries_count{endpoint="group-summary",method="GET"} 1', body)
+        self.assertIn('exp_bud_request_queries_bucket{endpoint="group-summary",method="GET",le="+Inf"} 1', body)
+        self.assertIn('exp_bud_group_cache_misses_total', body)
+
+
+class BenchmarkCommandTests(ExpBudTestCase):
+    def test_seed_data_then_bench_views(self):
+        out = StringIO()
+        call_command('seed_data', users=12, groups=2, members=5, months=3, expenses=10, splits=3, settlements=2, prefix='t', stdout=out)
+        self.assertEqual(Expense.objects.count(), 2 * 3 * 10)
+        for group in Group.objects.all():
+            self.assertEqual(ledger.verify_group(group.id), [])
+            self.assertEqual(rollups.verify_group(group.id), [])
+
+        path = os.path.join(self.tmp_dir(), 'bench.json')
+        call_command('bench_views', requests=3, warmup=1, output=path, stderr=StringIO())
+        with open(path) as fh:
+            report = json.load(fh)
+        self.assertEqual(report['group']['expenses'], 30) # the writes of the run were rolled back
+        for name, result in report['results'].items():
+            self.assertEqual(result['errors'], 0, name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries']['min'], 0)
+
+    def test_bench_connections_needs_postgresql(self):
+        out = StringIO()
+        call_command('bench_connections', requests=2, threads=1, modes='per_request,persistent', stdout=out, stderr=StringIO())
+        if connection.vendor != 'postgresql':
+            self.assertIn('needs PostgreSQL', out.getvalue())
+            return
+        results = json.loads(out.getvalue())['results']
+        self.assertGreater(results['per_request']['backend_sessions'], 1) # a new session per request
+        self.assertEqual(results['persistent']['backend_sessions'], 1)
+
+    def tmp_dir(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        return path
+
+
+class AsyncReadViewTests(ExpBudTestCase):
+    # the async views must answer exactly like the DRF views they stand in for
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=40)
+        cls.group, cls.users = seed_group('async', members=5, expenses=150, settlements=12, start=cls.start)
+        cls.outsider = User.objects.create_user('async-outsider', password='x')
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        self.factory = AsyncRequestFactory()
+        self.auth = {'headers': {'Authorization': f'Bearer {RefreshToken.for_user(self.users[0]).access_token}'}}
+
+    async def assertSameAsSync(self, view, path, **extra):
+        response = await view(self.factory.get(path, **self.auth), group_id=self.group.id)
+        expected = await sync_to_async(self.client.get)(path)
+        self.assertEqual(response.status_code, expected.status_code, response.content)
+        self.assertEqual(response.content, expected.content)
+        return response
+
+    async def test_summary(self):
+        base = f'/api/groups/{self.group.id}/summary/'
+        await self.assertSameAsSync(async_views.group_summary, f'{base}?year={self.start.year}&month={self.start.month}')
+        await self.assertSameAsSync(async_views.group_summary, f'{base}?year={self.start.year}&month={self.start.month}&day=12')
+
+    async def test_closed_and_archived_month_summary(self):
+        def close_and_archive():
+            with transaction.atomic():
+                periods.close(self.group.id, self.start.year, self.start.month, self.users[0].id)
+            periods.archive_period(self.group.id, self.start.year, self.start.month)
+        await sync_to_async(close_and_archive)()
+        await self.test_summary() # whole month from the snapshot, partial month with the archived rows
+
+    async def test_expense_list_pages_and_filters(self):
+        path = f'/api/groups/{self.group.id}/expenses/?page_size=60'
+        while path:
+            response = await self.assertSameAsSync(async_views.expense_list, path)
+            path = json.loads(response.content)['next']
+        await self.assertSameAsSync(async_views.expense_list, f'/api/groups/{self.group.id}/expenses/?min_amount=abc')
+
+    async def test_settlement_list(self):
+        await self.assertSameAsSync(async_views.settlement_list, f'/api/groups/{self.group.id}/settlements/')
+
+    async def test_auth_and_membership(self):
+        path = f'/api/groups/{self.group.id}/summary/'
+        self.assertEqual((await async_views.group_summary(self.factory.get(path), group_id=self.group.id)).status_code, 401)
+        outsider = {'headers': {'Authorization': f'Bearer {RefreshToken.for_user(self.outsider).access_token}'}}
+        self.assertEqual((await async_views.group_summary(self.factory.get(path, **outsider), group_id=self.group.id)).status_code, 404)
+        self.assertEqual((await async_views.group_summary(self.factory.get(path, **self.auth), group_id=999999)).status_code, 404)
+
+    async def test_post_goes_to_the_drf_view(self):
+        request = self.factory.post(f'/api/groups/{self.group.id}/settlements/',
+                                    {'from_user': self.users[1].id, 'to_user': self.users[2].id, 'amount': '4.00'},
+                                    content_type='application/json', **self.auth)
+        response = await async_views.settlement_list(request, group_id=self.group.id)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await sync_to_async(ledger.verify_group)(self.group.id), [])
+
+
+class ClosedPeriodTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=90)
+        cls.group, cls.users = seed_group('closing', members=4, expenses=300, settlements=20, start=cls.start)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        login(self.client, self.users[0])
+        self.year, self.month = self.start.year, self.start.month
+        self.in_month = self.start + timedelta(days=3)
+        self.category = self.group.categories.order_by('id').first()
+
+    def summary(self, day=1):
+        return self.client.get(f'/api/groups/{self.group.id}/summary/?year={self.year}&month={self.month}&day={day}').data
+
+    def close(self, **extra):
+        return self.client.post(f'/api/groups/{self.group.id}/budget/close/',
+                                {'year': self.year, 'month': self.month, **extra}, format='json')
+
+    def test_closed_summary_reads_the_snapshot(self):
+        before = self.summary()
+        response = self.close()
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertIsNotNone(response.data['closed_at'])
+        self.assertEqual(response.data['snapshot']['total_spent'], before['total_spent'])
+        self.assertEqual(self.close().data['closed_at'], response.data['closed_at']) # closing twice changes nothing
+
+        with CaptureQueriesContext(connection) as ctx:
+            after = self.summary()
+        self.assertEqual(after, before)
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('exp_bud_monthlyspend', sql)
+        self.assertNotIn('exp_bud_memberbalance', sql)
+
+    def test_only_ended_months_and_the_creator(self):
+        now = timezone.now()
+        response = self.client.post(f'/api/groups/{self.group.id}/budget/close/', {'year': now.year, 'month': now.month}, format='json')
+        self.assertEqual(response.status_code, 400)
+        login(self.client, self.users[1])
+        self.assertEqual(self.close().status_code, 403)
+        self.assertFalse(BudgetPeriod.objects.filter(group=self.group, closed_at__isnull=False).exists())
+
+    def test_writes_into_a_closed_month_are_rejected(self):
+        self.close()
+        base = f'/api/groups/{self.group.id}'
+        expense = Expense.objects.filter(group=self.group, spent_at__gte=self.start, spent_at__lt=self.start + timedelta(days=28)).first()
+        open_expense = Expense.objects.filter(group=self.group, spent_at__gte=self.start + timedelta(days=40)).first()
+        data = {'amount': '5.00', 'paid_by_id': self.users[1].id, 'category_id': self.category.id, 'spent_at': self.in_month.isoformat()}
+
+        self.assertEqual(self.client.post(f'{base}/expenses/', data, format='json').status_code, 400)
+        self.assertEqual(self.client.patch(f'{base}/expense/{expense.id}/', {'amount': '1.00', 'split_items': [], 'version': 1}, format='json').status_code, 400)
+        self.assertEqual(self.client.patch(f'{base}/expense/{open_expense.id}/', {'spent_at': self.in_month.isoformat(), 'version': 1}, format='json').status_code, 400)
+        self.assertEqual(self.client.delete(f'{base}/expense/{expense.id}/').status_code, 400)
+        settlement = {'from_user': self.users[1].id, 'to_user': self.users[2].id, 'amount': '3.00', 'settled_at': self.in_month.isoformat()}
+        self.assertEqual(self.client.post(f'{base}/settlements/', settlement, format='json').status_code, 400)
+        self.assertEqual(self.client.post(f'{base}/settlements/bulk/', [settlement], format='json').status_code, 400)
+        budget = {'year': self.year, 'month': self.month, 'limit': '10.00'}
+        self.assertEqual(self.client.post(f'{base}/budget/', budget, format='json').status_code, 400)
+
+        from .importer import import_expenses
+        csv = f'amount,paid_by_id,category_id,spent_at\n2.00,{self.users[0].id},{self.category.id},{self.in_month.isoformat()}\n'
+        report = import_expenses(self.group, self.users[0], BytesIO(csv.encode()), 'csv')
+        self.assertEqual((report['created'], report['error_count']), (0, 1))
+
+        # months still open are unaffected
+        data['spent_at'] = timezone.now().isoformat()
+        self.assertEqual(self.client.post(f'{base}/expenses/', data, format='json').status_code, 201)
+        self.assertEqual(ledger.verify_group(self.group.id), [])
+
+    def test_archive_keeps_totals_ledger_and_rollup(self):
+        month_rows = Expense.objects.filter(group=self.group, spent_at__gte=self.start,
+                                            spent_at__lt=(self.start + timedelta(days=32)).replace(day=1))
+        count = month_rows.count()
+        whole, partial = self.summary(), self.summary(day=10)
+
+        out = StringIO()
+        following = partitions.add_months(self.year, self.month, 1)
+        call_command('compact_periods', before=f'{following[0]}-{following[1]:02d}', group=[self.group.id], batch_size=7, stdout=out)
+        self.assertIn(f'{count} expense(s) archived', out.getvalue())
+        self.assertEqual(month_rows.count(), 0)
+        self.assertEqual(ArchivedExpense.objects.filter(group=self.group).count(), count)
+        self.assertEqual(ArchivedExpenseSplit.objects.filter(expense__group=self.group).count(),
+                         count * 4) # seed_group splits every expense between 4 members
+        self.assertIsNotNone(BudgetPeriod.objects.get(group=self.group, year=self.year, month=self.month).archived_at)
+
+        self.assertEqual(self.summary(), whole)
+        after = self.summary(day=10)
+        self.assertEqual(Decimal(after['total_spent']), Decimal(partial['total_spent'])) # SQLite sums raw rows as floats
+        self.assertEqual(after['balances'], partial['balances'])
+        self.assertEqual(ledger.verify_group(self.group.id), [])
+        self.assertEqual(rollups.verify_group(self.group.id), [])
+
+        # a second run finds nothing left to move
+        out = StringIO()
+        call_command('compact_periods', before=f'{following[0]}-{following[1]:02d}', group=[self.group.id], stdout=out)
+        self.assertIn('0 expense(s) archived', out.getvalue())
+
+    def test_export_keeps_archived_rows(self):
+        url = f'/api/groups/{self.group.id}/export/?type=jsonl'
+
+        def exported(table):
+            response = self.client.get(f'{url}&table={table}')
+            return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        before = {table: exported(table) for table in ('expenses', 'splits')}
+        following = partitions.add_months(self.year, self.month, 1)
+        call_command('compact_periods', before=f'{following[0]}-{following[1]:02d}', group=[self.group.id], stdout=StringIO())
+        self.assertTrue(ArchivedExpense.objects.filter(group=self.group).exists())
+        self.assertEqual(exported('expenses'), before['expenses']) # same rows, same order
+        self.assertEqual(exported('splits'), before['splits'])
+
+
+class ReplicaRoutingTests(SimpleTestCase):
+    # middleware + router decisions, without a second database (replicas.enabled() is patched)
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = replicas.ReplicaRouter()
+        patcher = mock.patch.object(replicas, 'enabled', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def routed(self, method, token=None):
+        # the alias a read issued by the view of this request would use
+        seen = []
+        def view(request):
+            seen.append(self.router.db_for_read(Expense))
+            return HttpResponse()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        ReplicaRoutingMiddleware(view)(getattr(self.factory, method)('/api/groups/', headers=headers))
+        return seen[0]
+
+    def test_safe_reads_go_to_the_replica_writes_to_the_primary(self):
+        self.assertEqual(self.routed('get', 'a'), 'replica')
+        self.assertEqual(self.routed('head'), 'replica')
+        self.assertEqual(self.routed('post', 'a'), 'default')
+        self.assertEqual(self.router.db_for_write(Expense), 'default')
+        self.assertEqual(replicas.read_alias(), 'default') # outside of a request
+
+    def test_reads_stick_to_the_primary_after_a_write(self):
+        self.routed('patch', 'a')
+        self.assertEqual(self.routed('get', 'a'), 'default')
+        self.assertEqual(self.routed('get', 'b'), 'replica') # other clients are not affected
+        with override_settings(EXP_BUD_REPLICA={'STICKY_SECONDS': 0}):
+            self.routed('post', 'c')
+            self.assertEqual(self.routed('get', 'c'), 'replica')
+        cache.clear() # the sticky window ran out
+        self.assertEqual(self.routed('get', 'a'), 'replica')
+
+    def test_transactions_stay_on_the_primary(self):
+        with replicas.reading():
+            self.assertEqual(replicas.read_alias(), 'replica')
+            with mock.patch.object(connections['default'], 'in_atomic_block', True):
+                self.assertEqual(replicas.read_alias(), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'exp_bud'))
+        self.assertTrue(self.router.allow_migrate('default', 'exp_bud'))
+
+    async def test_async_middleware(self):
+        seen = []
+        async def view(request):
+            seen.append(await sync_to_async(self.router.db_for_read)(Expense)) # ORM thread, same decision
+            return HttpResponse()
+        middleware = ReplicaRoutingMiddleware(view)
+        await middleware(self.factory.post('/', headers={'Authorization': 'Bearer a'}))
+        await middleware(self.factory.get('/', headers={'Authorization': 'Bearer a'}))
+        await middleware(self.factory.get('/', headers={'Authorization': 'Bearer b'}))
+        self.assertEqual(seen, ['default', 'default', 'replica'])
+
+
+@skipUnless('replica' in settings.DATABASES, 'needs a replica alias in DATABASES (e.g. DB_REPLICA_HOST)')
+class ReplicaDatabaseTests(TransactionTestCase):
+    # the same against real connections: the replica is a test mirror of the default database
+    databases = {'default', 'replica'} if 'replica' in settings.DATABASES else {'default'}
+
+    def setUp(self):
+        cache.clear()
+        group_cache.clear()
+        self.group, self.users = seed_group('replica', members=3, expenses=20, settlements=2, start=timezone.now())
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.users[0]).access_token}')
+
+    def test_summary_reads_the_replica_until_the_client_writes(self):
+        url = f'/api/groups/{self.group.id}/summary/'
+        with CaptureQueriesContext(connections['replica']) as replica, CaptureQueriesContext(connection) as primary:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertGreater(len(replica), 0)
+        self.assertEqual(len(primary), 1) # the group cache miss (members) is loaded from the primary
+
+        data = {'from_user': self.users[1].id, 'to_user': self.users[2].id, 'amount': '4.00'}
+        self.assertEqual(self.client.post(f'/api/groups/{self.group.id}/settlements/', data, format='json').status_code, 201)
+        with CaptureQueriesContext(connections['replica']) as replica:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(replica), 0)
+
+
+class JobQueueTests(ExpBudTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        start = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0) - timedelta(days=30)
+        cls.group, cls.users = seed_group('jobs', members=3, expenses=120, settlements=5, start=start)
+        cls.outsider = User.objects.create(username='jobs-outsider')
+
+    def setUp(self):
+        super().setUp()
+        export_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, export_dir)
+        settings_override = override_settings(EXP_BUD_JOBS={'RETRY_DELAY': 0, 'EXPORT_DIR': export_dir})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        login(self.client, self.users[0])
+
+    def work(self):
+        out = StringIO()
+        call_command('run_jobs', once=True, stdout=out)
+        return out.getvalue()
+
+    def test_rebuild_is_handed_off_and_deduplicated(self):
+        url = f'/api/groups/{self.group.id}/jobs/'
+        response = self.client.post(url, {'kind': 'rebuild_balances'}, format='json')
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual(response['Location'], f'/api/jobs/{response.data["id"]}/')
+        again = self.client.post(url, {'kind': 'rebuild_balances'}, format='json')
+        self.assertEqual((again.data['id'], again.data['deduplicated']), (response.data['id'], True))
+        self.assertEqual(self.client.post(url, {'kind': 'rebuild_rollups'}, format='json').data['deduplicated'], False)
+
+        login(self.client, self.users[1])
+        self.assertEqual(self.client.post(url, {'kind': 'rebuild_balances'}, format='json').status_code, 403)
+        self.assertEqual(self.client.post(url, {'kind': 'nope'}, format='json').status_code, 400)
+
+        self.assertIn('2 job(s) run', self.work())
+        job = self.client.get(response['Location']).data # any member can follow it
+        self.assertEqual((job['status'], job['progress'], job['attempts']), ('done', 100, 1))
+        self.assertEqual(job['result']['mismatches'], 0)
+        login(self.client, self.users[0])
+        self.assertEqual(self.client.post(url, {'kind': 'rebuild_balances'}, format='json').data['deduplicated'], False)
+
+    def test_export_job_writes_the_streamed_file(self):
+        response = self.client.post(f'/api/groups/{self.group.id}/export/', {'table': 'splits', 'type': 'jsonl'}, format='json')
+        self.assertEqual(response.status_code, 202, response.data)
+        status_url = response['Location']
+        self.assertEqual(self.client.get(f'{status_url}download/').status_code, 409)
+
+        self.work()
+        job = self.client.get(status_url).data
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual(job['result']['rows'], ExpenseSplit.objects.filter(expense__group=self.group).count())
+        download = self.client.get(job['download'])
+        self.assertEqual(download.status_code, 200)
+        body = b''.join(download.streaming_content)
+        download.close()
+        streamed = self.client.get(f'/api/groups/{self.group.id}/export/?table=splits&type=jsonl')
+        self.assertEqual(body, b''.join(streamed.streaming_content))
+
+        login(self.client, self.outsider)
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+        self.assertEqual(self.client.get(job['download']).status_code, 404)
+
+    def test_export_job_body_forms(self):
+        url = f'/api/groups/{self.group.id}/export/'
+        # a form-encoded body is read as plain values; a kind in the body can't turn the export into a rebuild
+        response = self.client.post(url, {'table': 'splits', 'type': 'jsonl', 'gzip': 'true', 'kind': 'rebuild_balances'})
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual((response.data['kind'], response.data['params']), ('export', {'table': 'splits', 'type': 'jsonl', 'gzip': True}))
+        # a JSON body that isn't an object is a validation error, not a crash
+        self.assertEqual(self.client.post(url, [{'table': 'splits'}], format='json').status_code, 400)
+
+    def test_failures_are_retried_then_marked_failed(self):
+        job, _ = jobs.enqueue(self.group.id, Job.Kind.REBUILD_ROLLUPS)
+        with mock.patch.dict(jobs.HANDLERS, {Job.Kind.REBUILD_ROLLUPS: mock.Mock(side_effect=RuntimeError('disk full'))}):
+            with self.assertLogs('exp_bud.jobs', 'ERROR'):
+                self.assertIn('3 job(s) run', self.work()) # RETRY_DELAY 0: the retries are due at once
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), ('failed', 3, 'RuntimeError: disk full'))
+
+    def test_rebuilds_and_writers_take_the_group_lock(self):
+        # a rebuild waits for (and then blocks) the writers of the group, see ledger.lock_group
+        lock_group = ledger.lock_group
+        with mock.patch('exp_bud.ledger.lock_group', wraps=lock_group) as ledger_lock, \
+                mock.patch('exp_bud.rollups.lock_group', wraps=lock_group) as rollup_lock:
+            data = {'amount': '9.00', 'paid_by_id': self.users[1].id, 'category_id': self.group.categories.first().id}
+            self.assertEqual(self.client.post(f'/api/groups/{self.group.id}/expenses/', data, format='json').status_code, 201)
+            self.assertEqual((ledger_lock.call_count, rollup_lock.call_count), (1, 1))
+            for kind in (Job.Kind.REBUILD_BALANCES, Job.Kind.REBUILD_ROLLUPS):
+                jobs.enqueue(self.group.id, kind)
+            self.work()
+            self.work()
+        self.assertEqual((ledger_lock.call_count, rollup_lock.call_count), (2, 2))
+        ledger_lock.assert_called_with(self.group.id)
+        self.assertEqual(Job.objects.filter(group=self.group, status=Job.Status.DONE).count(), 2)
+
+    def test_jobs_of_a_stopped_worker_are_requeued(self):
+        job, _ = jobs.enqueue(self.group.id, Job.Kind.REBUILD_BALANCES)
+        self.assertEqual(jobs.claim().id, job.id)
+        self.assertIsNone(jobs.claim()) # claimed once only
+        Job.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertIn('1 job(s) run', self.work())
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('done', 2))
+
+
+class JobHeartbeatTests(TransactionTestCase):
+    # the heartbeat thread writes through its own connection, so the job row must be committed: no TestCase transaction
+    def test_a_long_handler_keeps_its_heartbeat_fresh(self):
+        group, _ = seed_group('heartbeat', members=2, expenses=0, settlements=0, start=timezone.now())
+        job, _ = jobs.enqueue(group.id, Job.Kind.REBUILD_ROLLUPS)
+        job = jobs.claim()
+        started = job.heartbeat_at
+
+        def slow(job):
+            # longer than STALE_SECONDS without a report: without the heartbeat, requeue_stale() would take it back
+            time.sleep(0.5)
+            self.assertEqual(jobs.requeue_stale(), 0)
+            return {}
+
+        with override_settings(EXP_BUD_JOBS={'STALE_SECONDS': 0.3}), \
+                mock.patch.dict(jobs.HANDLERS, {Job.Kind.REBUILD_ROLLUPS: slow}):
+            job = jobs.run(job)
+        self.assertEqual((job.status, job.attempts), ('done', 1))
+        self.assertGreater(job.heartbeat_at, started)
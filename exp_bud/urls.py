@@ -1,9 +1,23 @@
+from django.conf import settings
 from django.urls import path
 from .views import ( UserProfileView, UserUpdateView, RegisterView, GroupListCreateView, GroupDetailView,
                     AddMemberView, RemoveMemberView, CategoryListCreateView, ExpenseListCreateView,
                     ExpenseDetailView, BudgetUpsertView, SettlementListCreateView, GroupSummaryView,
+                    ExpenseImportView, GroupCacheStatsView, BudgetStatusView,
+                    GroupReportView, SettleUpView, GroupExportView, SettlementBulkCreateView, BudgetCloseView,
+                    GroupJobCreateView, JobDetailView, JobDownloadView,
 )
+from . import async_views
 
+# EXP_BUD_ASYNC_READS (settings.py): serve the GETs of these endpoints from async_views.py when running under ASGI
+if getattr(settings, 'EXP_BUD_ASYNC_READS', False):
+    expense_list_view = async_views.expense_list
+    settlement_list_view = async_views.settlement_list
+    summary_view = async_views.group_summary
+else:
+    expense_list_view = ExpenseListCreateView.as_view()
+    settlement_list_view = SettlementListCreateView.as_view()
+    summary_view = GroupSummaryView.as_view()
 
 
 urlpatterns = [
@@ -21,12 +35,24 @@ urlpatterns = [
     
     path('groups/<int:group_id>/categories/', CategoryListCreateView.as_view(), name='category-list-create'),
     
-    path('groups/<int:group_id>/expenses/', ExpenseListCreateView.as_view(), name='expense-list-create'),
+    path('groups/<int:group_id>/expenses/', expense_list_view, name='expense-list-create'),
+    path('groups/<int:group_id>/expenses/import/', ExpenseImportView.as_view(), name='expense-import'),
     path('groups/<int:group_id>/expense/<int:pk>/', ExpenseDetailView.as_view(), name='expense-detail'),
     
     path('groups/<int:group_id>/budget/', BudgetUpsertView.as_view(), name='budget-upsert'),
+    path('groups/<int:group_id>/budget/status/', BudgetStatusView.as_view(), name='budget-status'),
+    path('groups/<int:group_id>/budget/close/', BudgetCloseView.as_view(), name='budget-close'),
     
-    path('groups/<int:group_id>/settlements/', SettlementListCreateView.as_view(), name='settlement-list-create'),
+    path('groups/<int:group_id>/settlements/', settlement_list_view, name='settlement-list-create'),
+    path('groups/<int:group_id>/settlements/bulk/', SettlementBulkCreateView.as_view(), name='settlement-bulk-create'),
+    path('groups/<int:group_id>/settle-up/', SettleUpView.as_view(), name='settle-up'),
     
-    path('groups/<int:group_id>/summary/', GroupSummaryView.as_view(), name='group-summary'),
+    path('groups/<int:group_id>/summary/', summary_view, name='group-summary'),
+    path('groups/<int:group_id>/report/', GroupReportView.as_view(), name='group-report'),
+    path('groups/<int:group_id>/export/', GroupExportView.as_view(), name='group-export'),
+    path('groups/<int:group_id>/jobs/', GroupJobCreateView.as_view(), name='group-job-create'),
+    path('jobs/<int:job_id>/', JobDetailView.as_view(), name='job-detail'),
+    path('jobs/<int:job_id>/download/', JobDownloadView.as_view(), name='job-download'),
+    
+    path('cache/stats/', GroupCacheStatsView.as_view(), name='group-cache-stats'),
 ]
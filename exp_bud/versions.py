@@ -0,0 +1,69 @@
+import hashlib
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from .models import Group
+
+# Per-group data version + conditional GET for the endpoints mobile clients poll (summary, categories).
+#
+# Group.data_version goes up by one whenever an Expense, ExpenseSplit, Settlement, BudgetPeriod, Category or Member
+# row of the group (or the group itself) changes: signals.py for save()/delete(), bump() called directly by the
+# bulk paths that send no signals (import, expense update, settle-up commit).
+# The group row is read anyway by the membership check, so a client sending If-None-Match with the current ETag
+# gets 304 without any query on the expense tables, and a full response is cached under (group, version, params),
+# so a new version simply stops matching the old keys (nothing has to be deleted).
+#
+# settings.EXP_BUD_RESPONSE_CACHE (all keys optional):
+#   'ENABLED': True
+#   'ALIAS': 'default' → settings.CACHES alias; use a shared one (redis, memcached) with several workers
+#   'TTL': 300         → seconds; also bounds staleness of data that has no version (e.g. a member renaming themselves)
+
+
+def config():
+    return {'ENABLED': True, 'ALIAS': 'default', 'TTL': 300, **getattr(settings, 'EXP_BUD_RESPONSE_CACHE', {})}
+
+
+def bump(*group_ids):
+    # one UPDATE; the increment happens in the database, so concurrent writers never lose a bump
+    if group_ids:
+        Group.objects.filter(id__in=group_ids).update(data_version=F('data_version') + 1)
+
+
+def cache_key(group, name, variant):
+    # variant: the query params the response depends on, already resolved (e.g. the default month filled in).
+    # created_at guards against a deleted group's id being reused with data_version 1 again.
+    raw = f'{name}|{group.id}|{group.created_at.timestamp()}|{group.data_version}|{variant!r}'
+    digest = hashlib.sha256(raw.encode()).hexdigest()[:32]
+    return f'exp_bud:resp:{name}:{group.id}:{digest}', f'"{group.data_version}-{digest[:16]}"'
+
+
+def not_modified(request, etag):
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    return etag in if_none_match or '*' in if_none_match
+
+
+def response_headers(etag):
+    return {'ETag': etag, 'Cache-Control': 'private, no-cache'} # clients must revalidate, which is cheap
+
+
+def cached_response(request, group, name, variant, build):
+    # 304 if the client has this version, else the cached data, else build() (and cache it).
+    # async_views.group_summary does the same with the async cache API.
+    options = config()
+    if not options['ENABLED']:
+        return Response(build())
+
+    key, etag = cache_key(group, name, variant)
+    headers = response_headers(etag)
+    if not_modified(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    cache = caches[options['ALIAS']]
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, options['TTL'])
+    return Response(data, headers=headers)
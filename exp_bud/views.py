@@ -1,25 +1,65 @@
+import os
 from decimal import Decimal
-from django.db.models import Sum
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Prefetch, Sum, prefetch_related_objects
 from rest_framework import generics, status,serializers
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
 from django.utils import timezone # timezone module contains multiple utilities, including:
                                     # now(), datetime, timedelta, get_current_timezone()
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound, PermissionDenied
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.http import parse_etags
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare
 
 
 from django.contrib.auth import get_user_model
-from .models import Group, Member, Expense, ExpenseSplit, BudgetPeriod, Settlement, Category
+from .models import Group, Member, Expense, ExpenseSplit, BudgetPeriod, Settlement, Category, MemberBalance, MonthlySpend, Job
 from .serializers import ( GroupSerializer, AddMemberSerializer,
     RegisterSerializer, UserProfileSerializer, UserUpdateSerializer,
-    CategorySerializer, ExpenseSerializer, BudgetPeriodSerializer, SettlementSerializer )
+    CategorySerializer, ExpenseSerializer, BudgetPeriodSerializer, SettlementSerializer, SettlementInputSerializer,
+    ClosePeriodSerializer, JobCreateSerializer, ExportJobCreateSerializer, JobSerializer )
 from .permissions import IsGroupCreator, IsGroupMember, IsGroupCreatorOrExpenseCreator
+from .pagination import ExpenseCursorPagination
+from .exceptions import Conflict, PreconditionRequired
+from .context import GroupContext
+from .cache import group_cache
+from . import ledger, rollups, reports, settleup, importer, fastread, metrics, export, versions, periods, replicas, jobs
 
 User = get_user_model()
 
 
+def splits_prefetch():
+    # splits with their users, in id order (fastread builds them in the same order)
+    return Prefetch('splits', queryset=ExpenseSplit.objects.select_related('user').order_by('id'))
+
+
+class GroupContextMixin:
+    # For views under groups/<group_id>/: loads the group and its member ids once per request into
+    # self.group_ctx (see context.py). Permissions, the view and its serializers all read from it.
+    # This runs in initial(), after DRF has authenticated the request; dispatch() runs before JWT
+    # authentication, so request.user is still anonymous there.
+    
+    def initial(self, request, *args, **kwargs):
+        self.group_ctx = None
+        self.group = None
+        if request.user and request.user.is_authenticated: # anonymous → IsAuthenticated answers 401 below
+            self.group_ctx = GroupContext.for_user(kwargs['group_id'], request.user)
+            self.group = self.group_ctx.group
+        super().initial(request, *args, **kwargs)
+    
+    def get_serializer_context(self):
+        ctx = super().get_serializer_context() # we call the parent class via super() to keep DRF’s
+        # returns a default dict of {'request', 'view', 'format'} by default; can be overridden to add custom context.
+        ctx['group'] = self.group # default group
+        ctx['group_ctx'] = self.group_ctx
+        return ctx
+
+
 
 class UserProfileView(APIView):
     permission_classes = [IsAuthenticated]
@@ -43,12 +83,53 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = RegisterSerializer
     
 
-class GroupListCreateView(generics.ListCreateAPIView):
+class GroupQuerysetMixin:
+    # Shared by the group list and detail views: a fixed number of queries however many groups the user is in
+    # (groups + created_by in one JOIN, then one prefetch query each for members and categories).
+    # Optional ?fields=id,name,... (GET only) returns just those fields and skips the queries of the nested
+    # arrays that were not asked for, e.g. ?fields=id,name,currency is a single query.
+    
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs) # authentication and permissions first: anonymous → 401, not 400
+        self.sparse_fields = None
+        raw = request.query_params.get('fields') if request.method == 'GET' else None
+        if raw:
+            self.sparse_fields = [name.strip() for name in raw.split(',') if name.strip()]
+            unknown = [name for name in self.sparse_fields if name not in GroupSerializer.Meta.fields]
+            if unknown:
+                raise serializers.ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}"})
+    
+    def wants(self, field):
+        return self.sparse_fields is None or field in self.sparse_fields
+    
+    def get_queryset(self):
+        queryset = Group.objects.filter(members=self.request.user).distinct().order_by('id')
+        if self.wants('created_by_username'):
+            queryset = queryset.select_related('created_by')
+        if self.wants('members_info'):
+            queryset = queryset.prefetch_related(Prefetch('member_links', queryset=Member.objects.select_related('user').order_by('id')))
+        if self.wants('categories'):
+            # the prefetch also fills category.group with the parent group, so group_name costs no query per category
+            queryset = queryset.prefetch_related(Prefetch('categories', queryset=Category.objects.order_by('id')))
+        return queryset
+    
+    def get_serializer(self, *args, **kwargs):
+        if self.sparse_fields is not None:
+            kwargs['fields'] = self.sparse_fields
+        return super().get_serializer(*args, **kwargs)
+
+
+
+class GroupListCreateView(GroupQuerysetMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = GroupSerializer
+    fast_read = True # GET builds the list with fastread.group_dicts instead of GroupSerializer
     
-    def get_queryset(self):
-        return (Group.objects.filter(members=self.request.user).distinct().prefetch_related('member_links__user'))
+    def list(self, request, *args, **kwargs):
+        if not self.fast_read:
+            return super().list(request, *args, **kwargs)
+        queryset = Group.objects.filter(members=request.user).distinct().order_by('id')
+        return Response(fastread.group_dicts(queryset, self.sparse_fields))
     
     def perform_create(self, serializer):
         group = serializer.save(created_by=self.request.user)
@@ -56,13 +137,10 @@ class GroupListCreateView(generics.ListCreateAPIView):
         Member.objects.create(group=group, user=self.request.user, role=Member.Role.CREATOR)
 
 
-class GroupDetailView(generics.RetrieveUpdateDestroyAPIView):
+class GroupDetailView(GroupQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = GroupSerializer
     
-    def get_queryset(self):
-        return Group.objects.filter(members=self.request.user).distinct()
-    
     def perform_update(self, serializer):
         group = self.get_object()
         if group.created_by_id != self.request.user.id:
@@ -128,76 +206,180 @@ class RemoveMemberView(generics.GenericAPIView):
         
 
 
-class CategoryListCreateView(generics.ListCreateAPIView):
+class CategoryListCreateView(GroupContextMixin, generics.ListCreateAPIView):
     
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsGroupMember] # IsGroupMember: the group exists and the user is a member
     
     def get(self, request, group_id):
-        # make sure the group exists and the user is a member
-        group = get_object_or_404(Group, id=group_id, members=request.user)
-        categories = Category.objects.filter(group=group)
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data)
+        return versions.cached_response(request, self.group, 'categories', (), self.build)
+    
+    def build(self):
+        categories = Category.objects.filter(group=self.group).select_related('group') # group_name without a query per row
+        return CategorySerializer(categories, many=True).data
 
     def post(self, request, group_id):
-        group = get_object_or_404(Group, id=group_id, members=request.user)
-
         # include the group in the serializer
         serializer = CategorySerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(group=group)  # automatically assign the group
+            serializer.save(group=self.group)  # automatically assign the group
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 
-class ExpenseListCreateView(generics.ListCreateAPIView):
+def filter_expenses(queryset, params):
+    # optional filters: ?start=&end= (date or datetime, end is exclusive), ?category=, ?paid_by=, ?min_amount=, ?max_amount=
+    # (module level so the async expense list in async_views.py applies exactly the same filters)
+    errors = {}
+    
+    for name, lookup in (('start', 'spent_at__gte'), ('end', 'spent_at__lt')):
+        if params.get(name):
+            try: # well-formed but impossible dates (2024-02-30, month 13) raise ValueError instead of returning None
+                value = parse_datetime(params[name])
+                if value is None:
+                    day = parse_date(params[name])
+                    value = timezone.datetime(day.year, day.month, day.day, tzinfo=timezone.get_current_timezone()) if day else None
+            except ValueError:
+                value = None
+            if value is None:
+                errors[name] = 'Use YYYY-MM-DD or an ISO datetime'
+                continue
+            if timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            queryset = queryset.filter(**{lookup: value})
+    
+    for name, lookup, cast in (('category', 'category_id', int), ('paid_by', 'paid_by_id', int),
+                               ('min_amount', 'amount__gte', Decimal), ('max_amount', 'amount__lte', Decimal)):
+        if params.get(name):
+            try:
+                value = cast(params[name])
+            except (ValueError, ArithmeticError):
+                errors[name] = 'Invalid value'
+                continue
+            if cast is Decimal and not value.is_finite(): # Decimal() accepts NaN / Infinity
+                errors[name] = 'Invalid value'
+                continue
+            queryset = queryset.filter(**{lookup: value})
+    
+    if errors:
+        raise serializers.ValidationError(errors)
+    return queryset
+
+
+
+class ExpenseListCreateView(GroupContextMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated, IsGroupMember]
     serializer_class = ExpenseSerializer
+    pagination_class = ExpenseCursorPagination # ?cursor=<next link>&page_size=50, newest first
+    fast_read = True # GET builds the page from .values() rows (fastread.py) instead of ExpenseSerializer
     
-    def dispatch(self, request, *args, **kwargs):
-        self.group = get_object_or_404(Group, id=kwargs['group_id'], members=self.request.user)
-        return super().dispatch(request, *args, **kwargs)
      
      # select_related = fetch related single objects in the same query(OneToOne, Foreignkey)
      # prefetch_related = fetch related lists of objects in separate query, cached in Python (ManyToMany, reverse Foreignkey)
      
     def get_queryset(self):
-        return ( Expense.objects.filter(group=self.group).select_related('category', 'paid_by', 'created_by')
-                .prefetch_related('splits__user').order_by('name'))
+        # ordering (spent_at, id) is applied by the paginator; splits are prefetched for the current page only
+        queryset = ( Expense.objects.filter(group=self.group).select_related('category', 'paid_by', 'created_by')
+                .prefetch_related(splits_prefetch()))
+        return self.filter_queryset_params(queryset)
     
-    def get_serializer_context(self):
-        ctx = super().get_serializer_context() # we call the parent class via super() to keep DRF’s
-        # returns a default dict of {'request', 'view', 'format'} by default; can be overridden to add custom context.
-        ctx['group'] = self.group # default group
-        return ctx
+    def list(self, request, *args, **kwargs):
+        if not self.fast_read:
+            return super().list(request, *args, **kwargs)
+        # same filters and keyset pagination, but rows are tuples and the JSON is built from plain dicts
+        queryset = self.filter_queryset_params(Expense.objects.filter(group=self.group))
+        page = self.paginate_queryset(fastread.expense_values(queryset))
+        return self.get_paginated_response(fastread.expense_dicts(page))
+    
+    def filter_queryset_params(self, queryset):
+        return filter_expenses(queryset, self.request.query_params)
     
     def perform_create(self, serializer):
-        serializer.save(group=self.group, created_by=self.request.user)
+        expense = serializer.save(group=self.group, created_by=self.request.user)
+        # the response shows every split with its username: load them in 2 queries, not 1 per split
+        prefetch_related_objects([expense], splits_prefetch())
         
 
 
-class ExpenseDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ExpenseImportView(GroupContextMixin, generics.GenericAPIView):
+    # POST a multipart form with a 'file' field (CSV or JSONL, see importer.py for the columns).
+    # The upload is read row by row and inserted in chunks; the response reports errors per row.
+    permission_classes = [IsAuthenticated, IsGroupMember]
+    parser_classes = [MultiPartParser]
+    
+    
+    def post(self, request, group_id):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'file': 'This field is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        kind = importer.detect_format(upload.name, request.query_params.get('type'))
+        if kind is None:
+            return Response({'type': 'Use type=csv or type=jsonl (or a .csv/.jsonl file name)'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        report = importer.import_expenses(self.group, request.user, upload, kind)
+        code = status.HTTP_201_CREATED if report['created'] and 'file' not in report else status.HTTP_400_BAD_REQUEST
+        return Response(report, status=code)
+    
+
+
+class ExpenseDetailView(GroupContextMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated, IsGroupCreatorOrExpenseCreator]
     serializer_class = ExpenseSerializer
     
-    def dispatch(self, request, *args, **kwargs):
-        self.group = get_object_or_404(Group, id=kwargs['group_id'], members=self.request.user)
-        return super().dispatch(request, *args, **kwargs)
     
     def get_queryset(self):
-        return Expense.objects.filter(group=self.group).select_related('category', 'paid_by', 'created_by')
+        # splits + their users come in with the expense: the response needs them, and update() diffs against them
+        return (Expense.objects.filter(group=self.group).select_related('category', 'paid_by', 'created_by')
+                .prefetch_related(splits_prefetch()))
+    
+    def if_match_version(self, request):
+        # If-Match: "3" (or W/"3") → 3; None without the header
+        header = request.headers.get('If-Match')
+        if not header:
+            return None
+        tags = parse_etags(header)
+        try:
+            if len(tags) != 1 or tags[0] == '*':
+                raise ValueError(header)
+            return int(tags[0].removeprefix('W/').strip('"'))
+        except ValueError:
+            raise serializers.ValidationError({'If-Match': 'must be the version of the expense, e.g. If-Match: "3"'})
+    
+    def update(self, request, *args, **kwargs):
+        # same as UpdateModelMixin.update, but the response re-reads the new splits with one prefetch
+        # instead of one query per split (ExpenseSerializer.update runs its own short transaction)
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object() # 404 / 403 first
+        if_match = self.if_match_version(request)
+        # every edit says which version it was made against; without one a stale client would silently overwrite
+        if if_match is None and 'version' not in request.data:
+            raise PreconditionRequired()
+        context = {**self.get_serializer_context(), 'if_match_version': if_match}
+        serializer = self.get_serializer(instance, data=request.data, partial=partial, context=context)
+        serializer.is_valid(raise_exception=True)
+        expense = serializer.save()
+        expense._prefetched_objects_cache = {}
+        prefetch_related_objects([expense], splits_prefetch())
+        return Response(self.get_serializer(expense).data)
+    
+    def perform_destroy(self, instance):
+        periods.check_open(self.group.id, instance.spent_at)
+        with transaction.atomic():
+            # lock the row and read its current splits, so a concurrent edit can't leave the ledger off
+            expense = Expense.objects.select_for_update().get(pk=instance.pk)
+            splits = list(ExpenseSplit.objects.filter(expense=expense))
+            ledger.apply_expense(expense, splits, sign=-1)
+            rollups.apply_expense(expense, sign=-1)
+            expense.delete()
     
 
 
 
-class BudgetUpsertView(generics.GenericAPIView):
+class BudgetUpsertView(GroupContextMixin, generics.GenericAPIView):
     permission_classes = [IsAuthenticated, IsGroupCreator, IsGroupMember]
     serializer_class = BudgetPeriodSerializer
     
-    def dispatch(self, request, *args, **kwargs):
-        self.group = get_object_or_404(Group, id=kwargs['group_id'], members=self.request.user)
-        return super().dispatch(request, *args, **kwargs)
     
     def post(self, request, group_id):
         serializer = self.get_serializer(data=request.data)
@@ -206,6 +388,7 @@ class BudgetUpsertView(generics.GenericAPIView):
         year = serializer.validated_data['year']
         month = serializer.validated_data['month']
         limit = serializer.validated_data['limit']
+        periods.ensure_open(self.group.id, year, month) # a closed period keeps the budget it was closed with
         
         budget, _ = BudgetPeriod.objects.update_or_create( # update_or_create is UPSERT logic. In db terms, it mean,
                                                           # Update if the record exists, otherwise Insert a new record.
@@ -216,15 +399,36 @@ class BudgetUpsertView(generics.GenericAPIView):
         return Response(BudgetPeriodSerializer(budget).data, status=status.HTTP_200_OK)
 
 
+class BudgetCloseView(GroupContextMixin, generics.GenericAPIView):
+    # Close a month that has ended (periods.py): its expenses/settlements can't change any more and the summary
+    # reads the snapshot. archive=true also moves its raw rows to the archive tables, a batch per transaction
+    # (`manage.py compact_periods` does the same for many months/groups at once).
+    permission_classes = [IsAuthenticated, IsGroupCreator, IsGroupMember]
+    serializer_class = ClosePeriodSerializer
+    
+    def post(self, request, group_id):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        year = serializer.validated_data['year']
+        month = serializer.validated_data['month']
+        
+        with transaction.atomic():
+            budget = periods.close(self.group.id, year, month, request.user.id)
+        archived = None
+        if serializer.validated_data['archive'] and budget.archived_at is None:
+            archived = periods.archive_period(self.group.id, year, month)
+            budget.refresh_from_db()
+        
+        return Response({**BudgetPeriodSerializer(budget).data, 'snapshot': budget.snapshot, 'archived_expenses': archived},
+                        status=status.HTTP_200_OK)
+
 
 
-class SettlementListCreateView(generics.ListCreateAPIView):
+
+class SettlementListCreateView(GroupContextMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated, IsGroupMember]
     serializer_class = SettlementSerializer
     
-    def dispatch(self, request, *args, **kwargs):
-        self.group = get_object_or_404(Group, id=kwargs['group_id'], members=self.request.user)
-        return super().dispatch(request,*args, **kwargs)
     
     def get_queryset(self):
         return Settlement.objects.filter(group=self.group).select_related('from_user', 'to_user').order_by('-settled_at')
@@ -233,82 +437,358 @@ class SettlementListCreateView(generics.ListCreateAPIView):
         from_user = serializer.validated_data['from_user']
         to_user = serializer.validated_data['to_user']
         
-        if not Member.objects.filter(group=self.group, user=from_user).exists():
+        # member ids are already loaded for this request, no extra query per check
+        if not self.group_ctx.is_member(from_user.id):
             raise serializers.ValidationError({'from_user': 'Not a group member'})
         
-        if not Member.objects.filter(group=self.group, user=to_user).exists():
+        if not self.group_ctx.is_member(to_user.id):
             raise serializers.ValidationError({'to_user': 'Not a group member'})
+        periods.check_open(self.group.id, serializer.validated_data.get('settled_at'))
         
-        serializer.save(group=self.group)
+        with transaction.atomic():
+            settlement = serializer.save(group=self.group)
+            ledger.apply_settlements(self.group.id, [settlement])
 
 
-class GroupSummaryView(APIView):
-    permission_classes = [IsAuthenticated]
+class SettlementBulkCreateView(GroupContextMixin, APIView):
+    # POST a JSON list of settlements (month-end settle-ups): every from_user/to_user is checked against the
+    # group's member set (one cached lookup), then all rows go in with one INSERT in one transaction.
+    # Either all of them are created (201, ids in the order posted) or none (400 with errors per item).
+    permission_classes = [IsAuthenticated, IsGroupMember]
+    max_items = 500
     
-    def get(self, request, group_id):
-        group = get_object_or_404(Group, id=group_id, members=self.request.user)
-        
-        now = timezone.now() # Current date, time, with timezone
-        year = int(request.query_params.get('year', now.year)) # year comes from the url
-        month = int(request.query_params.get('month', now.month))
-        day = int(request.query_params.get('day', now.day))
-        
-        start = timezone.datetime(year, month, day, tzinfo=timezone.get_current_timezone()) # tzinf assigns timezone to a datetime
-        end = (start + timezone.timedelta(days=32).replace(day=1)) # timedelta a time difference.To say how much time to move
+    def post(self, request, group_id):
+        serializer = SettlementInputSerializer(data=request.data, many=True, allow_empty=False, max_length=self.max_items)
+        serializer.is_valid(raise_exception=True)
         
-        expenses = Expense.objects.filter(group=group, spent_at__gte=start, spent_at__lt=end).select_related('paid_by')
+        errors = []
+        for item in serializer.validated_data:
+            error = {field: 'Not a group member' for field in ('from_user', 'to_user')
+                     if not self.group_ctx.is_member(item[field])}
+            errors.append(error)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        periods.check_open(self.group.id, *(item.get('settled_at') for item in serializer.validated_data))
+        
+        now = timezone.now()
+        with transaction.atomic():
+            settlements = settleup.record(self.group.id, [
+                Settlement(group=self.group, from_user_id=item['from_user'], to_user_id=item['to_user'],
+                           amount=item['amount'], note=item['note'], settled_at=item.get('settled_at', now))
+                for item in serializer.validated_data
+            ])
+        return Response({'count': len(settlements), 'ids': [st.id for st in settlements]}, status=status.HTTP_201_CREATED)
+
+
+def summary_period(params):
+    # ?year=&month=&day= → (year, month, day, start, end); shared by the sync and the async summary
+    now = timezone.now() # Current date, time, with timezone
+    year = int(params.get('year', now.year)) # year comes from the url
+    month = int(params.get('month', now.month))
+    day = int(params.get('day', 1)) # optional: start the range in the middle of the month
+    
+    start = timezone.datetime(year, month, day, tzinfo=timezone.get_current_timezone()) # tzinf assigns timezone to a datetime
+    end = (start + timezone.timedelta(days=32)).replace(day=1) # timedelta a time difference.To say how much time to move
+    return year, month, day, start, end
+
+
+def summary_querysets(group, year, month, start, end):
+    # the independent reads of the summary; async_views.py awaits the same querysets concurrently
+    return {
         # gte,gt,lte,lt,_exact is field lookups  gte- greater than or equal to, lt - less than.
         #__ is used in ORM queries.like: field looksup, Traversing relationships, Ordering/annotations. ( __ --> the separator tells Django “apply a lookups field” 
-        
-        splits = ExpenseSplit.objects.filter(expense__in=expenses).select_related('user', 'expense')
-        # expense is foreignKey, __in mean ORM lookup meaning “the value must be in this queryset, expenses is queryset 
-        settlements = Settlement.objects.filter(group=group, settled_at__gte=start, settled_at__lt=end)
-        
-        
-        total_spent = expenses.aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-        # aggregate is db-level calculation across all rows in QuerySet. common funcs: Sum, Avg, Count, Min, Max
-        # if total has value use that. if not provided safe fallback to Deciaml('0.00')
-        # ['total'] is dict key access and access the value from dictionary returned by aggregate
-        budget = BudgetPeriod.objects.filter(group=group, year=year, month=month).first()
+        'expenses': Expense.objects.filter(group=group, spent_at__gte=start, spent_at__lt=end),
+        'budget': BudgetPeriod.objects.filter(group=group, year=year, month=month),
+        # one query for ids + usernames; plain tuples instead of model instances
+        'members': Member.objects.filter(group=group).values_list('user_id', 'user__username'),
+        # whole month → the materialized ledger, one row per member
+        'ledger_rows': MemberBalance.objects.filter(group=group, year=year, month=month).values_list(
+            'user_id', 'paid', 'owed', 'sent', 'received'),
+    }
+
+
+def summary_payload(group, year, month, total_spent, budget, members, net_by_user):
+    budget_limit = budget.limit if budget else None
+    remaining = (budget_limit - total_spent) if budget_limit is not None else None # this is null-safe conditional assignment
+    
+    # balances: + means user should receive, - means user owes
+    member_ids = [uid for uid, _ in members]
+    id_to_name = dict(members)
+    balances = {uid: net_by_user.get(uid, Decimal('0.00')) for uid in member_ids} # this is a dictionary comprehension
+    # uid : Decimal('0.00), use uid as the key in dict and Decimal('0.00) as the value. eg: { 1: Decimal('2000.00'),}
+    
+    balance_list = [                          # .get(key, default),if found return value. If not return default-> str(uid) it is a null-safe / error-safe      
+        {'user_id': uid, 'username': id_to_name.get(uid, str(uid)), 'net': str(balances[uid])} # balances[uid] → fetches that user’s net amount from the dictionary
+        for uid in member_ids
+    ]
+    
+    # [] is the dictionary lookup operator in Python used to access or update the value of a specific key in a dictionary
+    
+    return {
+        'group_id': group.id,
+        'group_name': group.name,
+        'currency': group.currency,
+        'period': {'year': year, 'month': month},
+        'total_spent': str(total_spent),
+        'budget_limit': str(budget_limit) if budget_limit is not None else None,
+        'remaining': str(remaining) if remaining is not None else None,
+        'balances': balance_list,
+    }
+
+
+class GroupSummaryView(GroupContextMixin, APIView):
+    permission_classes = [IsAuthenticated, IsGroupMember]
+    
+    def get(self, request, group_id):
+        year, month, day, start, end = summary_period(request.query_params)
+        # 304 / cached copy while the group's data_version is unchanged (versions.py)
+        return versions.cached_response(request, self.group, 'summary', (year, month, day),
+                                        lambda: self.build(year, month, day, start, end))
+    
+    def build(self, year, month, day, start, end):
+        group = self.group
+        queries = summary_querysets(group, year, month, start, end)
+        budget = queries['budget'].first()
+        members = list(queries['members'])
+        
+        if day == 1 and budget and budget.snapshot is not None:
+            # closed month → everything comes from the snapshot taken when it was closed (periods.py)
+            total_spent, net_by_user = periods.snapshot_totals(budget.snapshot)
+        elif day == 1:
+            # whole month → read the MonthlySpend rollup (one row per category) instead of scanning the expenses
+            total_spent = rollups.month_spend(group.id, year, month)
+            net_by_user = {uid: paid - owed + sent - received for uid, paid, owed, sent, received in queries['ledger_rows']}
+        else:
+            total_spent = queries['expenses'].aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+            # aggregate is db-level calculation across all rows in QuerySet. common funcs: Sum, Avg, Count, Min, Max
+            # if total has value use that. if not provided safe fallback to Deciaml('0.00')
+            # ['total'] is dict key access and access the value from dictionary returned by aggregate
+            if budget and budget.closed_at:
+                total_spent += periods.archived_total(group.id, start, end) # raw rows may be archived by now
+            # partial month is not materialized, the database aggregates it from the raw rows
+            net_by_user = ledger.raw_balances(group.id, start, end)
+        
+        return summary_payload(group, year, month, total_spent, budget, members, net_by_user)
+
+
+
+class BudgetStatusView(GroupContextMixin, APIView):
+    # budget vs. actual spend for one month, read entirely from the MonthlySpend rollup and BudgetPeriod
+    permission_classes = [IsAuthenticated, IsGroupMember]
+    
+    def get(self, request, group_id):
+        now = timezone.now()
+        try:
+            year = int(request.query_params.get('year', now.year))
+            month = int(request.query_params.get('month', now.month))
+        except ValueError:
+            raise serializers.ValidationError({'detail': 'year and month must be integers'})
+        if not 1 <= month <= 12:
+            raise serializers.ValidationError({'month': 'Must be between 1 and 12'})
+        
+        rows = list(MonthlySpend.objects.filter(group=self.group, year=year, month=month, count__gt=0)
+                .values_list('category_id', 'category__name', 'total', 'count').order_by('category__name'))
+        categories = [{'category_id': cid, 'category_name': name, 'spent': str(total), 'count': count}
+                      for cid, name, total, count in rows]
+        total_spent = sum((total for _, _, total, _ in rows), Decimal('0.00'))
+        
+        budget = BudgetPeriod.objects.filter(group=self.group, year=year, month=month).first()
         budget_limit = budget.limit if budget else None
-        remaining = (budget_limit - total_spent) if budget_limit is not None else None # this is null-safe conditional assignment
-        
-        # balances: + means user should receive, - means user owes
-        member_ids = list(Member.objects.filter(group=group).values_list('user_id', flat=True))
-        balances = {uid: Decimal('0.00') for uid in member_ids} # this is a dictionary comprehension
-        # uid : Decimal('0.00), use uid as the key in dict and Decimal('0.00) as the value. eg: { 1: Decimal('2000.00'),}
-        
-        
-        for e in expenses:
-            balances[e.paid_by_id] += e.amount
-            
-        for s in splits:
-            balances[s.user_id] -= s.share
-        
-        for st in settlements:
-            balances[st.from_user_id] += st.amount
-            balances[st.to_user_id] -= st.amount
-        
-        
-        users = User.objects.filter(id__in=member_ids).only('id', 'username')
-        id_to_name = {u.id: u.username for u in users}
-        balance_list = [                          # .get(key, default),if found return value. If not return default-> str(uid) it is a null-safe / error-safe      
-            {'user_id': uid, 'username': id_to_name.get(uid, str(uid)), 'net': str(balances[uid])} # balances[uid] → fetches that user’s net amount from the dictionary
-            for uid in member_ids
-        ]
-        
-        # [] is the dictionary lookup operator in Python used to access or update the value of a specific key in a dictionary
-        
-        
+        remaining = (budget_limit - total_spent) if budget_limit is not None else None
         
         return Response({
-            'group_id': group.id,
-            'group_name': group.name,
-            'currency': group.currency,
+            'group_id': self.group.id,
             'period': {'year': year, 'month': month},
-            'total_spent': str(total_spent),
             'budget_limit': str(budget_limit) if budget_limit is not None else None,
+            'total_spent': str(total_spent),
             'remaining': str(remaining) if remaining is not None else None,
-            'balances': balance_list,
+            'over_budget': remaining is not None and remaining < 0,
+            'categories': categories,
         })
-        
\ No newline at end of file
+
+
+
+class GroupReportView(GroupContextMixin, APIView):
+    # spend vs. budget for a range of months (?from=YYYY-MM&to=YYYY-MM, default: year to date),
+    # by month, category and payer. See reports.py: 3 queries whatever the size of the range.
+    permission_classes = [IsAuthenticated, IsGroupMember]
+    
+    def get(self, request, group_id):
+        now = timezone.localtime()
+        try:
+            first = reports.parse_month(request.query_params.get('from', f'{now.year}-01'))
+            last = reports.parse_month(request.query_params.get('to', f'{now.year}-{now.month}'))
+        except ValueError:
+            raise serializers.ValidationError({'detail': 'from and to must be YYYY-MM'})
+        if first > last:
+            raise serializers.ValidationError({'detail': 'from must not be after to'})
+        if len(reports.months_between(first, last)) > reports.MAX_MONTHS:
+            raise serializers.ValidationError({'detail': f'at most {reports.MAX_MONTHS} months per report'})
+        
+        payload = reports.build_report(self.group, first, last)
+        etag = reports.etag_for(payload)
+        # the client already has this exact report → 304 without a body
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(payload, headers={'ETag': etag})
+
+
+
+class GroupExportView(GroupContextMixin, APIView):
+    # full history download for finance: ?table=expenses|splits|settlements, ?type=csv|jsonl, ?gzip=1.
+    # (?type, not ?format: DRF reserves ?format= for picking a renderer)
+    # The body is streamed from a server-side cursor (export.py), so the whole table is never in memory.
+    permission_classes = [IsAuthenticated, IsGroupMember]
+    
+    def get(self, request, group_id):
+        table = request.query_params.get('table', 'expenses')
+        file_type = request.query_params.get('type', 'csv')
+        if table not in export.TABLES:
+            raise serializers.ValidationError({'detail': f'table must be one of: {", ".join(export.TABLES)}'})
+        if file_type not in export.TYPES:
+            raise serializers.ValidationError({'detail': f'type must be one of: {", ".join(export.TYPES)}'})
+        gzip = request.query_params.get('gzip') in ('1', 'true')
+        
+        filename = f'group-{self.group.id}-{table}.{file_type}' + ('.gz' if gzip else '')
+        response = StreamingHttpResponse(export.stream(self.group.id, table, file_type, gzip, using=replicas.read_alias()),
+                                         content_type='application/gzip' if gzip else export.TYPES[file_type])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['Cache-Control'] = 'no-store'
+        return response
+    
+    def post(self, request, group_id):
+        # same parameters in the body; the file is written by a background job (202, download it when done)
+        serializer = ExportJobCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return enqueue_job(request, self.group, serializer.validated_data)
+
+
+def enqueue_job(request, group, data):
+    # 202 with the job (a new one, or the same work already queued/running: dedup, see jobs.py)
+    kind = data['kind']
+    params, key = {}, ''
+    if kind == Job.Kind.EXPORT:
+        params = {'table': data['table'], 'type': data['type'], 'gzip': data['gzip']}
+        key = f"{data['table']}.{data['type']}" + ('.gz' if data['gzip'] else '')
+    job, created = jobs.enqueue(group.id, kind, params, key, request.user)
+    return Response({**JobSerializer(job).data, 'deduplicated': not created}, status=status.HTTP_202_ACCEPTED,
+                    headers={'Location': reverse('job-detail', args=[job.id])})
+
+
+class GroupJobCreateView(GroupContextMixin, generics.GenericAPIView):
+    # POST {"kind": "rebuild_balances" | "rebuild_rollups" | "export", ...} → 202; a worker (`manage.py run_jobs`)
+    # does the work, GET jobs/<id>/ shows its progress. Rebuilds are for the group creator, exports for any member.
+    permission_classes = [IsAuthenticated, IsGroupMember]
+    serializer_class = JobCreateSerializer
+    
+    def post(self, request, group_id):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['kind'] != Job.Kind.EXPORT and self.group.created_by_id != request.user.id:
+            raise PermissionDenied('Only the group creator can rebuild the group')
+        return enqueue_job(request, self.group, serializer.validated_data)
+
+
+class JobDetailMixin:
+    # jobs of the groups the user is a member of; anyone else gets 404
+    permission_classes = [IsAuthenticated]
+    
+    def get_job(self, request, job_id):
+        job = Job.objects.filter(id=job_id, group__member_links__user=request.user).first()
+        if job is None:
+            raise NotFound()
+        return job
+
+
+class JobDetailView(JobDetailMixin, APIView):
+    def get(self, request, job_id):
+        job = self.get_job(request, job_id)
+        data = JobSerializer(job).data
+        if job.kind == Job.Kind.EXPORT and job.status == Job.Status.DONE:
+            data['download'] = request.build_absolute_uri(reverse('job-download', args=[job.id]))
+        return Response(data, headers={'Cache-Control': 'no-store'})
+
+
+class JobDownloadView(JobDetailMixin, APIView):
+    def get(self, request, job_id):
+        job = self.get_job(request, job_id)
+        if job.kind != Job.Kind.EXPORT or job.status != Job.Status.DONE:
+            raise Conflict('The export is not ready yet.')
+        path = jobs.export_path(job)
+        if not os.path.exists(path):
+            raise NotFound('The export file was removed, start a new export.')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path),
+                            content_type='application/gzip' if job.params.get('gzip') else export.TYPES[job.params['type']])
+
+
+
+class SettleUpView(GroupContextMixin, APIView):
+    # GET: suggested transfers that bring every balance to zero (all time, or ?year=&month= for one month).
+    # POST: the group creator records the all-time plan as Settlement rows, in one transaction.
+    
+    def get_permissions(self):
+        if self.request.method == 'POST':
+            return [IsAuthenticated(), IsGroupMember(), IsGroupCreator()]
+        return [IsAuthenticated(), IsGroupMember()]
+    
+    def get(self, request, group_id):
+        year, month = request.query_params.get('year'), request.query_params.get('month')
+        if (year is None) != (month is None):
+            raise serializers.ValidationError({'detail': 'year and month go together'})
+        try:
+            year, month = (int(year), int(month)) if year is not None else (None, None)
+        except ValueError:
+            raise serializers.ValidationError({'detail': 'year and month must be integers'})
+        
+        balances = settleup.group_balances(self.group.id, year, month)
+        transfers = settleup.plan_transfers(balances)
+        return Response(self.plan_response(transfers, {'year': year, 'month': month} if year is not None else 'all'))
+    
+    def post(self, request, group_id):
+        with transaction.atomic():
+            settlements = settleup.commit_plan(self.group.id)
+        transfers = [(st.from_user_id, st.to_user_id, st.amount) for st in settlements]
+        data = self.plan_response(transfers, 'all')
+        data['settlement_ids'] = [st.id for st in settlements]
+        return Response(data, status=status.HTTP_201_CREATED)
+    
+    def plan_response(self, transfers, period):
+        # usernames of everyone in the plan with one query (ex-members can still owe money, so not only group_ctx)
+        user_ids = {uid for from_id, to_id, _ in transfers for uid in (from_id, to_id)}
+        names = dict(User.objects.filter(id__in=user_ids).values_list('id', 'username'))
+        return {
+            'group_id': self.group.id,
+            'period': period,
+            'count': len(transfers),
+            'transfers': [
+                {'from_user_id': from_id, 'from_username': names.get(from_id), 'to_user_id': to_id,
+                 'to_username': names.get(to_id), 'amount': str(amount)}
+                for from_id, to_id, amount in transfers
+            ],
+        }
+
+
+
+class GroupCacheStatsView(APIView):
+    # hit/miss counters of the membership/category cache of the process that answers the request
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    
+    def get(self, request):
+        return Response(group_cache.stats())
+
+
+
+def metrics_view(request):
+    # GET /metrics: request histograms of this process (metrics.py) + group cache counters, Prometheus text format.
+    # Plain Django view: scrapers don't do JWT. Protect it with EXP_BUD_METRICS['TOKEN'] or at the proxy.
+    token = metrics.config()['TOKEN']
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    
+    cache_stats = group_cache.stats()
+    gauges = {
+        'exp_bud_group_cache_hits_total': ('Group member/category cache hits', 'counter', cache_stats['hits']),
+        'exp_bud_group_cache_misses_total': ('Group member/category cache misses', 'counter', cache_stats['misses']),
+    }
+    return HttpResponse(metrics.registry.render(gauges), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -56,6 +57,8 @@ REST_FRAMEWORK = {
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'exp_bud.middleware.QueryMetricsMiddleware', # early, so its latency covers the rest of the stack
+    'exp_bud.middleware.ReplicaRoutingMiddleware', # before auth, so the user lookup of a GET reads the replica too
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -87,17 +90,65 @@ WSGI_APPLICATION = 'expense_budget.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Every value can be overridden from the environment (DB_NAME, DB_USER, ...); the defaults are the local setup.
+#
+# Connection reuse, pick one (`manage.py bench_connections` compares them on the real database):
+#   DB_CONN_MAX_AGE=0    → Django's default: connect at the start of every request, disconnect at the end
+#   DB_CONN_MAX_AGE=600  → persistent connections: each worker thread keeps its connection for up to 600 s
+#                          ('None' = forever). DB_CONN_HEALTH_CHECKS (on by default) pings a reused connection
+#                          before the request uses it and reconnects if the database dropped it.
+#   DB_POOL=1            → psycopg 3 connection pool per process (needs `pip install "psycopg[pool]"`), sized by
+#                          DB_POOL_MIN_SIZE / DB_POOL_MAX_SIZE, DB_POOL_TIMEOUT = seconds to wait for a free
+#                          connection. Dead connections are checked out of the pool before use. Django refuses a
+#                          pool together with CONN_MAX_AGE, so it is forced to 0 (the connection goes back to the pool).
+# Size the pool (or worker threads with persistent connections) × processes below PostgreSQL's max_connections.
+
+def db_conn_max_age(value):
+    return None if value == 'None' else int(value)
+
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'expense_budget',
-        'USER': 'postgres',
-        'PASSWORD': '@baraghare01',
-        'HOST': 'localhost',
-        'PORT': '5433',
+        'NAME': os.environ.get('DB_NAME', 'expense_budget'),
+        'USER': os.environ.get('DB_USER', 'postgres'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', '@baraghare01'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5433'),
+        'CONN_MAX_AGE': db_conn_max_age(os.environ.get('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': os.environ.get('DB_CONN_HEALTH_CHECKS', '1') == '1',
     }
 }
 
+if os.environ.get('DB_POOL') == '1':
+    from psycopg_pool import ConnectionPool
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', '10')),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', '10')),
+            'check': ConnectionPool.check_connection, # drop a dead connection instead of handing it out
+        },
+    }
+
+
+# Read replica (optional, see exp_bud/replicas.py): set DB_REPLICA_HOST, plus DB_REPLICA_PORT / NAME / USER / PASSWORD
+# where they differ from the primary. Safe GETs then read from it; writes and the reads right after them stay on
+# the primary. Tests treat the replica as a mirror of the test database.
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['exp_bud.replicas.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -139,3 +190,58 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# exp_bud: cross-request cache of group member ids / category ids (see exp_bud/cache.py)
+# BACKEND: name of a CACHES alias shared by all workers (e.g. redis); None → process-local LRU only
+EXP_BUD_GROUP_CACHE = {
+    'MAX_SIZE': 2048,
+    'TTL': 30,
+    'BACKEND': None,
+}
+
+# exp_bud: per-endpoint request metrics served on /metrics (see exp_bud/metrics.py)
+# QUERY_BUDGET: log a warning with the SQL of requests running more queries than this; TOKEN: bearer token for /metrics
+EXP_BUD_METRICS = {
+    'ENABLED': True,
+    'QUERY_BUDGET': 50,
+    'TOKEN': None,
+}
+
+# exp_bud: serve the summary / expense list / settlement list GETs from async views (exp_bud/async_views.py).
+# Turn on when deploying with an ASGI server (uvicorn/daphne + expense_budget.asgi); keep off under WSGI,
+# where every async view would run inside its own event loop for nothing. Set EXP_BUD_ASYNC_READS=1 in the environment.
+EXP_BUD_ASYNC_READS = os.environ.get('EXP_BUD_ASYNC_READS') == '1'
+
+# exp_bud: ETag / 304 and cached responses for the summary and category list, keyed by Group.data_version
+# (see exp_bud/versions.py). ALIAS: the CACHES alias (the default is process-local; use a shared one with several workers)
+EXP_BUD_RESPONSE_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TTL': 300,
+}
+
+# exp_bud: monthly partitions of the expense/split tables on PostgreSQL (see exp_bud/partitions.py).
+# Off by default; ignored on SQLite. Run `manage.py partitions` monthly to create the months ahead.
+EXP_BUD_PARTITIONING = {
+    'ENABLED': os.environ.get('EXP_BUD_PARTITIONING') == '1',
+    'MONTHS_AHEAD': 3,
+}
+
+# exp_bud: read-replica routing (see exp_bud/replicas.py), active once DATABASES has the 'replica' alias.
+# STICKY_SECONDS: after a write, that client's reads stay on the primary this long (keep it above the replication lag)
+EXP_BUD_REPLICA = {
+    'ALIAS': 'replica',
+    'STICKY_SECONDS': int(os.environ.get('DB_REPLICA_STICKY_SECONDS', '5')),
+    'CACHE_ALIAS': 'default',
+}
+
+# exp_bud: background jobs (see exp_bud/jobs.py), run by `manage.py run_jobs` (one or more worker processes).
+# RETRY_DELAY: seconds before the first retry (doubles each attempt); EXPORT_DIR: files written by export jobs
+# STALE_SECONDS: a running job whose heartbeat (refreshed every STALE_SECONDS / 3) is older than this is requeued
+EXP_BUD_JOBS = {
+    'MAX_ATTEMPTS': 3,
+    'RETRY_DELAY': 30,
+    'STALE_SECONDS': 600,
+    'EXPORT_DIR': os.environ.get('EXP_BUD_EXPORT_DIR', str(BASE_DIR / 'exports')),
+}
@@ -17,10 +17,12 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from exp_bud.views import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('exp_bud.urls')),
     path('api/auth/login/', TokenObtainPairView.as_view(), name='token_obtain_view'),
-    path('api/auth/refresh/', TokenRefreshView.as_view(), name='token_refresh')
+    path('api/auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', metrics_view, name='metrics'),
 ]